@@ -110,6 +110,8 @@ Contact: info@ecosire.com | Website: https://www.ecosire.com
         'views/saas_automation_views.xml',
         'views/saas_security_views.xml',
         'views/saas_integration_views.xml',
+        'views/saas_job_views.xml',
+        'views/saas_backup_views.xml',
         'views/res_partner_views.xml',
         'views/product_template_views.xml',
         'views/sale_order_views.xml',
@@ -118,6 +120,7 @@ Contact: info@ecosire.com | Website: https://www.ecosire.com
         'views/pricing_templates.xml',
         # Wizards
         'wizard/saas_instance_creation_wizard_views.xml',
+        'wizard/saas_instance_import_wizard_views.xml',
         'wizard/saas_backup_restore_wizard_views.xml',
         'wizard/saas_migration_wizard_views.xml',
         'wizard/saas_billing_wizard_views.xml',
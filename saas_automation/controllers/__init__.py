@@ -1,3 +1,5 @@
 # -*- coding: utf-8 -*-
 from . import website_controller
-from . import portal_controller 
\ No newline at end of file
+from . import portal_controller
+from . import backup_controller
+from . import metrics_controller
\ No newline at end of file
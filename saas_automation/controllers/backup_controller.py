@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from odoo import http
+from odoo.http import request
+from werkzeug.exceptions import BadRequest, Forbidden, NotFound
+from ..models import db_utils
+
+class SaasBackupController(http.Controller):
+
+    def _check_saas_manager(self):
+        if not request.env.user.has_group('saas_automation.group_saas_manager'):
+            raise Forbidden()
+
+    @http.route('/saas/backup/<int:attachment_id>/download', type='http', auth='user')
+    def backup_download(self, attachment_id, **kwargs):
+        """Streams a backup from the filestore; Range and conditional requests are honoured."""
+        self._check_saas_manager()
+        attachment = request.env['ir.attachment'].sudo().browse(attachment_id).exists()
+        if not attachment or attachment.res_model != 'saas.instance':
+            raise NotFound()
+        stream = http.Stream.from_attachment(attachment)
+        return stream.get_response(as_attachment=True)
+
+    @http.route('/saas/backup/<int:instance_id>/upload', type='http', auth='user', methods=['POST'])
+    def backup_upload(self, instance_id, backup_file=None, **kwargs):
+        """Stores an uploaded backup for an instance by copying the request stream in chunks."""
+        self._check_saas_manager()
+        instance = request.env['saas.instance'].browse(instance_id).exists()
+        if not instance:
+            raise NotFound()
+        if not backup_file:
+            raise BadRequest("Missing 'backup_file' upload")
+        attachment = db_utils.store_stream_as_attachment(
+            request.env, backup_file.stream, backup_file.filename or f"{instance.db_name}.zip",
+            'saas.instance', instance.id)
+        return request.make_json_response({'attachment_id': attachment.id, 'file_size': attachment.file_size})
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+import hmac
+from odoo import http
+from odoo.http import request
+from werkzeug.exceptions import Forbidden, NotFound
+from ..models import metrics_utils, ssh_utils
+
+class SaasMetricsController(http.Controller):
+
+    @http.route('/saas/metrics', type='http', auth='public', methods=['GET'], csrf=False, save_session=False)
+    def metrics(self, **kwargs):
+        """Prometheus scrape endpoint for the remote operation timings of the serving worker.
+
+        Disabled until ``saas_automation.metrics_token`` is set; scrapers then send it as a
+        ``Authorization: Bearer <token>`` header. Each worker keeps its own histograms, so
+        scrape every worker (or rely on the hourly ``saas.operation.stat`` rows for totals).
+        """
+        token = request.env['ir.config_parameter'].sudo().get_param('saas_automation.metrics_token')
+        if not token:
+            raise NotFound()
+        scheme, _sep, given = request.httprequest.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not hmac.compare_digest(given.strip().encode(), token.encode()):
+            raise Forbidden()
+        request.env['saas.operation.stat'].sudo()._flush_pending()
+        pool = ssh_utils.get_pool_stats()
+        gauges = {
+            f'saas_ssh_pool_{key}': (f"SSH connection pool {key.replace('_', ' ')}.", value)
+            for key, value in pool.items()
+        }
+        return request.make_response(metrics_utils.render_prometheus(gauges), headers=[
+            ('Content-Type', 'text/plain; version=0.0.4; charset=utf-8'),
+            ('Cache-Control', 'no-store'),
+        ])
@@ -1,11 +1,66 @@
 # -*- coding: utf-8 -*-
-from odoo import http
+from odoo import http, _
 from odoo.http import request
-from odoo.addons.portal.controllers.portal import CustomerPortal
+from odoo.addons.portal.controllers.portal import CustomerPortal, pager as portal_pager
 
 class CustomerPortal(CustomerPortal):
 
-    @http.route(['/my/saas'], type='http', auth="user", website=True)
-    def portal_my_saas(self, **kwargs):
-        instances = request.env['saas.instance'].search([('partner_id', '=', request.env.user.partner_id.id)])
-        return request.render("saas_automation.portal_my_saas_template", {'instances': instances}) 
\ No newline at end of file
+    def _get_saas_instance_domain(self):
+        return [('partner_id', 'child_of', request.env.user.partner_id.commercial_partner_id.id)]
+
+    def _prepare_home_portal_values(self, counters):
+        values = super()._prepare_home_portal_values(counters)
+        if 'saas_count' in counters:
+            Instance = request.env['saas.instance']
+            values['saas_count'] = (Instance.search_count(self._get_saas_instance_domain())
+                                    if Instance.has_access('read') else 0)
+        return values
+
+    @http.route(['/my/saas', '/my/saas/page/<int:page>'], type='http', auth="user", website=True)
+    def portal_my_saas(self, page=1, sortby=None, filterby=None, **kwargs):
+        Instance = request.env['saas.instance']
+        domain = self._get_saas_instance_domain()
+
+        searchbar_sortings = {
+            'date': {'label': _('Newest'), 'order': 'create_date desc, id desc'},
+            'name': {'label': _('Name'), 'order': 'name'},
+            'state': {'label': _('Status'), 'order': 'state, id desc'},
+        }
+        # One grouped count feeds every filter label.
+        state_counts = dict(Instance._read_group(domain, ['state'], ['__count']))
+        searchbar_filters = {'all': {'label': _('All (%s)', sum(state_counts.values())), 'domain': []}}
+        for state, label in Instance._fields['state']._description_selection(request.env):
+            if state_counts.get(state):
+                searchbar_filters[state] = {
+                    'label': f"{label} ({state_counts[state]})",
+                    'domain': [('state', '=', state)],
+                }
+        sortby = sortby if sortby in searchbar_sortings else 'date'
+        filterby = filterby if filterby in searchbar_filters else 'all'
+        domain += searchbar_filters[filterby]['domain']
+
+        count = state_counts.get(filterby, 0) if filterby != 'all' else sum(state_counts.values())
+        pager = portal_pager(
+            url='/my/saas',
+            url_args={'sortby': sortby, 'filterby': filterby},
+            total=count,
+            page=page,
+            step=self._items_per_page,
+        )
+        instances = Instance.search(domain, order=searchbar_sortings[sortby]['order'],
+                                    limit=self._items_per_page, offset=pager['offset'])
+        # Load the page's rows and their plans in two queries instead of one per row.
+        instances.fetch(['name', 'subdomain', 'url', 'state', 'plan_id', 'expiration_date'])
+        instances.plan_id.fetch(['name'])
+        request.session['my_saas_history'] = instances.ids[:100]
+
+        return request.render("saas_automation.portal_my_saas_template", {
+            'instances': instances,
+            'page_name': 'saas',
+            'pager': pager,
+            'default_url': '/my/saas',
+            'searchbar_sortings': searchbar_sortings,
+            'sortby': sortby,
+            'searchbar_filters': searchbar_filters,
+            'filterby': filterby,
+        })
@@ -1,10 +1,59 @@
 # -*- coding: utf-8 -*-
+import hashlib
+import threading
+import time
 from odoo import http
 from odoo.http import request
 
+PRICING_CACHE_TTL = 300  # seconds a rendered plan table is reused, bounds staleness after template edits
+
+_pricing_lock = threading.Lock()
+_pricing_cache = {}  # (db, website id, lang) -> (version, rendered_at, plan table html)
+
+
 class SaasWebsiteController(http.Controller):
 
+    def _get_plan_table(self, version):
+        """Returns the rendered plan cards, rendered once per website, language and plan version.
+
+        Only this fragment is shared between visitors: it holds no session or visitor state,
+        unlike the page around it (CSRF token, cart, login menu).
+        """
+        key = (request.db, request.website.id, request.lang.code)
+        with _pricing_lock:
+            entry = _pricing_cache.get(key)
+        if not entry or entry[0] != version or time.monotonic() - entry[1] > PRICING_CACHE_TTL:
+            plans = request.env['saas.plan'].sudo().search([('is_active', '=', True)])
+            html = request.env['ir.qweb']._render('saas_automation.pricing_plan_table', {'plans': plans})
+            entry = (version, time.monotonic(), html)
+            with _pricing_lock:
+                _pricing_cache[key] = entry
+        return entry[2]
+
+    def _pricing_etag(self, version):
+        """Validator of the page a visitor gets: plans, website, language, and their own session.
+
+        The page embeds the session's CSRF token and the visitor's menu, so a validator is only
+        ever reused by the browser that received it. The TTL bucket follows the plan table
+        cache, so template edits change it too.
+        """
+        last_write, count = version
+        parts = (last_write, count, request.website.id, request.lang.code, request.env.uid,
+                 request.session.sid, int(time.time() // PRICING_CACHE_TTL))
+        return hashlib.sha256(repr(parts).encode()).hexdigest()[:32]
+
     @http.route('/saas/pricing', type='http', auth='public', website=True)
     def pricing_page(self, **kwargs):
-        plans = request.env['saas.plan'].search([('is_active', '=', True)])
-        return request.render('saas_automation.pricing_page_template', {'plans': plans}) 
\ No newline at end of file
+        """Serves the pricing page, rendered for each request around the cached plan table.
+
+        Responses are private (they hold per-session state) but carry an ``ETag`` and
+        ``Last-Modified``, so revalidations of an unchanged page get a 304.
+        """
+        version = request.env['saas.plan']._get_pricing_version()
+        response = request.render('saas_automation.pricing_page_template',
+                                  {'plan_table': self._get_plan_table(version)}, lazy=False)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.set_etag(self._pricing_etag(version))
+        if version[0]:
+            response.last_modified = version[0]
+        return response.make_conditional(request.httprequest)
@@ -11,5 +11,21 @@ from . import product_template
 from . import docker_utils
 from . import saas_dashboard
 from . import db_utils
+from . import metrics_utils
 from . import ssh_utils
-from . import nginx_utils 
\ No newline at end of file
+from . import nginx_utils
+from . import health_utils
+from . import pool_utils
+from . import saas_job
+from . import backup_utils
+from . import saas_backup
+from . import saas_backup_run
+from . import saas_kpi_snapshot
+from . import saas_metric_sample
+from . import saas_placement_log
+from . import saas_billing_run
+from . import saas_operation_stat
+from . import ir_cron
+from . import ir_http
+from . import ir_sequence
+from . import saas_pool_slot
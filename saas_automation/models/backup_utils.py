@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import logging
+import os
+import subprocess
+import tempfile
+import time
+import uuid
+import zlib
+from odoo.service import db
+from odoo.tools.misc import exec_pg_environ, find_pg_tool
+
+_logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 4 * 1024 * 1024  # bytes per chunk
+COMPRESS_LEVEL = 3  # zlib level, favouring throughput over ratio
+
+def chunk_store_root(env):
+    """Returns the directory of the content-addressed chunk store, next to the filestore."""
+    root = os.path.join(env['ir.attachment']._filestore(), 'saas_chunks')
+    os.makedirs(root, exist_ok=True)
+    return root
+
+def _chunk_path(root, digest):
+    return os.path.join(root, digest[:2], digest)
+
+def put_chunk(root, data):
+    """Stores a chunk unless an identical one already exists.
+
+    :return: tuple (digest, bytes written), where bytes written is 0 for a deduplicated chunk
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    path = _chunk_path(root, digest)
+    if os.path.exists(path):
+        # Refresh the mtime so garbage collection cannot sweep a chunk that is being re-referenced.
+        os.utime(path)
+        return digest, 0
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    compressed = zlib.compress(data, COMPRESS_LEVEL)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(compressed)
+    os.replace(tmp_path, path)
+    return digest, len(compressed)
+
+def read_chunk(root, digest):
+    """Returns the uncompressed content of a chunk, verifying its digest."""
+    with open(_chunk_path(root, digest), 'rb') as f:
+        data = zlib.decompress(f.read())
+    if hashlib.sha256(data).hexdigest() != digest:
+        raise ValueError(f"Chunk {digest} is corrupted")
+    return data
+
+def dump_db_chunked(root, db_name):
+    """Dumps a database into the chunk store.
+
+    ``pg_dump`` runs in uncompressed directory format so every table lands in its own file;
+    unchanged tables then produce identical chunks from one night to the next.
+
+    :return: tuple (manifest, stats) where the manifest lists the chunks of every dump file
+    """
+    stats = {'original_size': 0, 'stored_size': 0, 'chunk_count': 0, 'new_chunk_count': 0}
+    files = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        dump_dir = os.path.join(tmp_dir, 'dump')
+        subprocess.run(
+            [find_pg_tool('pg_dump'), '--no-owner', '--format=d', '--compress=0', '--file', dump_dir, db_name],
+            env=exec_pg_environ(), check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        for name in sorted(os.listdir(dump_dir)):
+            path = os.path.join(dump_dir, name)
+            digests = []
+            with open(path, 'rb') as f:
+                while True:
+                    data = f.read(CHUNK_SIZE)
+                    if not data:
+                        break
+                    digest, stored = put_chunk(root, data)
+                    digests.append(digest)
+                    stats['chunk_count'] += 1
+                    stats['stored_size'] += stored
+                    stats['new_chunk_count'] += 1 if stored else 0
+            size = os.path.getsize(path)
+            stats['original_size'] += size
+            files.append({'name': name, 'size': size, 'chunks': digests})
+    manifest = {'format': 'pg_directory', 'chunk_size': CHUNK_SIZE, 'files': files}
+    return manifest, stats
+
+def restore_db_chunked(root, db_name, manifest, jobs=2):
+    """Recreates ``db_name`` from a manifest, reassembling dump files one chunk at a time."""
+    with tempfile.TemporaryDirectory() as restore_dir:
+        for entry in manifest['files']:
+            with open(os.path.join(restore_dir, os.path.basename(entry['name'])), 'wb') as f:
+                for digest in entry['chunks']:
+                    f.write(read_chunk(root, digest))
+        db._create_empty_database(db_name)
+        subprocess.run(
+            [find_pg_tool('pg_restore'), '--no-owner', '--dbname', db_name, '--jobs', str(jobs), restore_dir],
+            env=exec_pg_environ(), check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    _logger.info(f"Restored database '{db_name}' from {sum(len(e['chunks']) for e in manifest['files'])} chunks")
+
+def manifest_digests(manifest):
+    return {digest for entry in manifest['files'] for digest in entry['chunks']}
+
+def collect_garbage(root, live_digests, grace_period=86400):
+    """Deletes chunks referenced by no manifest and untouched for ``grace_period`` seconds.
+
+    The grace period protects chunks written by backups still in progress.
+    """
+    removed = 0
+    now = time.time()
+    for prefix in os.listdir(root):
+        prefix_dir = os.path.join(root, prefix)
+        if not os.path.isdir(prefix_dir):
+            continue
+        for name in os.listdir(prefix_dir):
+            if name in live_digests:
+                continue
+            path = os.path.join(prefix_dir, name)
+            try:
+                if now - os.path.getmtime(path) > grace_period:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
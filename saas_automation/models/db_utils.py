@@ -1,12 +1,17 @@
 # -*- coding: utf-8 -*-
 import odoo
 from odoo.service import db
+import hashlib
 import logging
 import os
+import shutil
 import tempfile
+import uuid
 
 _logger = logging.getLogger(__name__)
 
+CHUNK_SIZE = 1024 * 1024  # bytes copied per read/write when streaming backups
+
 def backup_db(db_name):
     """Creates a backup of the specified database and returns the path to the backup file."""
     try:
@@ -28,4 +33,104 @@ def restore_db(db_name, backup_path):
         return True
     except Exception as e:
         _logger.error(f"Failed to restore database '{db_name}' from '{backup_path}': {e}")
-        return False 
\ No newline at end of file
+        return False
+
+
+class _HashingWriter(object):
+    """Write-only file wrapper computing the SHA-1 and size of everything written through it.
+
+    It deliberately has no ``tell``/``seek`` so ``zipfile`` falls back to streaming mode.
+    """
+
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+        self._sha1 = hashlib.sha1()
+        self.size = 0
+
+    def write(self, data):
+        self._sha1.update(data)
+        self.size += len(data)
+        return self._fileobj.write(data)
+
+    def flush(self):
+        self._fileobj.flush()
+
+    @property
+    def checksum(self):
+        return self._sha1.hexdigest()
+
+
+def _write_to_filestore(env, producer):
+    """Calls ``producer(fileobj)`` to write content straight into the filestore.
+
+    The content is written to a temporary file next to the filestore and moved to its
+    content-addressed location, so it never has to be held in memory. New files are marked
+    for garbage collection like ``ir.attachment._file_write`` does, so a rolled-back
+    transaction does not leave them orphaned.
+
+    :return: tuple (store_fname, file_size, checksum) usable to create an ``ir.attachment``
+    """
+    Attachment = env['ir.attachment']
+    tmp_dir = os.path.join(Attachment._filestore(), 'saas_tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+    tmp_path = os.path.join(tmp_dir, uuid.uuid4().hex)
+    try:
+        with open(tmp_path, 'wb') as out:
+            writer = _HashingWriter(out)
+            producer(writer)
+        store_fname = f"{writer.checksum[:2]}/{writer.checksum}"
+        full_path = Attachment._full_path(store_fname)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        if os.path.exists(full_path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, full_path)
+            Attachment._mark_for_gc(store_fname)
+        return store_fname, writer.size, writer.checksum
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _create_file_attachment(env, name, store_fname, file_size, checksum, res_model, res_id, mimetype):
+    return env['ir.attachment'].sudo().create({
+        'name': name,
+        'type': 'binary',
+        'store_fname': store_fname,
+        'file_size': file_size,
+        'checksum': checksum,
+        'mimetype': mimetype,
+        'res_model': res_model,
+        'res_id': res_id,
+    })
+
+
+def dump_db_to_attachment(env, db_name, res_model=False, res_id=False):
+    """Dumps ``db_name`` directly into the filestore and returns the resulting ``ir.attachment``.
+
+    Peak memory stays bounded by ``zipfile``'s buffers regardless of the database size.
+    """
+    store_fname, file_size, checksum = _write_to_filestore(env, lambda out: db.dump_db(db_name, out))
+    _logger.info(f"Streamed backup of database '{db_name}' into the filestore ({file_size} bytes)")
+    return _create_file_attachment(env, f"{db_name}.zip", store_fname, file_size, checksum,
+                                   res_model, res_id, 'application/zip')
+
+
+def store_stream_as_attachment(env, stream, name, res_model=False, res_id=False, mimetype='application/zip'):
+    """Copies a readable stream (e.g. an uploaded file) into the filestore in chunks."""
+    store_fname, file_size, checksum = _write_to_filestore(
+        env, lambda out: shutil.copyfileobj(stream, out, CHUNK_SIZE))
+    return _create_file_attachment(env, name, store_fname, file_size, checksum, res_model, res_id, mimetype)
+
+
+def restore_db_from_attachment(env, db_name, attachment):
+    """Restores ``db_name`` from a backup attachment without loading it into memory."""
+    attachment = attachment.sudo()
+    if attachment.store_fname:
+        return restore_db(db_name, attachment._full_path(attachment.store_fname))
+    # Attachments kept in the database have no file on disk, spool them to one first.
+    with tempfile.NamedTemporaryFile(suffix='.zip') as tmp:
+        tmp.write(attachment.raw)
+        tmp.flush()
+        return restore_db(db_name, tmp.name)
@@ -1,77 +1,417 @@
 # -*- coding: utf-8 -*-
 import docker
+import json
+import logging
+import re
+import requests
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from . import metrics_utils
 from . import ssh_utils
 
+_logger = logging.getLogger(__name__)
+
+DOCKER_CLIENT_TTL = 600  # seconds a cached client may stay idle before it is rebuilt
+DOCKER_POOL_SIZE = 16  # HTTP connections kept open per daemon
+ODOO_HTTP_PORT = '8069/tcp'  # published on a host port the daemon picks
+REGISTRY_URL = 'https://registry-1.docker.io'
+REGISTRY_AUTH_URL = 'https://auth.docker.io/token'
+REGISTRY_TIMEOUT = 10  # seconds per registry request
+# Accepting manifest lists makes the registry answer with the digest docker records in RepoDigests.
+REGISTRY_MANIFEST_TYPES = ', '.join([
+    'application/vnd.oci.image.index.v1+json',
+    'application/vnd.docker.distribution.manifest.list.v2+json',
+    'application/vnd.oci.image.manifest.v1+json',
+    'application/vnd.docker.distribution.manifest.v2+json',
+])
+
+_client_lock = threading.Lock()
+_clients = {}  # server id -> _CachedClient
+
+
+class _CachedClient(object):
+    """A shared client plus the number of calls using it; a retired client is closed once unused."""
+    __slots__ = ('base_url', 'client', 'last_used', 'users', 'retired')
+
+    def __init__(self, base_url, client):
+        self.base_url = base_url
+        self.client = client
+        self.last_used = time.monotonic()
+        self.users = 0
+        self.retired = False
+
+
+def _docker_base_url(server):
+    return f"tcp://{server.host}:2375" # Default docker port
+
+
+def _retire(entry):
+    """Takes ``entry`` out of service; must be called with ``_client_lock`` held."""
+    entry.retired = True
+    if not entry.users:
+        _close_client(entry.client)
+
+
+def _new_client(base_url):
+    return docker.DockerClient(base_url=base_url, max_pool_size=DOCKER_POOL_SIZE)
+
+
+def _acquire_client(server):
+    """Reserves the cached client of ``server``, building one when there is none (or it expired).
+
+    The client is built outside ``_client_lock``: its version probe waits on the daemon, and
+    one slow or dead daemon must not hold up calls to every other server.
+    """
+    base_url = _docker_base_url(server)
+    with _client_lock:
+        entry = _clients.get(server.id)
+        if entry and (entry.base_url != base_url or time.monotonic() - entry.last_used >= DOCKER_CLIENT_TTL):
+            del _clients[server.id]
+            _retire(entry)
+            entry = None
+        if entry:
+            entry.users += 1
+            entry.last_used = time.monotonic()
+            return entry
+    new_entry = _CachedClient(base_url, _new_client(base_url))
+    with _client_lock:
+        entry = _clients.get(server.id)
+        if entry and entry.base_url == base_url:
+            # Another call built one in the meantime, keep a single client per server.
+            _close_client(new_entry.client)
+        else:
+            entry = new_entry
+            if not server.is_active:
+                # Inactive servers are not cached: the client is closed when this call releases it.
+                entry.retired = True
+            else:
+                if server.id in _clients:
+                    _retire(_clients[server.id])
+                _clients[server.id] = entry
+        entry.users += 1
+        entry.last_used = time.monotonic()
+        return entry
+
+
+def _release_client(entry):
+    with _client_lock:
+        entry.users -= 1
+        entry.last_used = time.monotonic()
+        if entry.retired and not entry.users:
+            _close_client(entry.client)
+
+
 def get_docker_client(server):
-    """Initializes and returns a Docker client connected to the specified server."""
+    """Returns a Docker client for the specified server.
+
+    Active servers get their cached client, which is not reserved: prefer :func:`docker_client`,
+    which keeps it open while in use. Inactive servers are not cached, so they get a new
+    client that the caller must close.
+    """
     if server.server_type == 'docker':
-        return docker.DockerClient(base_url=f"tcp://{server.host}:2375") # Default docker port
+        if not server.is_active:
+            return _new_client(_docker_base_url(server))
+        entry = _acquire_client(server)
+        _release_client(entry)
+        return entry.client
     elif server.server_type == 'kubernetes':
         # Placeholder for Kubernetes client
         return None
 
-def create_odoo_container(server, instance):
-    """Creates and starts a new Odoo container for the given instance on the specified server."""
-    if server.server_type == 'docker':
-        client = get_docker_client(server)
-        client.containers.run(
-            image=f"odoo:{instance.odoo_version}",
-            name=instance.db_name,
-            detach=True,
-            environment={
-                'HOST': 'db',
-                'USER': 'odoo',
-                'PASSWORD': 'odoo',
-            },
-            ports={'8069/tcp': None},
-        )
-    else:
-        ssh_client = ssh_utils.get_ssh_client(server)
-        command = f"docker run -d --name {instance.db_name} -p 8069:8069 -e HOST=db -e USER=odoo -e PASSWORD=odoo odoo:{instance.odoo_version}"
-        ssh_utils.execute_ssh_command(ssh_client, command)
-        ssh_utils.close_ssh_client(ssh_client)
 
-def stop_odoo_container(server, instance):
-    """Stops the Odoo container for the given instance on the specified server."""
+def _close_client(client):
+    try:
+        client.close()
+    except Exception:
+        pass
+
+
+def invalidate_docker_client(server, entry=None):
+    """Drops the cached Docker client of the specified server; calls still using it may finish.
+
+    With ``entry``, only that client is dropped, so a call that saw its client fail does not
+    retire a newer one another call has built since.
+    """
+    with _client_lock:
+        current = _clients.get(server.id)
+        if current and (entry is None or current is entry):
+            del _clients[server.id]
+            _retire(current)
+
+
+@contextmanager
+def docker_client(server):
+    """Yields the cached Docker client of ``server``, held open until the block exits.
+
+    Only connection-level failures evict the client; API errors (404, 409, ...) are answers
+    from a healthy daemon and leave it cached.
+    """
+    entry = _acquire_client(server)
+    try:
+        yield entry.client
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+        _logger.warning(f"Docker daemon of server '{server.name}' unreachable, dropping cached client: {e}")
+        invalidate_docker_client(server, entry)
+        raise
+    finally:
+        _release_client(entry)
+
+
+def image_for_version(odoo_version):
+    return f"odoo:{odoo_version}"
+
+def odoo_image(instance):
+    return image_for_version(instance.odoo_version)
+
+def registry_digest(image):
+    """Returns the current Docker Hub digest of ``image`` (``sha256:...``), or None if it cannot be resolved."""
+    repository, _sep, tag = image.partition(':')
+    if '/' not in repository:
+        repository = f"library/{repository}"
+    try:
+        token = requests.get(REGISTRY_AUTH_URL, params={
+            'service': 'registry.docker.io',
+            'scope': f"repository:{repository}:pull",
+        }, timeout=REGISTRY_TIMEOUT).json()['token']
+        response = requests.head(f"{REGISTRY_URL}/v2/{repository}/manifests/{tag or 'latest'}", headers={
+            'Authorization': f"Bearer {token}",
+            'Accept': REGISTRY_MANIFEST_TYPES,
+        }, timeout=REGISTRY_TIMEOUT)
+        response.raise_for_status()
+        return response.headers.get('Docker-Content-Digest')
+    except Exception as e:
+        _logger.warning(f"Could not resolve the registry digest of '{image}': {e}")
+        return None
+
+def _repo_digest(image, repo_digests):
+    repository = image.partition(':')[0]
+    for entry in repo_digests:
+        name, _sep, digest = entry.partition('@')
+        if name.rsplit('/', 1)[-1] == repository.rsplit('/', 1)[-1] and digest:
+            return digest
+    return None
+
+def local_image_digest(server, image, client=None, ssh_client=None):
+    """Returns the registry digest of the copy of ``image`` on the server.
+
+    None when the image is absent, or present without a registry digest (built or loaded
+    locally), since such a copy cannot be compared with the registry.
+    """
     if server.server_type == 'docker':
-        client = get_docker_client(server)
         try:
-            container = client.containers.get(instance.db_name)
-            container.stop()
-        except docker.errors.NotFound:
-            pass
-    else:
-        ssh_client = ssh_utils.get_ssh_client(server)
-        command = f"docker stop {instance.db_name}"
-        ssh_utils.execute_ssh_command(ssh_client, command)
-        ssh_utils.close_ssh_client(ssh_client)
+            return _repo_digest(image, client.images.get(image).attrs.get('RepoDigests') or [])
+        except docker.errors.ImageNotFound:
+            return None
+    ok, output = ssh_utils.execute_ssh_command(
+        ssh_client, f"docker image inspect --format '{{{{range .RepoDigests}}}}{{{{println .}}}}{{{{end}}}}' {image}")
+    if not ok:
+        return None
+    return _repo_digest(image, output.split())
 
-def start_odoo_container(server, instance):
-    """Starts the Odoo container for the given instance on the specified server."""
+def pull_image(server, image):
+    """Pulls ``image`` on the server, a no-op transfer when it is current; returns its digest afterwards, if any."""
+    if server.server_type == 'docker':
+        with docker_client(server) as client:
+            repository, _sep, tag = image.partition(':')
+            with metrics_utils.span('docker.pull', server):
+                client.images.pull(repository, tag=tag or 'latest')
+            return local_image_digest(server, image, client=client)
+    with ssh_utils.ssh_connection(server) as ssh_client:
+        with metrics_utils.span('docker.pull', server) as timing:
+            ok, output = ssh_utils.execute_ssh_command(ssh_client, f"docker pull -q {image}")
+            if not ok:
+                timing.outcome = 'error'
+                raise RuntimeError(f"docker pull {image} failed on server '{server.name}': {output}")
+        return local_image_digest(server, image, ssh_client=ssh_client)
+
+def ensure_image(server, image, client=None, ssh_client=None):
+    """Pulls ``image`` on the server unless it is already present; returns whether a pull happened.
+
+    The pull is timed on its own so a slow deploy can be told apart from a slow container start.
+    """
     if server.server_type == 'docker':
-        client = get_docker_client(server)
         try:
-            container = client.containers.get(instance.db_name)
-            container.start()
-        except docker.errors.NotFound:
-            pass
+            client.images.get(image)
+            return False
+        except docker.errors.ImageNotFound:
+            repository, _sep, tag = image.partition(':')
+            with metrics_utils.span('docker.pull', server):
+                client.images.pull(repository, tag=tag or 'latest')
+            return True
+    ok, _output = ssh_utils.execute_ssh_command(ssh_client, f"docker image inspect --format '{{{{.Id}}}}' {image}")
+    if ok:
+        return False
+    with metrics_utils.span('docker.pull', server) as timing:
+        ok, output = ssh_utils.execute_ssh_command(ssh_client, f"docker pull -q {image}")
+        if not ok:
+            timing.outcome = 'error'
+            raise RuntimeError(f"docker pull {image} failed on server '{server.name}': {output}")
+    return True
+
+def _ssh_docker(server, ssh_client, command, missing_ok=False):
+    """Runs a docker command over SSH and raises when it fails.
+
+    With ``missing_ok``, a missing container is not an error, like ``NotFound`` on the API path.
+    """
+    status, output = ssh_utils.run_ssh_command(ssh_client, command)
+    if status and not (missing_ok and 'No such container' in output):
+        raise RuntimeError(f"'{command}' failed on server '{server.name}': {output}")
+    return output
+
+def published_port(server, name, client=None, ssh_client=None):
+    """Returns the host port the daemon published Odoo's HTTP port of container ``name`` on."""
+    if server.server_type == 'docker':
+        bindings = (client.containers.get(name).attrs['NetworkSettings']['Ports'] or {}).get(ODOO_HTTP_PORT) or []
+        port = bindings[0].get('HostPort') if bindings else None
     else:
-        ssh_client = ssh_utils.get_ssh_client(server)
-        command = f"docker start {instance.db_name}"
-        ssh_utils.execute_ssh_command(ssh_client, command)
-        ssh_utils.close_ssh_client(ssh_client)
+        # One line per address family, e.g. "0.0.0.0:32768" and "[::]:32768".
+        output = _ssh_docker(server, ssh_client, f"docker port {name} {ODOO_HTTP_PORT}")
+        match = re.search(r':(\d+)\s*$', output.strip().split('\n')[0])
+        port = match and match.group(1)
+    if not port:
+        raise RuntimeError(f"Container '{name}' on server '{server.name}' has no published HTTP port")
+    return int(port)
+
+def create_odoo_container(server, instance):
+    """Creates and starts a new Odoo container for the given instance on the specified server.
+
+    The HTTP port is published on a host port picked by the daemon, so containers never
+    compete for one; it is returned for the instance to record.
+    """
+    if server.server_type == 'docker':
+        with docker_client(server) as client:
+            ensure_image(server, odoo_image(instance), client=client)
+            with metrics_utils.span('docker.create', server, instance):
+                client.containers.run(
+                    image=odoo_image(instance),
+                    name=instance.db_name,
+                    detach=True,
+                    environment={
+                        'HOST': 'db',
+                        'USER': 'odoo',
+                        'PASSWORD': 'odoo',
+                    },
+                    ports={ODOO_HTTP_PORT: None},
+                )
+            return published_port(server, instance.db_name, client=client)
+    command = f"docker run -d --name {instance.db_name} -p 8069 -e HOST=db -e USER=odoo -e PASSWORD=odoo {odoo_image(instance)}"
+    with ssh_utils.ssh_connection(server) as ssh_client:
+        ensure_image(server, odoo_image(instance), ssh_client=ssh_client)
+        with metrics_utils.span('docker.create', server, instance):
+            _ssh_docker(server, ssh_client, command)
+        return published_port(server, instance.db_name, ssh_client=ssh_client)
+
+def stop_odoo_container(server, instance):
+    """Stops the Odoo container for the given instance on the specified server."""
+    with metrics_utils.span('docker.stop', server, instance):
+        if server.server_type == 'docker':
+            try:
+                with docker_client(server) as client:
+                    container = client.containers.get(instance.db_name)
+                    container.stop()
+            except docker.errors.NotFound:
+                pass
+        else:
+            command = f"docker stop {instance.db_name}"
+            with ssh_utils.ssh_connection(server) as ssh_client:
+                _ssh_docker(server, ssh_client, command, missing_ok=True)
+
+def start_odoo_container(server, instance):
+    """Starts the Odoo container for the given instance on the specified server.
+
+    :return: the host port of the started container (the daemon may pick a new one), or
+        None when the container does not exist
+    """
+    with metrics_utils.span('docker.start', server, instance):
+        if server.server_type == 'docker':
+            try:
+                with docker_client(server) as client:
+                    container = client.containers.get(instance.db_name)
+                    container.start()
+                    return published_port(server, instance.db_name, client=client)
+            except docker.errors.NotFound:
+                return None
+        else:
+            command = f"docker start {instance.db_name}"
+            with ssh_utils.ssh_connection(server) as ssh_client:
+                if 'No such container' in _ssh_docker(server, ssh_client, command, missing_ok=True):
+                    return None
+                return published_port(server, instance.db_name, ssh_client=ssh_client)
 
 def remove_odoo_container(server, instance):
     """Removes the Odoo container for the given instance on the specified server."""
+    with metrics_utils.span('docker.remove', server, instance):
+        if server.server_type == 'docker':
+            try:
+                with docker_client(server) as client:
+                    container = client.containers.get(instance.db_name)
+                    container.remove(force=True)
+            except docker.errors.NotFound:
+                pass
+        else:
+            command = f"docker rm -f {instance.db_name}"
+            with ssh_utils.ssh_connection(server) as ssh_client:
+                _ssh_docker(server, ssh_client, command, missing_ok=True)
+
+def list_container_states(server):
+    """Returns ``{container name: state}`` (``running``, ``exited``, ...) for every container of the server."""
     if server.server_type == 'docker':
-        client = get_docker_client(server)
-        try:
-            container = client.containers.get(instance.db_name)
-            container.remove(force=True)
-        except docker.errors.NotFound:
-            pass
-    else:
-        ssh_client = ssh_utils.get_ssh_client(server)
-        command = f"docker rm -f {instance.db_name}"
-        ssh_utils.execute_ssh_command(ssh_client, command)
-        ssh_utils.close_ssh_client(ssh_client) 
\ No newline at end of file
+        with metrics_utils.span('docker.list', server), docker_client(server) as client:
+            return {container.name: container.status for container in client.containers.list(all=True)}
+    with ssh_utils.ssh_connection(server) as ssh_client:
+        ok, output = ssh_utils.execute_ssh_command(ssh_client, "docker ps -a --format '{{.Names}}\t{{.State}}'")
+    if not ok:
+        raise RuntimeError(f"docker ps failed on server '{server.name}': {output}")
+    return dict(line.split('\t', 1) for line in output.splitlines() if '\t' in line)
+
+_SIZE_UNITS = {'b': 1, 'kb': 1e3, 'kib': 1024, 'mb': 1e6, 'mib': 1024 ** 2, 'gb': 1e9, 'gib': 1024 ** 3, 'tb': 1e12, 'tib': 1024 ** 4}
+
+def _parse_size_mb(value):
+    """Converts a ``docker stats`` size such as ``512.3MiB`` to megabytes."""
+    match = re.match(r'\s*([\d.]+)\s*([a-zA-Z]+)', value or '')
+    if not match:
+        return 0.0
+    return float(match.group(1)) * _SIZE_UNITS.get(match.group(2).lower(), 1) / 1024 ** 2
+
+def _api_container_stats(container):
+    stats = container.stats(stream=False)
+    cpu = stats.get('cpu_stats', {})
+    precpu = stats.get('precpu_stats', {})
+    cpu_delta = cpu.get('cpu_usage', {}).get('total_usage', 0) - precpu.get('cpu_usage', {}).get('total_usage', 0)
+    system_delta = cpu.get('system_cpu_usage', 0) - precpu.get('system_cpu_usage', 0)
+    online_cpus = cpu.get('online_cpus') or len(cpu.get('cpu_usage', {}).get('percpu_usage') or []) or 1
+    memory = stats.get('memory_stats', {}).get('usage', 0)
+    return container.name, {
+        'cpu_usage': cpu_delta / system_delta * online_cpus * 100.0 if system_delta > 0 else 0.0,
+        'memory_usage': memory / 1024.0 ** 2,
+    }
+
+def collect_container_stats(server):
+    """Returns ``{container name: {'cpu_usage': %, 'memory_usage': MB}}`` for every running container.
+
+    Over SSH this is a single ``docker stats --no-stream`` round trip; through the Docker API it is
+    one sweep fanned out over the cached client's connection pool.
+    """
+    if server.server_type == 'docker':
+        with metrics_utils.span('docker.stats', server), docker_client(server) as client:
+            containers = client.containers.list()
+            if not containers:
+                return {}
+            with ThreadPoolExecutor(max_workers=min(DOCKER_POOL_SIZE, len(containers))) as executor:
+                return dict(executor.map(_api_container_stats, containers))
+    with ssh_utils.ssh_connection(server) as ssh_client:
+        ok, output = ssh_utils.execute_ssh_command(ssh_client, "docker stats --no-stream --format '{{json .}}'")
+    if not ok:
+        raise RuntimeError(f"docker stats failed on server '{server.name}': {output}")
+    result = {}
+    for line in output.splitlines():
+        if not line.strip():
+            continue
+        row = json.loads(line)
+        result[row['Name']] = {
+            'cpu_usage': float(row.get('CPUPerc', '0').rstrip('%') or 0.0),
+            'memory_usage': _parse_size_mb(row.get('MemUsage', '').split('/')[0]),
+        }
+    return result
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import bisect
+import logging
+import ssl
+import time
+from urllib.parse import urlsplit
+from . import docker_utils
+
+_logger = logging.getLogger(__name__)
+
+HEALTH_PATH = '/web/health'
+HEALTH_CONCURRENCY = 200  # HTTP probes in flight at once
+HEALTH_TIMEOUT = 5.0  # seconds per probe, connect and response line included
+HEALTH_SERVER_CONCURRENCY = 8  # servers queried for container states at once
+LATENCY_BUCKETS = (50, 100, 250, 500, 1000, 2500, 5000)  # upper bounds in ms, plus an overflow bucket
+
+
+def bucket_label(latency):
+    """Returns the histogram bucket of a latency in ms, e.g. ``'<=250'`` or ``'>5000'``."""
+    index = bisect.bisect_left(LATENCY_BUCKETS, latency)
+    return f"<={LATENCY_BUCKETS[index]}" if index < len(LATENCY_BUCKETS) else f">{LATENCY_BUCKETS[-1]}"
+
+
+def histogram(latencies, into=None):
+    """Counts ``latencies`` per bucket, adding to the ``into`` histogram when given."""
+    result = dict(into or {})
+    for latency in latencies:
+        label = bucket_label(latency)
+        result[label] = result.get(label, 0) + 1
+    return result
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+async def probe_http(url, timeout=HEALTH_TIMEOUT):
+    """GETs ``url`` and returns ``{'ok', 'status', 'latency' (ms), 'error'}``; only a 200 is healthy."""
+    parts = urlsplit(url)
+    secure = parts.scheme == 'https'
+    port = parts.port or (443 if secure else 80)
+    path = (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+    start = time.perf_counter()
+    writer = None
+
+    async def exchange():
+        nonlocal writer
+        reader, writer = await asyncio.open_connection(
+            parts.hostname, port, ssl=ssl.create_default_context() if secure else None)
+        writer.write((f"GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+                      f"User-Agent: saas-health-prober\r\nConnection: close\r\n\r\n").encode())
+        await writer.drain()
+        return await reader.readline()
+
+    try:
+        status_line = await asyncio.wait_for(exchange(), timeout)
+        status = int(status_line.split()[1])
+        return {'ok': status == 200, 'status': status, 'latency': (time.perf_counter() - start) * 1000.0,
+                'error': False if status == 200 else f"HTTP {status}"}
+    except asyncio.TimeoutError:
+        return {'ok': False, 'status': 0, 'latency': timeout * 1000.0, 'error': f"timeout after {timeout}s"}
+    except Exception as e:
+        return {'ok': False, 'status': 0, 'latency': (time.perf_counter() - start) * 1000.0,
+                'error': str(e) or e.__class__.__name__}
+    finally:
+        if writer is not None:
+            writer.close()
+            try:
+                await asyncio.wait_for(writer.wait_closed(), timeout)
+            except Exception:
+                pass  # the probe result is known already, a failed close changes nothing
+
+
+async def probe_all(targets, concurrency=HEALTH_CONCURRENCY, timeout=HEALTH_TIMEOUT):
+    """Probes ``{key: url}`` with at most ``concurrency`` requests in flight; returns ``{key: result}``."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(key, url):
+        async with semaphore:
+            return key, await probe_http(url, timeout)
+
+    return dict(await asyncio.gather(*(bounded(key, url) for key, url in targets.items())))
+
+
+async def _container_states(servers):
+    """Lists container states of every server in worker threads; a failed server maps to ``None``."""
+    semaphore = asyncio.Semaphore(HEALTH_SERVER_CONCURRENCY)
+
+    async def fetch(server):
+        async with semaphore:
+            try:
+                return server.id, await asyncio.to_thread(docker_utils.list_container_states, server)
+            except Exception as e:
+                _logger.warning(f"Could not list containers on server '{server.name}': {e}")
+                return server.id, None
+
+    return dict(await asyncio.gather(*(fetch(server) for server in servers)))
+
+
+def run_health_round(targets, servers, concurrency=HEALTH_CONCURRENCY, timeout=HEALTH_TIMEOUT):
+    """Runs the HTTP probes and the container listings concurrently on a private event loop.
+
+    :param targets: dict mapping a key (the instance id) to the URL to probe
+    :param servers: plain server snapshots, see ``saas.server._remote_snapshot``
+    :return: ``(http results by key, {server id: {container name: state} or None})``
+    """
+    async def main():
+        return await asyncio.gather(probe_all(targets, concurrency, timeout), _container_states(servers))
+
+    http_results, container_states = asyncio.run(main())
+    return http_results, container_states
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from odoo import models
+from odoo.tools import config
+from . import metrics_utils
+
+CRON_TIME_LIMIT_SHARE = 0.8  # share of the cron real-time limit a resumable cron run may spend
+
+
+def cron_time_budget(default):
+    """Seconds a resumable cron run may keep working: ``default``, capped below the cron real-time limit.
+
+    The limit is ``limit_time_real_cron``, or ``limit_time_real`` when that is -1; a worker
+    past it is killed, so the run has to stop early enough to commit and hand over.
+    """
+    limit = config.get('limit_time_real_cron', -1)
+    if limit is None or limit < 0:
+        limit = config.get('limit_time_real')
+    if not limit or limit <= 0:
+        return default
+    return min(default, limit * CRON_TIME_LIMIT_SHARE)
+
+
+class IrCron(models.Model):
+    _inherit = 'ir.cron'
+
+    def _callback(self, *args, **kwargs):
+        try:
+            return super()._callback(*args, **kwargs)
+        finally:
+            # Crons do most of the remote work; persist what they timed once the job is over.
+            if metrics_utils.has_pending(self.env.cr.dbname):
+                self.env['saas.operation.stat']._flush_pending_new_cursor()
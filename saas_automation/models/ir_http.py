@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+from odoo import models
+from odoo.http import request
+from . import metrics_utils
+
+
+class IrHttp(models.AbstractModel):
+    _inherit = 'ir.http'
+
+    @classmethod
+    def _post_dispatch(cls, response):
+        super()._post_dispatch(response)
+        # Operations started from a button (deploy, nginx sync, ...) are timed in HTTP workers.
+        if request.db and metrics_utils.has_pending(request.db):
+            request.env['saas.operation.stat']._flush_pending_new_cursor()
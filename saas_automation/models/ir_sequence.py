@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from odoo import models, api
+
+
+class IrSequence(models.Model):
+    _inherit = 'ir.sequence'
+
+    @api.model
+    def _next_by_code_block(self, sequence_code, count):
+        """Like ``next_by_code`` but reserves ``count`` consecutive values in a single round trip.
+
+        :return: list of ``count`` formatted values, or ``count`` times ``False`` when no
+            sequence has this code
+        """
+        if count <= 0:
+            return []
+        self.check_access('read')
+        company_id = self.env.company.id
+        sequence = self.search([('code', '=', sequence_code), ('company_id', 'in', [company_id, False])],
+                               order='company_id', limit=1)
+        if not sequence:
+            return [False] * count
+        sequence = sequence.sudo()
+        if sequence.use_date_range:
+            # Date ranges pick their sub-sequence per value, keep the regular path for them.
+            return [sequence._next() for _i in range(count)]
+        if sequence.implementation == 'standard':
+            self.env.cr.execute("SELECT nextval(%s) FROM generate_series(1, %s)",
+                                (f'ir_sequence_{sequence.id:03d}', count))
+            numbers = [row[0] for row in self.env.cr.fetchall()]
+        else:
+            self.env.cr.execute("SELECT number_next FROM ir_sequence WHERE id = %s FOR UPDATE NOWAIT", (sequence.id,))
+            [first] = self.env.cr.fetchone()
+            self.env.cr.execute("UPDATE ir_sequence SET number_next = number_next + number_increment * %s WHERE id = %s",
+                                (count, sequence.id))
+            sequence.invalidate_recordset(['number_next'])
+            numbers = [first + i * sequence.number_increment for i in range(count)]
+        return [sequence.get_next_char(number) for number in numbers]
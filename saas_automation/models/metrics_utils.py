@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+_logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the duration histogram buckets, Prometheus style
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+_lock = threading.Lock()
+_histograms = {}  # (operation, server name, outcome) -> _Histogram, for the lifetime of the process
+_pending = {}  # (database, server id, operation) -> [count, errors, total seconds, max seconds, bytes], until persisted
+
+
+class _Histogram(object):
+    __slots__ = ('buckets', 'total', 'count', 'bytes')
+
+    def __init__(self):
+        self.buckets = [0] * (len(DURATION_BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.bytes = 0
+
+
+class Span(object):
+    """Timing of one remote operation; set ``bytes`` and ``outcome`` before it finishes."""
+    __slots__ = ('operation', 'server', 'instance', 'start', 'bytes', 'outcome')
+
+    def __init__(self, operation, server=None, instance=None):
+        self.operation = operation
+        self.server = server
+        self.instance = instance
+        self.start = time.perf_counter()
+        self.bytes = 0
+        self.outcome = 'ok'
+
+    def finish(self):
+        duration = time.perf_counter() - self.start
+        record(self.operation, self.server, duration, self.outcome, self.bytes)
+        if _logger.isEnabledFor(logging.DEBUG):
+            _logger.debug(f"span operation={self.operation} server={getattr(self.server, 'name', '')} "
+                          f"instance={getattr(self.instance, 'name', '')} duration={duration:.4f} "
+                          f"bytes={self.bytes} outcome={self.outcome}")
+        return duration
+
+
+@contextmanager
+def span(operation, server=None, instance=None):
+    """Times the block as ``operation`` on ``server``; an exception marks the span as an error.
+
+    Server and instance may be records or plain snapshots, only ``id`` and ``name`` are read.
+    Instances are only logged (at debug level), never used as a metric label.
+    """
+    current = Span(operation, server, instance)
+    try:
+        yield current
+    except Exception:
+        current.outcome = 'error'
+        raise
+    finally:
+        current.finish()
+
+
+def _dbname(server):
+    """Database of ``server``: snapshots carry it, records have their cursor, else the thread's."""
+    dbname = getattr(server, 'dbname', None)
+    if dbname is None and getattr(server, 'env', None) is not None:
+        dbname = server.env.cr.dbname
+    return dbname or getattr(threading.current_thread(), 'dbname', None)
+
+
+def record(operation, server, duration, outcome='ok', nbytes=0):
+    server_id = getattr(server, 'id', None) or None
+    dbname = _dbname(server) if server_id else None
+    server_name = getattr(server, 'name', None) or ''
+    index = bisect.bisect_left(DURATION_BUCKETS, duration)
+    with _lock:
+        histogram = _histograms.get((operation, server_name, outcome))
+        if histogram is None:
+            histogram = _histograms[(operation, server_name, outcome)] = _Histogram()
+        histogram.buckets[index] += 1
+        histogram.total += duration
+        histogram.count += 1
+        histogram.bytes += nbytes
+        if server_id and dbname:
+            pending = _pending.get((dbname, server_id, operation))
+            if pending is None:
+                pending = _pending[(dbname, server_id, operation)] = [0, 0, 0.0, 0.0, 0]
+            pending[0] += 1
+            pending[1] += outcome != 'ok'
+            pending[2] += duration
+            pending[3] = max(pending[3], duration)
+            pending[4] += nbytes
+
+
+def has_pending(dbname):
+    with _lock:
+        return any(key[0] == dbname for key in _pending)
+
+
+def drain_pending(dbname):
+    """Returns and resets the aggregates of ``dbname`` recorded since its last drain.
+
+    :return: dict ``{(server id, operation): [count, errors, total, max, bytes]}``
+    """
+    with _lock:
+        keys = [key for key in _pending if key[0] == dbname]
+        return {key[1:]: _pending.pop(key) for key in keys}
+
+
+def restore_pending(dbname, pending):
+    """Merges back aggregates of ``dbname`` that could not be persisted."""
+    with _lock:
+        for (server_id, operation), (count, errors, total, longest, nbytes) in pending.items():
+            current = _pending.setdefault((dbname, server_id, operation), [0, 0, 0.0, 0.0, 0])
+            current[0] += count
+            current[1] += errors
+            current[2] += total
+            current[3] = max(current[3], longest)
+            current[4] += nbytes
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus(extra_gauges=None):
+    """Renders the histograms of this process in the Prometheus text exposition format.
+
+    :param extra_gauges: optional dict ``{metric name: (help, value)}`` appended as gauges
+    """
+    with _lock:
+        items = sorted((key, (list(h.buckets), h.total, h.count, h.bytes)) for key, h in _histograms.items())
+    lines = [
+        '# HELP saas_remote_operation_duration_seconds Duration of remote operations.',
+        '# TYPE saas_remote_operation_duration_seconds histogram',
+    ]
+    for (operation, server, outcome), (buckets, total, count, _bytes) in items:
+        labels = f'operation="{_label(operation)}",server="{_label(server)}",outcome="{_label(outcome)}"'
+        cumulative = 0
+        for bound, bucket in zip(DURATION_BUCKETS, buckets):
+            cumulative += bucket
+            lines.append(f'saas_remote_operation_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'saas_remote_operation_duration_seconds_bucket{{{labels},le="+Inf"}} {count}')
+        lines.append(f'saas_remote_operation_duration_seconds_sum{{{labels}}} {total}')
+        lines.append(f'saas_remote_operation_duration_seconds_count{{{labels}}} {count}')
+    lines += [
+        '# HELP saas_remote_operation_bytes_total Bytes transferred by remote operations.',
+        '# TYPE saas_remote_operation_bytes_total counter',
+    ]
+    for (operation, server, outcome), (_buckets, _total, _count, nbytes) in items:
+        lines.append(f'saas_remote_operation_bytes_total{{operation="{_label(operation)}",'
+                     f'server="{_label(server)}",outcome="{_label(outcome)}"}} {nbytes}')
+    for name, (help_text, value) in sorted((extra_gauges or {}).items()):
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge', f'{name} {value}']
+    return '\n'.join(lines) + '\n'
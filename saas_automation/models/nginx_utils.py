@@ -1,41 +1,232 @@
 # -*- coding: utf-8 -*-
+import hashlib
+import io
 import logging
+import re
+import shlex
+from . import metrics_utils
 from . import ssh_utils
 
 _logger = logging.getLogger(__name__)
 
+SITES_AVAILABLE = '/etc/nginx/sites-available'
+SITES_ENABLED = '/etc/nginx/sites-enabled'
+_DOMAIN_RE = re.compile(r'^(?=.{1,253}$)[A-Za-z0-9]([A-Za-z0-9-]{0,61}[A-Za-z0-9])?(\.[A-Za-z0-9]([A-Za-z0-9-]{0,61}[A-Za-z0-9])?)+$')
+
+# Performance profiles selectable per plan (``saas.plan.nginx_profile``)
+NGINX_PROFILES = {
+    'basic': {
+        'keepalive': 8,
+        'static_cache': False,
+        'gzip': False,
+        'brotli': False,  # only rendered for servers whose nginx has the brotli module
+        'rate': 10,  # requests/second per client IP, 0 disables limiting
+        'burst': 20,
+    },
+    'standard': {
+        'keepalive': 32,
+        'static_cache': True,
+        'gzip': True,
+        'brotli': True,
+        'rate': 30,
+        'burst': 60,
+    },
+    'performance': {
+        'keepalive': 128,
+        'static_cache': True,
+        'gzip': True,
+        'brotli': True,
+        'rate': 0,
+        'burst': 0,
+    },
+}
+DEFAULT_NGINX_PROFILE = 'standard'
+NGINX_CACHE_ROOT = '/var/cache/nginx/saas'
+SSL_CERT_ROOT = '/etc/letsencrypt/live'
+_COMPRESSED_TYPES = 'text/css text/plain text/xml application/javascript application/json application/xml image/svg+xml'
+
+def _zone_name(domain):
+    """Stable identifier for the upstream, cache and rate limit zones of a vhost."""
+    return 'saas_' + hashlib.sha1(domain.encode()).hexdigest()[:16]
+
+def _proxy_headers(indent):
+    pad = ' ' * indent
+    return (f"{pad}proxy_set_header Host $host;\n"
+            f"{pad}proxy_set_header X-Real-IP $remote_addr;\n"
+            f"{pad}proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;\n"
+            f"{pad}proxy_set_header X-Forwarded-Proto $scheme;\n")
+
+def render_vhost(domain, host, port, longpolling_port, profile=DEFAULT_NGINX_PROFILE, ssl=False, brotli=False):
+    """Renders the vhost of one instance. Pure function of its arguments, so the output can be
+    compared byte for byte against reference files without a database or a server.
+
+    :param domain: public host name served by the vhost
+    :param host: host running the Odoo container
+    :param port: HTTP port of the container
+    :param longpolling_port: gevent port of the container, serving ``/websocket`` and ``/longpolling``
+    :param profile: key of :data:`NGINX_PROFILES`
+    :param ssl: serve over HTTPS/HTTP2 with the Let's Encrypt certificate of ``domain``
+    :param brotli: the server's nginx has the brotli module; without it, ``brotli`` directives
+        would fail ``nginx -t``, so only gzip is rendered
+    """
+    settings = NGINX_PROFILES[profile]
+    zone = _zone_name(domain)
+    out = [f"# Generated by saas_automation, profile '{profile}'. Do not edit.\n"]
+    out.append(f"upstream {zone} {{\n    server {host}:{port};\n")
+    if settings['keepalive']:
+        out.append(f"    keepalive {settings['keepalive']};\n")
+    out.append("}\n")
+    out.append(f"upstream {zone}_lp {{\n    server {host}:{longpolling_port};\n}}\n")
+    if settings['static_cache']:
+        out.append(f"proxy_cache_path {NGINX_CACHE_ROOT}/{zone} levels=1:2 keys_zone={zone}_static:10m "
+                   f"max_size=1g inactive=7d use_temp_path=off;\n")
+    if settings['rate']:
+        out.append(f"limit_req_zone $binary_remote_addr zone={zone}_req:10m rate={settings['rate']}r/s;\n")
+    out.append("\n")
+
+    if ssl:
+        out.append(f"server {{\n    listen 80;\n    server_name {domain};\n"
+                   f"    return 301 https://$host$request_uri;\n}}\n\n")
+        out.append(f"server {{\n    listen 443 ssl http2;\n    server_name {domain};\n"
+                   f"    ssl_certificate {SSL_CERT_ROOT}/{domain}/fullchain.pem;\n"
+                   f"    ssl_certificate_key {SSL_CERT_ROOT}/{domain}/privkey.pem;\n"
+                   f"    ssl_session_cache shared:SSL:10m;\n")
+    else:
+        out.append(f"server {{\n    listen 80;\n    server_name {domain};\n")
+    out.append("    proxy_http_version 1.1;\n    proxy_read_timeout 720s;\n")
+    if settings['gzip']:
+        out.append(f"    gzip on;\n    gzip_comp_level 5;\n    gzip_min_length 1024;\n    gzip_proxied any;\n"
+                   f"    gzip_vary on;\n    gzip_types {_COMPRESSED_TYPES};\n")
+    if settings['brotli'] and brotli:
+        out.append(f"    brotli on;\n    brotli_comp_level 5;\n    brotli_min_length 1024;\n"
+                   f"    brotli_types {_COMPRESSED_TYPES};\n")
+    out.append("\n")
+
+    out.append(f"    location ~ ^/(websocket|longpolling) {{\n"
+               f"        proxy_pass http://{zone}_lp;\n"
+               f"        proxy_set_header Upgrade $http_upgrade;\n"
+               f"        proxy_set_header Connection \"upgrade\";\n"
+               f"{_proxy_headers(8)}    }}\n\n")
+    if settings['static_cache']:
+        out.append(f"    location ~* ^/web/(static|assets|image)/ {{\n"
+                   f"        proxy_pass http://{zone};\n"
+                   f"        proxy_set_header Connection \"\";\n"
+                   f"{_proxy_headers(8)}"
+                   f"        proxy_cache {zone}_static;\n"
+                   f"        proxy_cache_valid 200 60m;\n"
+                   f"        proxy_cache_use_stale error timeout updating;\n"
+                   f"        proxy_cache_lock on;\n"
+                   f"        expires 24h;\n"
+                   f"        add_header X-Cache-Status $upstream_cache_status;\n"
+                   f"    }}\n\n")
+    out.append(f"    location / {{\n        proxy_pass http://{zone};\n        proxy_set_header Connection \"\";\n")
+    out.append(_proxy_headers(8))
+    if settings['rate']:
+        out.append(f"        limit_req zone={zone}_req burst={settings['burst']} nodelay;\n"
+                   f"        limit_req_status 429;\n")
+    out.append("    }\n}\n")
+    return ''.join(out)
+
 def get_nginx_config(instance):
-    """Generates the Nginx configuration for the specified instance."""
-    return f"""
-server {{
-    listen 80;
-    server_name {instance.custom_domain};
-
-    location / {{
-        proxy_pass http://{instance.server_id.host}:{instance.port};
-        proxy_set_header Host $host;
-        proxy_set_header X-Real-IP $remote_addr;
-        proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
-    }}
-}}
-"""
-
-def create_nginx_config(server, instance):
-    """Creates a new Nginx configuration file for the specified instance on the given server."""
-    ssh_client = ssh_utils.get_ssh_client(server)
-    config = get_nginx_config(instance)
-    config_path = f"/etc/nginx/sites-available/{instance.custom_domain}"
-    command = f"echo '{config}' > {config_path}"
-    ssh_utils.execute_ssh_command(ssh_client, command)
-    ssh_utils.execute_ssh_command(ssh_client, f"ln -s {config_path} /etc/nginx/sites-enabled/")
-    ssh_utils.execute_ssh_command(ssh_client, "systemctl reload nginx")
-    ssh_utils.close_ssh_client(ssh_client)
-
-def remove_nginx_config(server, instance):
-    """Removes the Nginx configuration file for the specified instance on the given server."""
-    ssh_client = ssh_utils.get_ssh_client(server)
-    config_path = f"/etc/nginx/sites-available/{instance.custom_domain}"
-    ssh_utils.execute_ssh_command(ssh_client, f"rm {config_path}")
-    ssh_utils.execute_ssh_command(ssh_client, f"rm /etc/nginx/sites-enabled/{instance.custom_domain}")
-    ssh_utils.execute_ssh_command(ssh_client, "systemctl reload nginx")
-    ssh_utils.close_ssh_client(ssh_client) 
\ No newline at end of file
+    """Generates the Nginx configuration for the specified instance, tuned by its plan's profile."""
+    return render_vhost(
+        instance.custom_domain,
+        instance.server_id.host,
+        instance.port,
+        instance.longpolling_port,
+        profile=instance.plan_id.nginx_profile or DEFAULT_NGINX_PROFILE,
+        ssl=instance.ssl_enabled,
+        brotli=instance.server_id.nginx_brotli,
+    )
+
+def is_valid_domain(domain):
+    """Returns whether ``domain`` is a plain host name, safe to use as a file name and in shell commands."""
+    return bool(domain and _DOMAIN_RE.match(domain))
+
+def config_hash(content):
+    return hashlib.sha256(content.encode()).hexdigest()
+
+def _run_steps(ssh_client, steps):
+    """Runs ``(command, undo)`` steps one by one, stopping at the first non-zero exit status.
+
+    :return: tuple (error output or None, undo commands of the steps attempted, latest first)
+    """
+    undo = []
+    for command, undo_command in steps:
+        if undo_command:
+            undo.insert(0, undo_command)
+        status, output = ssh_utils.run_ssh_command(ssh_client, command)
+        if status:
+            return f"'{command}' exited with status {status}: {output}", undo
+    return None, undo
+
+def _run_each(ssh_client, server, commands):
+    """Best-effort commands (rollback, cleanup): every one runs, failures are only logged."""
+    for command in commands:
+        status, output = ssh_utils.run_ssh_command(ssh_client, command)
+        if status:
+            _logger.error(f"'{command}' failed on server '{server.name}' (status {status}): {output}")
+
+def sync_vhosts(server, desired, deployed):
+    """Reconciles the vhosts of ``server`` with ``desired`` over a single pooled connection.
+
+    Only files whose hash differs from ``deployed`` are uploaded (via SFTP, to a staging name),
+    files no longer desired are removed, then everything is swapped in, checked with ``nginx -t``
+    and nginx is reloaded once. If the check fails every touched file is put back as it was.
+
+    :param desired: dict mapping file name (the domain) to its rendered configuration
+    :param deployed: dict mapping file name to the hash of what was last deployed
+    :return: dict mapping file name to the hash now deployed
+    """
+    desired_hashes = {name: config_hash(content) for name, content in desired.items()}
+    changed = [name for name in desired if deployed.get(name) != desired_hashes[name]]
+    removed = [name for name in deployed if name not in desired]
+    if not changed and not removed:
+        return desired_hashes
+
+    def paths(name):
+        available = shlex.quote(f"{SITES_AVAILABLE}/{name}")
+        return available, shlex.quote(f"{SITES_AVAILABLE}/{name}.saas-prev"), shlex.quote(f"{SITES_ENABLED}/{name}")
+
+    swap, cleanup = [(f"mkdir -p {NGINX_CACHE_ROOT}", None)], []
+    for name in changed:
+        available, previous, enabled = paths(name)
+        staged = shlex.quote(f"{SITES_AVAILABLE}/{name}.saas-new")
+        swap.append((f"{{ [ ! -e {available} ] || mv -f {available} {previous}; }} && mv -f {staged} {available} && ln -sfn {available} {enabled}",
+                     f"if [ -e {previous} ]; then mv -f {previous} {available}; else rm -f {available} {enabled}; fi"))
+        cleanup.append(f"rm -f {previous}")
+    for name in removed:
+        available, previous, enabled = paths(name)
+        swap.append((f"{{ [ ! -e {available} ] || mv -f {available} {previous}; }} && rm -f {enabled}",
+                     f"if [ -e {previous} ]; then mv -f {previous} {available} && ln -sfn {available} {enabled}; fi"))
+        cleanup.append(f"rm -f {previous}")
+
+    with metrics_utils.span('nginx.sync', server) as sync_timing, ssh_utils.ssh_connection(server) as ssh_client:
+        with metrics_utils.span('nginx.upload', server) as upload_timing:
+            sftp = ssh_client.open_sftp()
+            try:
+                for name in changed:
+                    content = desired[name].encode()
+                    sftp.putfo(io.BytesIO(content), f"{SITES_AVAILABLE}/{name}.saas-new")
+                    upload_timing.bytes += len(content)
+            finally:
+                sftp.close()
+        sync_timing.bytes = upload_timing.bytes
+        error, rollback = _run_steps(ssh_client, swap)
+        if not error:
+            with metrics_utils.span('nginx.test', server) as test_timing:
+                status, output = ssh_utils.run_ssh_command(ssh_client, "nginx -t")
+                if status:
+                    error = output
+                    test_timing.outcome = 'error'
+        if error:
+            _run_each(ssh_client, server, rollback)
+            raise RuntimeError(f"nginx configuration rejected on server '{server.name}': {error}")
+        _run_each(ssh_client, server, cleanup)
+        with metrics_utils.span('nginx.reload', server) as reload_timing:
+            status, output = ssh_utils.run_ssh_command(ssh_client, "systemctl reload nginx")
+            if status:
+                reload_timing.outcome = 'error'
+                raise RuntimeError(f"nginx reload failed on server '{server.name}': {output}")
+    _logger.info(f"Synced nginx on '{server.name}': {len(changed)} updated, {len(removed)} removed, 1 reload")
+    return desired_hashes
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+import docker
+import logging
+import shlex
+from types import SimpleNamespace
+from . import docker_utils
+from . import metrics_utils
+from . import ssh_utils
+
+_logger = logging.getLogger(__name__)
+
+PG_CONTAINER = 'db'  # PostgreSQL container the Odoo containers reach as HOST=db
+PG_USER = 'odoo'
+TEMPLATE_PREFIX = 'saas_template_'
+POOL_SLOT_PREFIX = 'saas_pool_'  # containers and databases waiting in the warm pool
+TERMINATE_TIMEOUT_MS = 5000  # wait for backends of a pooled database to exit before renaming it
+
+
+def template_db_name(odoo_version):
+    return f"{TEMPLATE_PREFIX}{odoo_version.replace('.', '_')}"
+
+def _ident(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def _literal(value):
+    return "'" + value.replace("'", "''") + "'"
+
+def _run(server, api_call, command):
+    """Runs ``api_call(client)`` on Docker API servers, ``command`` over SSH otherwise; returns the output."""
+    if server.server_type == 'docker':
+        with docker_utils.docker_client(server) as client:
+            return api_call(client)
+    with ssh_utils.ssh_connection(server) as ssh_client:
+        status, output = ssh_utils.run_ssh_command(ssh_client, command)
+    if status:
+        raise RuntimeError(f"'{command}' failed on server '{server.name}': {output}")
+    return output
+
+def _psql(server, *statements):
+    """Runs each statement in its own transaction on the server's PostgreSQL container."""
+    args = ['psql', '-U', PG_USER, '-d', 'postgres', '-q', '-t', '-A', '-v', 'ON_ERROR_STOP=1']
+    for statement in statements:
+        args += ['-c', statement]
+
+    def api_call(client):
+        exit_code, output = client.containers.get(PG_CONTAINER).exec_run(args)
+        output = output.decode(errors='replace') if isinstance(output, bytes) else output
+        if exit_code:
+            raise RuntimeError(f"psql failed on server '{server.name}': {output}")
+        return output
+
+    return _run(server, api_call, f"docker exec {PG_CONTAINER} " + ' '.join(shlex.quote(arg) for arg in args))
+
+def ensure_template(server, odoo_version):
+    """Initializes the template database of ``odoo_version`` on the server unless it exists already."""
+    template = template_db_name(odoo_version)
+    if _psql(server, f"SELECT 1 FROM pg_database WHERE datname = {_literal(template)}").strip():
+        return False
+    image = docker_utils.image_for_version(odoo_version)
+    environment = {'HOST': 'db', 'USER': 'odoo', 'PASSWORD': 'odoo'}
+    odoo_args = ['odoo', '-d', template, '-i', 'base', '--without-demo=all', '--stop-after-init']
+    with metrics_utils.span('pool.template', server):
+        _run(server,
+             lambda client: client.containers.run(image, command=odoo_args, environment=environment, remove=True),
+             f"docker run --rm -e HOST=db -e USER=odoo -e PASSWORD=odoo {image} " + ' '.join(odoo_args))
+        # Nobody may connect to a template while it is cloned.
+        _psql(server, f"ALTER DATABASE {_ident(template)} WITH ALLOW_CONNECTIONS false")
+    _logger.info(f"Initialized template database '{template}' on server '{server.name}'")
+    return True
+
+def warm_slot(server, name, odoo_version):
+    """Clones the template into database ``name`` and starts an idle container of the same name."""
+    with metrics_utils.span('pool.warm', server):
+        _psql(server, f"CREATE DATABASE {_ident(name)} TEMPLATE {_ident(template_db_name(odoo_version))}")
+        docker_utils.create_odoo_container(server, SimpleNamespace(id=None, name=name, db_name=name,
+                                                                   odoo_version=odoo_version))
+
+def claim_slot(server, name, db_name):
+    """Hands the warm database and container ``name`` over to a tenant by renaming both to ``db_name``.
+
+    :return: the host port the container publishes Odoo's HTTP port on
+    """
+    _psql(server,
+          f"SELECT pg_terminate_backend(pid, {TERMINATE_TIMEOUT_MS}) FROM pg_stat_activity "
+          f"WHERE datname = {_literal(name)}",
+          f"ALTER DATABASE {_ident(name)} RENAME TO {_ident(db_name)}")
+    _run(server,
+         lambda client: client.containers.get(name).rename(db_name),
+         f"docker rename {shlex.quote(name)} {shlex.quote(db_name)}")
+    if server.server_type == 'docker':
+        with docker_utils.docker_client(server) as client:
+            return docker_utils.published_port(server, db_name, client=client)
+    with ssh_utils.ssh_connection(server) as ssh_client:
+        return docker_utils.published_port(server, db_name, ssh_client=ssh_client)
+
+def discard_slot(server, name):
+    """Removes the container and database of a slot that failed or is no longer wanted."""
+    def api_call(client):
+        try:
+            client.containers.get(name).remove(force=True)
+        except docker.errors.NotFound:
+            pass
+
+    _run(server, api_call, f"docker rm -f {shlex.quote(name)} 2>/dev/null || true")
+    _psql(server, f"DROP DATABASE IF EXISTS {_ident(name)}")
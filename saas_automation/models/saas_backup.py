@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import time
+from collections import defaultdict
+from odoo import models, fields, api, tools, _
+from odoo.exceptions import UserError
+from odoo.tools import split_every
+from . import backup_utils
+
+_logger = logging.getLogger(__name__)
+
+RETENTION_CHUNK_SIZE = 1000  # backups deleted, or manifests loaded, at a time
+
+
+class SaasBackup(models.Model):
+    _name = 'saas.backup'
+    _description = 'SaaS Instance Backup'
+    _order = 'backup_date desc, id desc'
+
+    name = fields.Char(string='Backup', required=True)
+    instance_id = fields.Many2one('saas.instance', string='Instance', required=True, ondelete='cascade', index=True)
+    backup_date = fields.Datetime(string='Backup Date', required=True, default=fields.Datetime.now)
+    run_id = fields.Many2one('saas.backup.run', string='Backup Run', ondelete='set null', index=True)
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string='Status', default='running', required=True)
+    manifest = fields.Text(string='Chunk Manifest (JSON)')
+    original_size = fields.Float(string='Dump Size (MB)')
+    stored_size = fields.Float(string='New Data Stored (MB)')
+    chunk_count = fields.Integer(string='Chunks')
+    new_chunk_count = fields.Integer(string='New Chunks')
+    duration = fields.Float(string='Duration (s)')
+    throughput = fields.Float(string='Throughput (MB/s)', compute='_compute_throughput', store=True)
+    error_message = fields.Text(string='Error')
+
+    def init(self):
+        # Serves "latest restorable backup of an instance" from the index alone.
+        tools.create_index(self._cr, 'saas_backup_instance_latest_idx', self._table,
+                           ['instance_id', 'backup_date DESC'], where="state = 'done'")
+
+    @api.depends('original_size', 'duration')
+    def _compute_throughput(self):
+        for backup in self:
+            backup.throughput = backup.original_size / backup.duration if backup.duration else 0.0
+
+    @api.model
+    def _get_latest_restorable(self, instance):
+        return self.search([('instance_id', '=', instance.id), ('state', '=', 'done')],
+                           order='backup_date desc, id desc', limit=1)
+
+    @api.model
+    def _backup_instance(self, instance):
+        """Runs a chunked, deduplicated backup of ``instance`` and returns its catalog entry."""
+        backup = self.create({
+            'name': f"{instance.db_name} {fields.Datetime.to_string(fields.Datetime.now())}",
+            'instance_id': instance.id,
+        })
+        start = time.monotonic()
+        try:
+            manifest, stats = backup_utils.dump_db_chunked(backup_utils.chunk_store_root(self.env), instance.db_name)
+        except Exception as e:
+            _logger.error(f"Chunked backup of '{instance.db_name}' failed: {e}")
+            backup._record_failure(str(e), time.monotonic() - start)
+        else:
+            backup._record_success(manifest, stats, time.monotonic() - start)
+        return backup
+
+    def _record_success(self, manifest, stats, duration):
+        self.write({
+            'state': 'done',
+            'manifest': json.dumps(manifest),
+            'original_size': stats['original_size'] / 1024.0 / 1024.0,
+            'stored_size': stats['stored_size'] / 1024.0 / 1024.0,
+            'chunk_count': stats['chunk_count'],
+            'new_chunk_count': stats['new_chunk_count'],
+            'duration': duration,
+            'error_message': False,
+        })
+
+    def _record_failure(self, error, duration):
+        self.write({'state': 'failed', 'error_message': error, 'duration': duration})
+
+    def action_restore(self):
+        self.ensure_one()
+        if self.state != 'done':
+            raise UserError(_("Only completed backups can be restored."))
+        try:
+            backup_utils.restore_db_chunked(backup_utils.chunk_store_root(self.env),
+                                            self.instance_id.db_name, json.loads(self.manifest))
+        except Exception as e:
+            raise UserError(_("Failed to restore database: %s", e))
+
+    def _select_gfs_keep(self, keep_daily, keep_weekly, keep_monthly):
+        """Returns the backups (newest first in ``self``) kept by a grandfather-father-son policy."""
+        keep = self.browse()
+        tiers = [
+            (keep_daily, lambda d: d.date()),
+            (keep_weekly, lambda d: d.isocalendar()[:2]),
+            (keep_monthly, lambda d: (d.year, d.month)),
+        ]
+        for limit, period in tiers:
+            seen = set()
+            for backup in self:
+                if len(seen) >= limit:
+                    break
+                key = period(backup.backup_date)
+                if key not in seen:
+                    seen.add(key)
+                    keep |= backup
+        return keep
+
+    @api.model
+    def _cron_apply_retention(self):
+        """Applies the GFS retention policy per instance, then sweeps unreferenced chunks.
+
+        Backups are grouped by instance in a single pass over their dates only; deletions and
+        the manifest scan both work through ``RETENTION_CHUNK_SIZE`` records at a time.
+        """
+        params = self.env['ir.config_parameter'].sudo()
+        keep_daily = int(params.get_param('saas_automation.backup_keep_daily', 7))
+        keep_weekly = int(params.get_param('saas_automation.backup_keep_weekly', 4))
+        keep_monthly = int(params.get_param('saas_automation.backup_keep_monthly', 12))
+        by_instance = defaultdict(list)
+        for backup in self.search_fetch([('state', '=', 'done')], ['instance_id', 'backup_date']):
+            by_instance[backup.instance_id.id].append(backup.id)
+        expired_ids = self.search([('state', '=', 'failed')]).ids
+        for backup_ids in by_instance.values():
+            backups = self.browse(backup_ids)
+            expired_ids += (backups - backups._select_gfs_keep(keep_daily, keep_weekly, keep_monthly)).ids
+        for ids in split_every(RETENTION_CHUNK_SIZE, expired_ids):
+            self.browse(ids).unlink()
+            self.env.cr.commit()
+
+        live = set()
+        for ids in split_every(RETENTION_CHUNK_SIZE, self.search([('state', '=', 'done')]).ids):
+            for backup in self.browse(ids).read(['manifest']):
+                live |= backup_utils.manifest_digests(json.loads(backup['manifest']))
+            self.invalidate_model(['manifest'])
+        removed = backup_utils.collect_garbage(backup_utils.chunk_store_root(self.env), live)
+        _logger.info(f"Backup retention removed {len(expired_ids)} backups and {removed} unreferenced chunks")
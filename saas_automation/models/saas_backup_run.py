@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+import logging
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+from odoo import models, fields, api, _
+from . import backup_utils
+from .ir_cron import cron_time_budget
+
+_logger = logging.getLogger(__name__)
+
+BACKUP_TIME_BUDGET = 3300  # seconds a cron run keeps starting dumps, capped by the cron time limit
+
+
+def _timed_dump(root, db_name):
+    """Thread worker: dumps one database into the chunk store without touching the ORM."""
+    start = time.monotonic()
+    try:
+        manifest, stats = backup_utils.dump_db_chunked(root, db_name)
+        return {'manifest': manifest, 'stats': stats, 'duration': time.monotonic() - start}
+    except Exception as e:
+        return {'error': str(e) or e.__class__.__name__, 'duration': time.monotonic() - start}
+
+
+class SaasBackupRun(models.Model):
+    _name = 'saas.backup.run'
+    _description = 'SaaS Scheduled Backup Run'
+    _order = 'id desc'
+
+    name = fields.Char(string='Run', required=True)
+    start_date = fields.Datetime(string='Started', required=True, default=fields.Datetime.now)
+    end_date = fields.Datetime(string='Finished')
+    state = fields.Selection([
+        ('running', 'Running'),
+        ('done', 'Done'),
+    ], string='Status', default='running', required=True)
+    backup_ids = fields.One2many('saas.backup', 'run_id', string='Backups')
+    backup_count = fields.Integer(string='Backups', compute='_compute_stats')
+    done_count = fields.Integer(string='Succeeded', compute='_compute_stats')
+    failed_count = fields.Integer(string='Failed', compute='_compute_stats')
+    total_size = fields.Float(string='Total Dump Size (MB)', compute='_compute_stats')
+    total_stored = fields.Float(string='New Data Stored (MB)', compute='_compute_stats')
+
+    def _compute_stats(self):
+        groups = self.env['saas.backup']._read_group(
+            [('run_id', 'in', self.ids)], ['run_id', 'state'], ['__count', 'original_size:sum', 'stored_size:sum'])
+        stats = defaultdict(lambda: defaultdict(float))
+        for run, state, count, size, stored in groups:
+            stats[run.id][state] += count
+            stats[run.id]['size'] += size
+            stats[run.id]['stored'] += stored
+        for run in self:
+            run_stats = stats[run.id]
+            run.backup_count = sum(run_stats[s] for s in ('pending', 'running', 'done', 'failed'))
+            run.done_count = run_stats['done']
+            run.failed_count = run_stats['failed']
+            run.total_size = run_stats['size']
+            run.total_stored = run_stats['stored']
+
+    @api.model
+    def _cron_run_scheduled_backups(self):
+        """Resumes the unfinished backup run, or starts a new one once the backup interval has elapsed."""
+        run = self.search([('state', '=', 'running')], limit=1)
+        if not run:
+            interval = int(self.env['ir.config_parameter'].sudo().get_param('saas_automation.backup_interval_hours', 24))
+            last = self.search([], limit=1)
+            if last and last.start_date > fields.Datetime.now() - timedelta(hours=interval):
+                return
+            run = self._start_run()
+            self.env.cr.commit()
+        run._process()
+
+    @api.model
+    def _start_run(self):
+        instances = self.env['saas.instance'].search([('state', '=', 'running')])
+        run = self.create({'name': _("Backups %s", fields.Datetime.to_string(fields.Datetime.now()))})
+        self.env['saas.backup'].create([{
+            'name': f"{instance.db_name} {fields.Datetime.to_string(run.start_date)}",
+            'instance_id': instance.id,
+            'run_id': run.id,
+            'state': 'pending',
+        } for instance in instances])
+        return run
+
+    def _pending_in_server_order(self):
+        """Pending backups interleaved across servers so consecutive starts hit different hosts."""
+        by_server = defaultdict(list)
+        for backup in self.backup_ids.filtered(lambda b: b.state == 'pending').sorted('id'):
+            by_server[backup.instance_id.server_id.id].append(backup)
+        ordered = []
+        while by_server:
+            for server_id in list(by_server):
+                ordered.append(by_server[server_id].pop(0))
+                if not by_server[server_id]:
+                    del by_server[server_id]
+        return ordered
+
+    def _process(self, time_budget=None):
+        """Runs the pending backups of this run in parallel.
+
+        At most ``backup_max_parallel`` dumps run at once overall and ``max_concurrent_backups``
+        per server, and two dumps never start within ``backup_stagger_seconds`` of each other.
+        Every outcome is committed as soon as it is known, so after a worker restart the next
+        cron call picks up exactly the backups that are still pending. Once the time budget
+        (see :func:`cron_time_budget`) is spent, the cron is triggered again for the rest.
+        """
+        self.ensure_one()
+        params = self.env['ir.config_parameter'].sudo()
+        max_parallel = max(1, int(params.get_param('saas_automation.backup_max_parallel', 4)))
+        stagger = float(params.get_param('saas_automation.backup_stagger_seconds', 10))
+
+        # Dumps interrupted by a worker restart are started over.
+        self.backup_ids.filtered(lambda b: b.state == 'running').write({'state': 'pending'})
+        self.env.cr.commit()
+
+        root = backup_utils.chunk_store_root(self.env)
+        pending = self._pending_in_server_order()
+        server_load = defaultdict(int)
+        running = {}
+        last_start = None
+        deadline = time.monotonic() + (time_budget or cron_time_budget(BACKUP_TIME_BUDGET))
+
+        def next_startable():
+            if not pending or time.monotonic() >= deadline or len(running) >= max_parallel:
+                return None
+            for backup in pending:
+                if server_load[backup.instance_id.server_id.id] < (backup.instance_id.server_id.max_concurrent_backups or 1):
+                    return backup
+            return None
+
+        with ThreadPoolExecutor(max_workers=max_parallel) as executor:
+            while running or (pending and time.monotonic() < deadline):
+                backup = next_startable()
+                stagger_left = max(0.0, stagger - (time.monotonic() - last_start)) if last_start is not None else 0.0
+                if backup and not stagger_left:
+                    server = backup.instance_id.server_id
+                    pending.remove(backup)
+                    server_load[server.id] += 1
+                    backup.write({'state': 'running', 'backup_date': fields.Datetime.now()})
+                    self.env.cr.commit()
+                    future = executor.submit(_timed_dump, root, backup.instance_id.db_name)
+                    running[future] = (backup, server.id)
+                    last_start = time.monotonic()
+                    continue
+                if not running:
+                    time.sleep(stagger_left)
+                    continue
+                # Wake up when the stagger allows the next start, or else on the next finished dump.
+                finished, _not_done = wait(running, timeout=stagger_left if backup else None,
+                                           return_when=FIRST_COMPLETED)
+                for future in finished:
+                    backup, server_id = running.pop(future)
+                    server_load[server_id] -= 1
+                    result = future.result()
+                    if 'error' in result:
+                        _logger.error(f"Scheduled backup of '{backup.instance_id.db_name}' failed: {result['error']}")
+                        backup._record_failure(result['error'], result['duration'])
+                    else:
+                        backup._record_success(result['manifest'], result['stats'], result['duration'])
+                    self.env.cr.commit()
+
+        if not self.backup_ids.filtered(lambda b: b.state in ('pending', 'running')):
+            self.write({'state': 'done', 'end_date': fields.Datetime.now()})
+            self.env.cr.commit()
+            _logger.info(f"Backup run '{self.name}' finished: {self.done_count} done, {self.failed_count} failed")
+        else:
+            _logger.info(f"Backup run '{self.name}' paused after its time budget, resuming right away")
+            cron = self.env.ref('saas_automation.ir_cron_saas_scheduled_backups', raise_if_not_found=False)
+            if cron:
+                cron.sudo()._trigger()
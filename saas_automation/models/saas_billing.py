@@ -20,4 +20,13 @@ class SaasBilling(models.Model):
         ('overdue', 'Overdue'),
     ], string='Status', default='draft', tracking=True)
     payment_date = fields.Date(string='Payment Date', tracking=True)
-    notes = fields.Text(string='Notes') 
\ No newline at end of file
+    period_start = fields.Date(string='Period Start', index=True)
+    period_end = fields.Date(string='Period End')
+    invoice_id = fields.Many2one('account.move', string='Invoice', readonly=True, ondelete='set null')
+    run_id = fields.Many2one('saas.billing.run', string='Billing Run', readonly=True, index=True, ondelete='set null')
+    notes = fields.Text(string='Notes')
+
+    _sql_constraints = [
+        ('subscription_period_uniq', 'unique(subscription_id, period_start)',
+         'A subscription can only be billed once per period.'),
+    ] 
\ No newline at end of file
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+import logging
+import time
+from collections import defaultdict
+from datetime import timedelta
+from odoo import models, fields, api, _
+from .ir_cron import cron_time_budget
+
+_logger = logging.getLogger(__name__)
+
+BILLING_CHUNK_SIZE = 200  # subscriptions invoiced per batch and per commit
+BILLING_TIME_BUDGET = 3300  # seconds a cron run keeps billing, capped by the cron time limit
+
+
+class SaasBillingRun(models.Model):
+    _name = 'saas.billing.run'
+    _description = 'SaaS Recurring Billing Run'
+    _order = 'id desc'
+
+    name = fields.Char(string='Run', required=True)
+    billing_date = fields.Date(string='Billing Date', required=True, default=fields.Date.context_today)
+    start_date = fields.Datetime(string='Started', required=True, default=fields.Datetime.now)
+    end_date = fields.Datetime(string='Finished')
+    state = fields.Selection([
+        ('running', 'Running'),
+        ('done', 'Done'),
+    ], string='Status', default='running', required=True)
+    billing_ids = fields.One2many('saas.billing', 'run_id', string='Billings')
+    billing_count = fields.Integer(string='Invoices', compute='_compute_stats')
+    amount_total = fields.Float(string='Total Amount', compute='_compute_stats')
+    failed_count = fields.Integer(string='Failed Subscriptions', readonly=True)
+    error_log = fields.Text(string='Errors', readonly=True)
+
+    def _compute_stats(self):
+        groups = self.env['saas.billing']._read_group(
+            [('run_id', 'in', self.ids)], ['run_id'], ['__count', 'amount_total:sum'])
+        stats = {run.id: (count, amount) for run, count, amount in groups}
+        for run in self:
+            run.billing_count, run.amount_total = stats.get(run.id, (0, 0.0))
+
+    @api.model
+    def _cron_run_billing(self):
+        """Resumes the unfinished billing run, or starts today's one."""
+        run = self.search([('state', '=', 'running')], limit=1)
+        if not run:
+            today = fields.Date.context_today(self)
+            if self.search_count([('billing_date', '=', today)]):
+                return
+            run = self.create({'name': _("Billing %s", fields.Date.to_string(today)), 'billing_date': today})
+            self.env.cr.commit()
+        run._process()
+
+    def _process(self, time_budget=None):
+        """Invoices every active subscription due on the run's billing date, chunk by chunk.
+
+        Each chunk is committed together with the advanced ``next_invoice_date`` of its
+        subscriptions, so a crashed run simply picks up the subscriptions still due. A chunk
+        that fails is retried one subscription at a time to isolate the culprit. Once the time
+        budget (see :func:`cron_time_budget`) is spent, the cron is triggered again for the rest.
+        """
+        self.ensure_one()
+        Subscription = self.env['saas.subscription']
+        failed = {}
+        deadline = time.monotonic() + (time_budget or cron_time_budget(BILLING_TIME_BUDGET))
+        while time.monotonic() < deadline:
+            subscriptions = Subscription.search([
+                ('state', '=', 'active'),
+                ('next_invoice_date', '<=', self.billing_date),
+                ('id', 'not in', list(failed)),
+            ], order='next_invoice_date, id', limit=BILLING_CHUNK_SIZE)
+            if not subscriptions:
+                break
+            try:
+                with self.env.cr.savepoint():
+                    self._bill(subscriptions)
+            except Exception as e:
+                _logger.warning(f"Billing chunk of {len(subscriptions)} subscriptions failed, retrying one by one: {e}")
+                for subscription in subscriptions:
+                    try:
+                        with self.env.cr.savepoint():
+                            self._bill(subscription)
+                    except Exception as e:
+                        _logger.error(f"Billing of subscription '{subscription.name}' failed: {e}")
+                        failed[subscription.id] = f"{subscription.name}: {e}"
+            self.env.cr.commit()
+        else:
+            _logger.info(f"Billing run '{self.name}' paused after its time budget, resuming right away")
+            cron = self.env.ref('saas_automation.ir_cron_saas_billing_run', raise_if_not_found=False)
+            if cron:
+                cron.sudo()._trigger()
+            return
+
+        self.write({
+            'state': 'done',
+            'end_date': fields.Datetime.now(),
+            'failed_count': len(failed),
+            'error_log': '\n'.join(failed.values()) or False,
+        })
+        self.env.cr.commit()
+        _logger.info(f"Billing run '{self.name}' finished: {self.billing_count} invoices, {len(failed)} failed")
+
+    def _bill(self, subscriptions):
+        """Invoices the current period of ``subscriptions`` and advances their next invoice date.
+
+        Invoices are built in memory and created with one batched ``create``; a period that
+        already has its ``saas.billing`` record is skipped, which makes the call idempotent.
+        Both are created without chatter tracking or creation messages.
+        """
+        Billing = self.env['saas.billing'].sudo().with_context(tracking_disable=True, mail_create_nolog=True)
+        invoice_date = self.billing_date or fields.Date.context_today(self)
+        periods = {subscription.id: subscription._get_billing_period() for subscription in subscriptions}
+        existing = {
+            (billing.subscription_id.id, billing.period_start)
+            for billing in Billing.search([
+                ('subscription_id', 'in', subscriptions.ids),
+                ('period_start', 'in', list({start for start, _end in periods.values()})),
+            ])
+        }
+        to_bill = subscriptions.filtered(lambda s: (s.id, periods[s.id][0]) not in existing)
+        if to_bill:
+            moves = self.env['account.move'].sudo().with_context(tracking_disable=True, mail_create_nolog=True).create([
+                subscription._prepare_invoice_vals(*periods[subscription.id], invoice_date) for subscription in to_bill
+            ])
+            Billing.create([{
+                'name': f"{subscription.name}/{fields.Date.to_string(periods[subscription.id][0])}",
+                'subscription_id': subscription.id,
+                'partner_id': subscription.partner_id.id,
+                'invoice_date': invoice_date,
+                'amount_total': subscription.price,
+                'period_start': periods[subscription.id][0],
+                'period_end': periods[subscription.id][1],
+                'invoice_id': move.id,
+                'run_id': self.id or False,
+            } for subscription, move in zip(to_bill, moves)])
+
+        by_next_date = defaultdict(list)
+        for subscription in subscriptions:
+            by_next_date[periods[subscription.id][1] + timedelta(days=1)].append(subscription.id)
+        for next_date, ids in by_next_date.items():
+            subscriptions.browse(ids).write({'next_invoice_date': next_date})
+        return len(to_bill)
@@ -6,19 +6,32 @@ class SaasDashboard(models.Model):
     _description = 'SaaS Dashboard'
 
     name = fields.Char(string='Name', required=True)
-    total_instances = fields.Integer(string='Total Instances', compute='_compute_total_instances')
-    active_instances = fields.Integer(string='Active Instances', compute='_compute_active_instances')
-    active_users = fields.Integer(string='Active Users', compute='_compute_active_users')
-    mrr = fields.Float(string='Monthly Recurring Revenue', compute='_compute_mrr')
+    total_instances = fields.Integer(string='Total Instances', compute='_compute_kpis')
+    active_instances = fields.Integer(string='Active Instances', compute='_compute_kpis')
+    active_users = fields.Integer(string='Active Users', compute='_compute_kpis')
+    mrr = fields.Float(string='Monthly Recurring Revenue', compute='_compute_kpis')
+    arr = fields.Float(string='Annual Recurring Revenue', compute='_compute_kpis')
+    active_subscriptions = fields.Integer(string='Active Subscriptions', compute='_compute_kpis')
+    churn_rate = fields.Float(string='Churn Rate (%)', compute='_compute_kpis')
+    mrr_by_plan = fields.Text(string='MRR by Plan (JSON)', compute='_compute_kpis')
+    kpi_computed_at = fields.Datetime(string='KPIs Computed At', compute='_compute_kpis')
 
-    def _compute_total_instances(self):
-        self.total_instances = self.env['saas.instance'].search_count([])
+    _KPI_FIELDS = ['total_instances', 'active_instances', 'active_users', 'mrr', 'arr',
+                   'active_subscriptions', 'churn_rate', 'mrr_by_plan']
 
-    def _compute_active_instances(self):
-        self.active_instances = self.env['saas.instance'].search_count([('state', '=', 'running')])
+    def _compute_kpis(self):
+        Snapshot = self.env['saas.kpi.snapshot'].sudo()
+        snapshot = Snapshot._get_latest()
+        if snapshot:
+            values = {name: snapshot[name] for name in self._KPI_FIELDS}
+            values['kpi_computed_at'] = snapshot.computed_at
+        else:
+            values = Snapshot._compute_values()
+            values['kpi_computed_at'] = values['computed_at']
+            Snapshot._request_refresh()
+        for dashboard in self:
+            for name in self._KPI_FIELDS + ['kpi_computed_at']:
+                dashboard[name] = values[name]
 
-    def _compute_active_users(self):
-        self.active_users = sum(self.env['saas.instance'].search([('state', '=', 'running')]).mapped('active_user_count'))
-
-    def _compute_mrr(self):
-        self.mrr = sum(self.env['saas.subscription'].search([('state', '=', 'active')]).mapped('price')) 
\ No newline at end of file
+    def action_refresh_kpis(self):
+        self.env['saas.kpi.snapshot'].sudo()._refresh()
@@ -1,7 +1,34 @@
 # -*- coding: utf-8 -*-
+import json
+import logging
+import queue
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
 from odoo import models, fields, api, _
+from odoo.exceptions import ValidationError
 from . import docker_utils
+from . import health_utils
 from . import nginx_utils
+from .saas_kpi_snapshot import INSTANCE_KPI_FIELDS
+
+# Instance fields that end up in the rendered nginx vhosts
+NGINX_FIELDS = {'state', 'custom_domain', 'is_custom_domain_active', 'port', 'longpolling_port',
+                'ssl_enabled', 'plan_id', 'server_id'}
+
+_logger = logging.getLogger(__name__)
+
+BULK_MAX_WORKERS = 16  # threads shared by all server lanes of one bulk operation
+HEALTH_DOWN_AFTER = 3  # consecutive failed probes before an instance is flagged down
+
+# operation -> (remote helper, instance state written on success)
+REMOTE_OPERATIONS = {
+    'deploy': (docker_utils.create_odoo_container, 'running'),
+    'suspend': (docker_utils.stop_odoo_container, 'suspended'),
+    'resume': (docker_utils.start_odoo_container, 'running'),
+    'cancel': (docker_utils.remove_odoo_container, 'cancelled'),
+}
 
 class SaasInstance(models.Model):
     _name = 'saas.instance'
@@ -33,16 +60,91 @@ class SaasInstance(models.Model):
     expiration_date = fields.Date(string='Expiration Date', tracking=True)
     is_trial = fields.Boolean(string='Trial', default=False, tracking=True)
     custom_domain = fields.Char(string='Custom Domain', tracking=True)
+    port = fields.Integer(string='Container Port', default=8069, tracking=True)
+    longpolling_port = fields.Integer(string='Longpolling Port', default=8072, tracking=True)
+    ssl_enabled = fields.Boolean(string='SSL Enabled', default=False, tracking=True,
+                                 help="Serve the custom domain over HTTPS/HTTP2 with its Let's Encrypt certificate.")
     is_custom_domain_active = fields.Boolean(string='Custom Domain Active', default=False, tracking=True)
     notes = fields.Text(string='Notes')
+    health_state = fields.Selection([
+        ('unknown', 'Unknown'),
+        ('healthy', 'Healthy'),
+        ('degraded', 'Degraded'),
+        ('down', 'Down'),
+    ], string='Health', default='unknown', readonly=True, copy=False, index=True)
+    health_checked_at = fields.Datetime(string='Last Health Check', readonly=True, copy=False)
+    health_latency = fields.Float(string='Health Latency (ms)', readonly=True, copy=False, digits=(16, 1))
+    health_failures = fields.Integer(string='Consecutive Failed Checks', readonly=True, copy=False)
+    health_error = fields.Char(string='Health Error', readonly=True, copy=False)
+    health_histogram = fields.Text(string='Latency Histogram (JSON)', readonly=True, copy=False,
+                                   help="Count of health check latencies per bucket (ms) over all checks.")
+    container_state = fields.Char(string='Container State', readonly=True, copy=False,
+                                  help="State of the instance's container seen by the last reconciliation, or 'missing'.")
+    container_state_since = fields.Datetime(string='Container State Since', readonly=True, copy=False)
+    job_ids = fields.One2many('saas.job', 'instance_id', string='Jobs')
+    backup_ids = fields.One2many('saas.backup', 'instance_id', string='Backups')
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        unnamed = [vals for vals in vals_list if vals.get('name', _('New')) == _('New')]
+        names = self.env['ir.sequence']._next_by_code_block('saas.instance', len(unnamed))
+        for vals, name in zip(unnamed, names):
+            vals['name'] = name or _('New')
+        result = super(SaasInstance, self).create(vals_list)
+        self.env['saas.kpi.snapshot']._request_refresh()
+        return result
 
     @api.model
-    def create(self, vals):
-        if vals.get('name', _('New')) == _('New'):
-            vals['name'] = self.env['ir.sequence'].next_by_code('saas.instance') or _('New')
-        result = super(SaasInstance, self).create(vals)
+    def _create_with_placement(self, vals_list):
+        """Creates instances, placing those without a ``server_id`` and logging every decision."""
+        unplaced = [vals for vals in vals_list if not vals.get('server_id')]
+        decisions = self.env['saas.server']._plan_placement(len(unplaced)) if unplaced else []
+        for vals, decision in zip(unplaced, decisions):
+            vals['server_id'] = decision['server_id']
+        instances = self.create(vals_list)
+        placed = {id(vals): decision for vals, decision in zip(unplaced, decisions)}
+        self.env['saas.placement.log'].sudo().create([
+            dict(placed[id(vals)], instance_id=instance.id)
+            for vals, instance in zip(vals_list, instances) if id(vals) in placed
+        ])
+        return instances
+
+    def write(self, vals):
+        nginx_changed = bool(NGINX_FIELDS & set(vals))
+        # Servers hosting a custom domain before the write, e.g. to drop a vhost after a move.
+        nginx_servers = self.filtered('custom_domain').server_id if nginx_changed else None
+        result = super(SaasInstance, self).write(vals)
+        if INSTANCE_KPI_FIELDS & set(vals):
+            self.env['saas.kpi.snapshot']._request_refresh()
+        if nginx_changed:
+            nginx_servers |= self.filtered('custom_domain').server_id
+            if nginx_servers:
+                nginx_servers._request_nginx_sync()
+        if 'state' in vals:
+            self._notify_portal_state()
         return result
 
+    def _notify_portal_state(self):
+        """Pushes the new state to the customers' portal pages over the bus, one message per customer."""
+        labels = dict(self._fields['state']._description_selection(self.env))
+        by_partner = defaultdict(list)
+        for instance in self.filtered('partner_id'):
+            by_partner[instance.partner_id.commercial_partner_id].append({
+                'id': instance.id,
+                'state': instance.state,
+                'label': labels.get(instance.state, instance.state),
+            })
+        for partner, payload in by_partner.items():
+            # The commercial partner and its contacts share the instances.
+            for recipient in partner | partner.child_ids.filtered('user_ids'):
+                recipient._bus_send('saas_instance_state', {'instances': payload})
+
+    @api.constrains('custom_domain')
+    def _check_custom_domain(self):
+        for instance in self:
+            if instance.custom_domain and not nginx_utils.is_valid_domain(instance.custom_domain):
+                raise ValidationError(_("'%s' is not a valid domain name.", instance.custom_domain))
+
     @api.depends('subdomain', 'domain', 'custom_domain', 'is_custom_domain_active')
     def _compute_url(self):
         for rec in self:
@@ -54,26 +156,200 @@ class SaasInstance(models.Model):
                 rec.url = False
 
     def action_activate_custom_domain(self):
+        # The nginx reconciler picks the change up through write().
         self.write({'is_custom_domain_active': True})
-        nginx_utils.create_nginx_config(self.server_id, self)
 
     def action_deactivate_custom_domain(self):
         self.write({'is_custom_domain_active': False})
-        nginx_utils.remove_nginx_config(self.server_id, self)
 
     def action_deploy_instance(self):
-        self.write({'state': 'deploying'})
-        docker_utils.create_odoo_container(self.server_id, self)
-        self.write({'state': 'running'})
+        instances = self.filtered(lambda i: i.state == 'draft')
+        # Trials get a warm pool slot when one is free; their deploy job only has to rename it.
+        pooled = self.env['saas.pool.slot'].sudo()._claim_for(instances.filtered('is_trial'))
+        instances.write({'state': 'deploying'})
+        self.env['saas.job'].enqueue(pooled, 'deploy', priority=30)
+        self.env['saas.job'].enqueue(instances - pooled, 'deploy', priority=20)
 
     def action_suspend_instance(self):
-        self.write({'state': 'suspended'})
-        docker_utils.stop_odoo_container(self.server_id, self)
+        self.env['saas.job'].enqueue(self.filtered(lambda i: i.state == 'running'), 'suspend')
 
     def action_resume_instance(self):
-        self.write({'state': 'running'})
-        docker_utils.start_odoo_container(self.server_id, self)
+        self.env['saas.job'].enqueue(self.filtered(lambda i: i.state == 'suspended'), 'resume')
 
     def action_cancel_instance(self):
-        self.write({'state': 'cancelled'})
-        docker_utils.remove_odoo_container(self.server_id, self) 
\ No newline at end of file
+        self.env['saas.job'].enqueue(self.filtered(lambda i: i.state != 'cancelled'), 'cancel')
+
+    def action_backup_now(self):
+        for instance in self:
+            self.env['saas.backup']._backup_instance(instance)
+
+    def _health_url(self):
+        self.ensure_one()
+        if self.url:
+            return self.url.rstrip('/') + health_utils.HEALTH_PATH
+        return f"http://{self.server_id.host}:{self.port}{health_utils.HEALTH_PATH}"
+
+    @api.model
+    def _cron_probe_health(self):
+        """Probes every running instance over HTTP and checks its container, then updates its health.
+
+        An instance is healthy when ``/web/health`` answers 200 within the latency threshold and
+        its container runs; slow answers make it degraded, failures degraded and then down after
+        ``HEALTH_DOWN_AFTER`` consecutive rounds. Servers get the latency histogram of the round.
+        """
+        params = self.env['ir.config_parameter'].sudo()
+        concurrency = int(params.get_param('saas_automation.health_concurrency', health_utils.HEALTH_CONCURRENCY))
+        timeout = float(params.get_param('saas_automation.health_timeout', health_utils.HEALTH_TIMEOUT))
+        degraded_ms = float(params.get_param('saas_automation.health_degraded_latency_ms', 2000))
+
+        instances = self.search([('state', '=', 'running')])
+        if not instances:
+            return
+        start = time.monotonic()
+        targets = {instance.id: instance._health_url() for instance in instances}
+        results, containers = health_utils.run_health_round(
+            targets, [server._remote_snapshot() for server in instances.server_id], concurrency, timeout)
+        _logger.info(f"Probed {len(targets)} instances in {time.monotonic() - start:.1f}s")
+
+        now = fields.Datetime.now()
+        latencies_by_server = defaultdict(list)
+        unhealthy_by_server = defaultdict(int)
+        newly_flagged = self.browse()
+        by_outcome = defaultdict(list)
+        latencies, histograms = [], []
+        for instance in instances:
+            result = results[instance.id]
+            states = containers.get(instance.server_id.id)
+            container_state = states.get(instance.db_name, 'missing') if states is not None else None
+            error = result['error']
+            if container_state and container_state != 'running':
+                error = _("container %s", container_state)
+            if error:
+                failures = instance.health_failures + 1
+                health = 'down' if failures >= HEALTH_DOWN_AFTER else 'degraded'
+            else:
+                failures = 0
+                health = 'degraded' if result['latency'] > degraded_ms else 'healthy'
+                if health == 'degraded':
+                    error = _("slow answer (%(latency)d ms)", latency=result['latency'])
+            if health != instance.health_state and health in ('degraded', 'down'):
+                newly_flagged |= instance
+            latencies_by_server[instance.server_id.id].append(result['latency'])
+            if health != 'healthy':
+                unhealthy_by_server[instance.server_id.id] += 1
+            by_outcome[(health, failures, error or False)].append(instance.id)
+            latencies.append(result['latency'])
+            histograms.append(json.dumps(health_utils.histogram(
+                [result['latency']], json.loads(instance.health_histogram or '{}')), sort_keys=True))
+
+        # One write per outcome: all healthy instances of the round share a single one.
+        for (health, failures, error), ids in by_outcome.items():
+            self.browse(ids).with_context(tracking_disable=True).write({
+                'health_state': health,
+                'health_checked_at': now,
+                'health_failures': failures,
+                'health_error': error,
+            })
+        # Latencies and histograms differ for every instance, they go out in one statement.
+        self.env.cr.execute("""
+            UPDATE saas_instance instance
+               SET health_latency = v.latency, health_histogram = v.histogram
+              FROM unnest(%s::int[], %s::float8[], %s::text[]) AS v(id, latency, histogram)
+             WHERE instance.id = v.id
+        """, [instances.ids, latencies, histograms])
+        instances.invalidate_recordset(['health_latency', 'health_histogram'])
+        for instance in newly_flagged:
+            instance.message_post(body=_("Health check: %(state)s (%(error)s)",
+                                         state=instance.health_state, error=instance.health_error))
+
+        for server in instances.server_id:
+            latencies = latencies_by_server[server.id]
+            server.write({
+                'health_histogram': json.dumps(health_utils.histogram(latencies), sort_keys=True),
+                'health_p50_latency': health_utils.percentile(latencies, 50),
+                'health_p95_latency': health_utils.percentile(latencies, 95),
+                'health_unhealthy_count': unhealthy_by_server[server.id],
+            })
+
+    def _remote_snapshot(self):
+        """Plain copy of the fields remote helpers read, safe to hand to worker threads."""
+        self.ensure_one()
+        return SimpleNamespace(
+            id=self.id,
+            name=self.name,
+            db_name=self.db_name,
+            odoo_version=self.odoo_version,
+            subdomain=self.subdomain,
+            domain=self.domain,
+            custom_domain=self.custom_domain,
+            server_id=self.server_id._remote_snapshot(),
+        )
+
+    def _run_remote_operation(self, operation):
+        """Runs a lifecycle ``operation`` for all instances in ``self`` concurrently.
+
+        Instances are grouped by server and each server gets its own lane, at most
+        ``max_concurrent_jobs`` calls wide, in a thread pool bounded by ``BULK_MAX_WORKERS``.
+        Worker threads only see plain snapshots; the ORM is touched again once all calls are
+        done, with a single ``write`` for the instances that succeeded.
+
+        Deploys of instances holding a reserved warm pool slot take the slot over instead.
+        Helpers returning a host port (create, start) have it recorded on the instance.
+
+        :return: dict mapping the id of each failed instance to its error message
+        """
+        func, target_state = REMOTE_OPERATIONS[operation]
+        remaining = self
+        if operation == 'deploy':
+            served = self.env['saas.pool.slot'].sudo()._take_over(self)
+            served.write({'state': target_state})
+            remaining -= served
+        lanes = []
+        for server in remaining.server_id:
+            instances = remaining.filtered(lambda i: i.server_id == server)
+            items = queue.SimpleQueue()
+            for instance in instances:
+                items.put(instance._remote_snapshot())
+            lanes.append((server._remote_snapshot(), items, min(server.max_concurrent_jobs or 1, len(instances))))
+
+        errors, ports = {}, {}
+
+        def run_lane(server_data, items):
+            while True:
+                try:
+                    item = items.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    port = func(server_data, item)
+                    if port:
+                        ports[item.id] = port
+                except Exception as e:
+                    _logger.error(f"{operation} failed for instance '{item.name}' on server '{server_data.name}': {e}")
+                    errors[item.id] = str(e) or e.__class__.__name__
+
+        workers = sum(width for _server, _items, width in lanes)
+        if workers:
+            with ThreadPoolExecutor(max_workers=min(workers, BULK_MAX_WORKERS)) as executor:
+                futures = [executor.submit(run_lane, server_data, items)
+                           for server_data, items, width in lanes for _i in range(width)]
+                for future in futures:
+                    future.result()
+
+        succeeded = remaining.filtered(lambda i: i.id not in errors)
+        if target_state and succeeded:
+            succeeded.write({'state': target_state})
+        # Containers publish on host ports the daemon picks, record where they ended up.
+        by_port = defaultdict(list)
+        for instance_id, port in ports.items():
+            by_port[port].append(instance_id)
+        for port, instance_ids in by_port.items():
+            self.browse(instance_ids).filtered(lambda i: i.port != port).write({'port': port})
+        return errors
+
+    def _on_job_failed(self, job):
+        """Called when ``job`` has exhausted its retries."""
+        if job.job_type == 'deploy' and self.state == 'deploying':
+            self.write({'state': 'draft'})
+        self.message_post(body=_("%(job)s failed after %(attempts)s attempts: %(error)s",
+                                 job=job.name, attempts=job.attempts, error=job.error_message))
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from odoo import models, fields, api, _
+
+_logger = logging.getLogger(__name__)
+
+JOB_BATCH_SIZE = 100  # jobs claimed per batch
+JOB_TIME_BUDGET = 240  # seconds a single cron run keeps draining the queue
+JOB_HEARTBEAT_INTERVAL = 30  # seconds between two heartbeats of a running batch
+JOB_STALE_AFTER = 300  # seconds without heartbeat after which a 'running' job is considered orphaned
+CLAIM_LOCK_KEY = 'saas_automation.job_claim'
+JOB_BACKOFF_BASE = 30  # seconds, doubled on every retry
+JOB_BACKOFF_MAX = 3600
+
+
+class SaasJob(models.Model):
+    _name = 'saas.job'
+    _description = 'SaaS Provisioning Job'
+    _order = 'priority desc, id'
+
+    name = fields.Char(string='Job', required=True)
+    job_type = fields.Selection([
+        ('deploy', 'Deploy Instance'),
+        ('suspend', 'Suspend Instance'),
+        ('resume', 'Resume Instance'),
+        ('cancel', 'Cancel Instance'),
+    ], string='Job Type', required=True)
+    instance_id = fields.Many2one('saas.instance', string='Instance', required=True, ondelete='cascade', index=True)
+    server_id = fields.Many2one('saas.server', string='Server', related='instance_id.server_id', store=True, index=True)
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+    ], string='Status', default='pending', required=True, index=True)
+    priority = fields.Integer(string='Priority', default=10)
+    progress = fields.Integer(string='Progress (%)', default=0)
+    attempts = fields.Integer(string='Failed Attempts', default=0)
+    max_attempts = fields.Integer(string='Max Attempts', default=5)
+    next_attempt_at = fields.Datetime(string='Next Attempt', default=fields.Datetime.now, index=True)
+    started_at = fields.Datetime(string='Started At')
+    heartbeat_at = fields.Datetime(string='Last Heartbeat', readonly=True)
+    finished_at = fields.Datetime(string='Finished At')
+    duration = fields.Float(string='Duration (s)')
+    error_message = fields.Text(string='Last Error')
+
+    @api.model
+    def enqueue(self, instances, job_type, priority=10):
+        """Queues one job of ``job_type`` per instance, skipping instances that already have one open."""
+        open_jobs = self.search([
+            ('instance_id', 'in', instances.ids),
+            ('job_type', '=', job_type),
+            ('state', 'in', ['pending', 'running']),
+        ])
+        busy_ids = set(open_jobs.mapped('instance_id').ids)
+        type_label = dict(self._fields['job_type'].selection)[job_type]
+        jobs = self.create([{
+            'name': f"{type_label}: {instance.name}",
+            'job_type': job_type,
+            'instance_id': instance.id,
+            'priority': priority,
+        } for instance in instances if instance.id not in busy_ids])
+        if jobs:
+            cron = self.env.ref('saas_automation.ir_cron_saas_job_runner', raise_if_not_found=False)
+            if cron:
+                cron._trigger()
+        return jobs | open_jobs
+
+    def action_retry(self):
+        self.filtered(lambda j: j.state in ('failed', 'cancelled')).write({
+            'state': 'pending',
+            'attempts': 0,
+            'progress': 0,
+            'next_attempt_at': fields.Datetime.now(),
+            'error_message': False,
+        })
+
+    def action_cancel(self):
+        self.filtered(lambda j: j.state == 'pending').write({'state': 'cancelled'})
+
+    def set_progress(self, progress):
+        """Publishes progress from inside a running job through a separate cursor so it is visible immediately."""
+        progress = max(0, min(100, progress))
+        with self.pool.cursor() as cr:
+            cr.execute("UPDATE saas_job SET progress = %s WHERE id IN %s", [progress, tuple(self.ids)])
+        self.invalidate_recordset(['progress'])
+
+    @api.model
+    def _requeue_stale_jobs(self):
+        """Requeues running jobs whose runner stopped sending heartbeats, i.e. died mid-batch."""
+        cutoff = fields.Datetime.now() - timedelta(seconds=JOB_STALE_AFTER)
+        stale = self.search([
+            ('state', '=', 'running'),
+            '|', ('heartbeat_at', '<', cutoff),
+            '&', ('heartbeat_at', '=', False), ('started_at', '<', cutoff),
+        ])
+        if stale:
+            _logger.warning(f"Requeuing {len(stale)} orphaned SaaS jobs")
+            stale.write({'state': 'pending', 'next_attempt_at': fields.Datetime.now()})
+
+    @api.model
+    def _claim_jobs(self, limit):
+        """Locks and marks as running up to ``limit`` due jobs of servers no other runner is working on.
+
+        All due jobs of a free server are claimed together; ``max_concurrent_jobs`` only sets
+        the width of that server's lane in :meth:`saas.instance._run_remote_operation`. Claims
+        are serialized by a transaction-level advisory lock, so two runners never see the same
+        server as free and the per-server cap holds across runners too.
+        """
+        cr = self.env.cr
+        cr.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [CLAIM_LOCK_KEY])
+        cr.execute("""
+            SELECT job.id FROM saas_job job
+             WHERE job.state = 'pending' AND job.next_attempt_at <= (now() at time zone 'UTC')
+               AND NOT EXISTS (SELECT 1 FROM saas_job busy
+                                WHERE busy.server_id = job.server_id AND busy.state = 'running')
+             ORDER BY job.priority DESC, job.id
+             LIMIT %s
+               FOR UPDATE SKIP LOCKED
+        """, [limit])
+        claimed = self.browse([row[0] for row in cr.fetchall()])
+        now = fields.Datetime.now()
+        claimed.write({
+            'state': 'running',
+            'progress': 0,
+            'started_at': now,
+            'heartbeat_at': now,
+            'error_message': False,
+        })
+        return claimed
+
+    @contextmanager
+    def _heartbeat(self):
+        """Refreshes ``heartbeat_at`` of the jobs from a background thread while the block runs.
+
+        Rows already locked by the batch's own transaction (jobs whose outcome is written but
+        not committed yet) are skipped instead of waited for.
+        """
+        stop = threading.Event()
+        pool, ids = self.pool, tuple(self.ids)
+
+        def beat():
+            while not stop.wait(JOB_HEARTBEAT_INTERVAL):
+                try:
+                    with pool.cursor() as cr:
+                        cr.execute("""
+                            UPDATE saas_job SET heartbeat_at = (now() at time zone 'UTC')
+                             WHERE id IN (SELECT id FROM saas_job WHERE id IN %s AND state = 'running'
+                                             FOR UPDATE SKIP LOCKED)
+                        """, [ids])
+                except Exception as e:
+                    _logger.warning(f"SaaS job heartbeat failed: {e}")
+
+        thread = threading.Thread(target=beat, name='saas-job-heartbeat', daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def _run_batch(self):
+        """Executes claimed jobs, one bulk remote operation per job type."""
+        with self._heartbeat():
+            for job_type in dict.fromkeys(self.mapped('job_type')):
+                jobs = self.filtered(lambda j: j.job_type == job_type)
+                jobs.set_progress(10)
+                start = time.monotonic()
+                try:
+                    with self.env.cr.savepoint():
+                        errors = jobs.instance_id._run_remote_operation(job_type)
+                except Exception as e:
+                    _logger.exception(f"SaaS {job_type} batch failed")
+                    errors = dict.fromkeys(jobs.instance_id.ids, str(e))
+                duration = time.monotonic() - start
+                failed = jobs.filtered(lambda j: j.instance_id.id in errors)
+                (jobs - failed).write({
+                    'state': 'done',
+                    'progress': 100,
+                    'finished_at': fields.Datetime.now(),
+                    'duration': duration,
+                })
+                for job in failed:
+                    job.duration = duration
+                    job._handle_failure(errors[job.instance_id.id])
+
+    def _handle_failure(self, error):
+        attempts = self.attempts + 1
+        if attempts < self.max_attempts:
+            delay = min(JOB_BACKOFF_BASE * 2 ** (attempts - 1), JOB_BACKOFF_MAX)
+            self.write({
+                'state': 'pending',
+                'attempts': attempts,
+                'error_message': error,
+                'next_attempt_at': fields.Datetime.now() + timedelta(seconds=delay),
+            })
+        else:
+            self.write({
+                'state': 'failed',
+                'attempts': attempts,
+                'error_message': error,
+                'finished_at': fields.Datetime.now(),
+            })
+            self.instance_id._on_job_failed(self)
+
+    @api.model
+    def _cron_run_jobs(self, batch_size=JOB_BATCH_SIZE, time_budget=JOB_TIME_BUDGET):
+        """Drains due jobs until the queue is empty or the time budget is spent.
+
+        Claims use ``SKIP LOCKED``, so throughput grows by adding cron records (or cron
+        workers) that call this method in parallel.
+
+        Every claim and every batch outcome is committed on its own, so a crash only ever
+        loses the batch in flight, whose jobs are requeued once their heartbeat stops.
+        """
+        self._requeue_stale_jobs()
+        self.env.cr.commit()
+        deadline = time.monotonic() + time_budget
+        while time.monotonic() < deadline:
+            jobs = self._claim_jobs(batch_size)
+            self.env.cr.commit()
+            if not jobs:
+                break
+            jobs._run_batch()
+            self.env.cr.commit()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+from datetime import timedelta
+from odoo import models, fields, api, _
+
+_logger = logging.getLogger(__name__)
+
+KPI_REFRESH_DELAY = 30  # seconds, coalesces bursts of state changes into one refresh
+CHURN_WINDOW_DAYS = 30
+
+# Instance/subscription fields whose changes affect the KPIs
+INSTANCE_KPI_FIELDS = {'state', 'active_user_count'}
+SUBSCRIPTION_KPI_FIELDS = {'state', 'price', 'plan_id', 'recurring_interval', 'recurring_rule_type', 'close_date'}
+
+
+class SaasKpiSnapshot(models.Model):
+    _name = 'saas.kpi.snapshot'
+    _description = 'SaaS KPI Snapshot'
+    _order = 'snapshot_date desc'
+
+    snapshot_date = fields.Date(string='Date', required=True, default=fields.Date.context_today, index=True)
+    computed_at = fields.Datetime(string='Computed At')
+    total_instances = fields.Integer(string='Total Instances')
+    active_instances = fields.Integer(string='Active Instances')
+    active_users = fields.Integer(string='Active Users')
+    active_subscriptions = fields.Integer(string='Active Subscriptions')
+    churned_subscriptions = fields.Integer(string='Churned (30 days)')
+    churn_rate = fields.Float(string='Churn Rate (%)')
+    mrr = fields.Float(string='Monthly Recurring Revenue')
+    arr = fields.Float(string='Annual Recurring Revenue')
+    mrr_by_plan = fields.Text(string='MRR by Plan (JSON)')
+
+    _sql_constraints = [
+        ('snapshot_date_uniq', 'unique(snapshot_date)', 'Only one KPI snapshot per day is allowed.'),
+    ]
+
+    @api.model
+    def _compute_values(self):
+        """Computes every KPI with a handful of SQL aggregates, never loading the records themselves."""
+        Instance = self.env['saas.instance'].sudo()
+        Subscription = self.env['saas.subscription'].sudo()
+
+        instances = dict(Instance._read_group([], ['state'], ['__count']))
+        [[active_users]] = Instance._read_group([('state', '=', 'running')], [], ['active_user_count:sum'])
+
+        mrr = 0.0
+        mrr_by_plan = {}
+        active_subscriptions = 0
+        groups = Subscription._read_group(
+            [('state', '=', 'active')],
+            ['plan_id', 'recurring_rule_type', 'recurring_interval'],
+            ['__count', 'price:sum'])
+        for plan, rule_type, interval, count, price in groups:
+            months = (interval or 1) * (12 if rule_type == 'yearly' else 1)
+            monthly = price / months
+            mrr += monthly
+            mrr_by_plan[plan.name or _('No Plan')] = mrr_by_plan.get(plan.name or _('No Plan'), 0.0) + monthly
+            active_subscriptions += count
+
+        churned = Subscription.search_count([
+            ('state', 'in', ['cancelled', 'expired']),
+            ('close_date', '>=', fields.Date.context_today(self) - timedelta(days=CHURN_WINDOW_DAYS)),
+        ])
+        at_risk = active_subscriptions + churned
+        return {
+            'computed_at': fields.Datetime.now(),
+            'total_instances': sum(instances.values()),
+            'active_instances': instances.get('running', 0),
+            'active_users': active_users or 0,
+            'active_subscriptions': active_subscriptions,
+            'churned_subscriptions': churned,
+            'churn_rate': 100.0 * churned / at_risk if at_risk else 0.0,
+            'mrr': mrr,
+            'arr': mrr * 12,
+            'mrr_by_plan': json.dumps({plan: round(value, 2) for plan, value in mrr_by_plan.items()}),
+        }
+
+    @api.model
+    def _get_latest(self):
+        return self.search([], limit=1)
+
+    @api.model
+    def _refresh(self):
+        """Upserts today's snapshot."""
+        values = self._compute_values()
+        today = fields.Date.context_today(self)
+        snapshot = self.search([('snapshot_date', '=', today)], limit=1)
+        if snapshot:
+            snapshot.write(values)
+        else:
+            snapshot = self.create(dict(values, snapshot_date=today))
+        return snapshot
+
+    @api.model
+    def _request_refresh(self):
+        """Schedules an asynchronous refresh; only inserts a cron trigger so it never contends on the snapshot row."""
+        cron = self.env.ref('saas_automation.ir_cron_saas_kpi_refresh', raise_if_not_found=False)
+        if cron:
+            cron.sudo()._trigger(fields.Datetime.now() + timedelta(seconds=KPI_REFRESH_DELAY))
+
+    @api.model
+    def _cron_refresh(self):
+        self._refresh()
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+import io
+import logging
+from datetime import timedelta
+from odoo import models, fields, api, tools, _
+from odoo.exceptions import ValidationError
+
+_logger = logging.getLogger(__name__)
+
+SAMPLE_COLUMNS = ['instance_id', 'timestamp', 'cpu_usage', 'memory_usage', 'storage_usage', 'active_users']
+
+
+class SaasMetricSample(models.Model):
+    """Raw per-container samples, kept compact: no chatter, no tracking, no audit columns.
+
+    Samples are inserted with ``COPY`` by :meth:`ingest`, downsampled into daily
+    ``saas.analytics`` rows and purged once older than the retention window.
+    """
+    _name = 'saas.metric.sample'
+    _description = 'SaaS Metric Sample'
+    _order = 'timestamp desc'
+    _log_access = False
+
+    instance_id = fields.Many2one('saas.instance', string='Instance', required=True, ondelete='cascade')
+    timestamp = fields.Datetime(string='Timestamp', required=True)
+    cpu_usage = fields.Float(string='CPU Usage (%)')
+    memory_usage = fields.Float(string='Memory Usage (MB)')
+    storage_usage = fields.Float(string='Storage Usage (GB)')
+    active_users = fields.Integer(string='Active Users')
+
+    def init(self):
+        tools.create_index(self._cr, 'saas_metric_sample_instance_ts_idx', self._table, ['instance_id', 'timestamp'])
+        # BRIN keeps the retention purge cheap on an append-only, time-ordered table.
+        tools.create_index(self._cr, 'saas_metric_sample_ts_brin_idx', self._table, ['timestamp'], method='brin')
+
+    @api.model
+    def ingest(self, samples):
+        """Bulk-inserts metric samples with a single ``COPY``.
+
+        :param samples: list of dicts with ``instance_id`` and ``timestamp`` (datetime or
+            ``YYYY-MM-DD HH:MM:SS`` string) plus any of the metric columns
+        :return: number of samples stored
+        """
+        if not samples:
+            return 0
+        self.check_access('create')
+        buffer = io.StringIO()
+        for sample in samples:
+            if not sample.get('instance_id') or not sample.get('timestamp'):
+                raise ValidationError(_("Every metric sample needs an instance_id and a timestamp."))
+            timestamp = sample['timestamp']
+            if not isinstance(timestamp, str):
+                timestamp = fields.Datetime.to_string(timestamp)
+            buffer.write('\t'.join([
+                str(int(sample['instance_id'])),
+                timestamp,
+                str(float(sample.get('cpu_usage') or 0.0)),
+                str(float(sample.get('memory_usage') or 0.0)),
+                str(float(sample.get('storage_usage') or 0.0)),
+                str(int(sample.get('active_users') or 0)),
+            ]))
+            buffer.write('\n')
+        buffer.seek(0)
+        self.env.cr._obj.copy_expert(
+            f"COPY {self._table} ({', '.join(SAMPLE_COLUMNS)}) FROM STDIN", buffer)
+        return len(samples)
+
+    @api.model
+    def _downsample(self, date_from, date_to):
+        """Aggregates samples of ``[date_from, date_to)`` into one ``saas.analytics`` row per instance and day."""
+        self.env.cr.execute(f"""
+            SELECT instance_id, timestamp::date AS day,
+                   avg(cpu_usage), avg(memory_usage), max(storage_usage), max(active_users)
+              FROM {self._table}
+             WHERE timestamp >= %s AND timestamp < %s
+          GROUP BY instance_id, day
+        """, [date_from, date_to])
+        rows = self.env.cr.fetchall()
+        if not rows:
+            return 0
+        Analytics = self.env['saas.analytics'].sudo().with_context(tracking_disable=True)
+        existing = {
+            (rec.instance_id.id, rec.date): rec
+            for rec in Analytics.search([
+                ('instance_id', 'in', list({row[0] for row in rows})),
+                ('date', '>=', date_from),
+                ('date', '<', date_to),
+            ])
+        }
+        instances = self.env['saas.instance'].sudo().browse({row[0] for row in rows})
+        names = dict(zip(instances.ids, instances.mapped('name')))
+        to_create = []
+        for instance_id, day, cpu, memory, storage, users in rows:
+            values = {
+                'cpu_usage': cpu,
+                'memory_usage': memory,
+                'storage_usage': storage,
+                'active_users': users,
+            }
+            record = existing.get((instance_id, day))
+            if record:
+                record.write(values)
+            else:
+                to_create.append(dict(values, instance_id=instance_id, date=day,
+                                      name=f"{names.get(instance_id, instance_id)} {day}"))
+        Analytics.create(to_create)
+        return len(rows)
+
+    @api.model
+    def _cron_downsample_and_purge(self):
+        """Rolls finished days up into ``saas.analytics`` and drops samples past the retention window."""
+        params = self.env['ir.config_parameter'].sudo()
+        retention_days = int(params.get_param('saas_automation.metrics_retention_days', 7))
+        today = fields.Date.context_today(self)
+        done_until = params.get_param('saas_automation.metrics_downsampled_until')
+        date_from = fields.Date.to_date(done_until) if done_until else today - timedelta(days=retention_days)
+        if date_from < today:
+            count = self._downsample(date_from, today)
+            params.set_param('saas_automation.metrics_downsampled_until', fields.Date.to_string(today))
+            _logger.info(f"Downsampled {count} instance-days of metrics since {date_from}")
+        self.env.cr.execute(f"DELETE FROM {self._table} WHERE timestamp < %s",
+                            [today - timedelta(days=retention_days)])
+        _logger.info(f"Purged {self.env.cr.rowcount} expired metric samples")
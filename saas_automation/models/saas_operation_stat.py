@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+import logging
+from odoo import models, fields, api, SUPERUSER_ID
+from . import metrics_utils
+
+_logger = logging.getLogger(__name__)
+
+
+class SaasOperationStat(models.Model):
+    """Hourly per-server summary of the remote operations timed by ``metrics_utils``.
+
+    Every worker aggregates its spans in memory and upserts them here with one statement,
+    so the table grows by at most one row per server, operation and hour.
+    """
+    _name = 'saas.operation.stat'
+    _description = 'SaaS Remote Operation Statistics'
+    _order = 'period_start desc, server_id, operation'
+    _log_access = False
+
+    server_id = fields.Many2one('saas.server', string='Server', required=True, ondelete='cascade', index=True)
+    operation = fields.Char(string='Operation', required=True)
+    period_start = fields.Datetime(string='Hour', required=True, index=True)
+    call_count = fields.Integer(string='Calls')
+    error_count = fields.Integer(string='Errors')
+    total_duration = fields.Float(string='Total Duration (s)', digits=(16, 3))
+    max_duration = fields.Float(string='Max Duration (s)', digits=(16, 3))
+    avg_duration = fields.Float(string='Avg Duration (s)', digits=(16, 3), compute='_compute_avg_duration')
+    total_bytes = fields.Float(string='Bytes', digits=(16, 0))
+
+    _sql_constraints = [
+        ('server_operation_period_uniq', 'unique(server_id, operation, period_start)',
+         'Only one statistics row per server, operation and hour is allowed.'),
+    ]
+
+    @api.depends('call_count', 'total_duration')
+    def _compute_avg_duration(self):
+        for stat in self:
+            stat.avg_duration = stat.total_duration / stat.call_count if stat.call_count else 0.0
+
+    @api.model
+    def _flush_pending(self):
+        """Persists the aggregates recorded by this process into the current hour's rows."""
+        pending = metrics_utils.drain_pending(self.env.cr.dbname)
+        if not pending:
+            return 0
+        try:
+            self.env.cr.execute("""
+                INSERT INTO saas_operation_stat (server_id, operation, period_start, call_count, error_count,
+                                                 total_duration, max_duration, total_bytes)
+                SELECT v.server_id, v.operation, date_trunc('hour', now() at time zone 'UTC'),
+                       v.call_count, v.error_count, v.total_duration, v.max_duration, v.total_bytes
+                  FROM unnest(%s::int[], %s::varchar[], %s::int[], %s::int[], %s::float8[], %s::float8[], %s::float8[])
+                       AS v(server_id, operation, call_count, error_count, total_duration, max_duration, total_bytes)
+                  JOIN saas_server s ON s.id = v.server_id
+                ON CONFLICT (server_id, operation, period_start) DO UPDATE
+                   SET call_count = saas_operation_stat.call_count + EXCLUDED.call_count,
+                       error_count = saas_operation_stat.error_count + EXCLUDED.error_count,
+                       total_duration = saas_operation_stat.total_duration + EXCLUDED.total_duration,
+                       max_duration = GREATEST(saas_operation_stat.max_duration, EXCLUDED.max_duration),
+                       total_bytes = saas_operation_stat.total_bytes + EXCLUDED.total_bytes
+            """, [
+                [server_id for server_id, _operation in pending],
+                [operation for _server_id, operation in pending],
+                *([values[i] for values in pending.values()] for i in range(5)),
+            ])
+        except Exception:
+            metrics_utils.restore_pending(self.env.cr.dbname, pending)
+            raise
+        return len(pending)
+
+    @api.model
+    def _flush_pending_new_cursor(self):
+        """Flushes on a cursor of its own, so it neither depends on nor disturbs the caller's transaction."""
+        if not metrics_utils.has_pending(self.env.cr.dbname):
+            return
+        try:
+            with self.pool.cursor() as cr:
+                api.Environment(cr, SUPERUSER_ID, {})[self._name]._flush_pending()
+        except Exception as e:
+            _logger.warning(f"Could not persist remote operation statistics: {e}")
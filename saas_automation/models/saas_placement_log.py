@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api, _
+
+class SaasPlacementLog(models.Model):
+    _name = 'saas.placement.log'
+    _description = 'SaaS Placement Decision'
+    _order = 'id desc'
+
+    instance_id = fields.Many2one('saas.instance', string='Instance', ondelete='cascade', index=True)
+    server_id = fields.Many2one('saas.server', string='Server', ondelete='set null')
+    strategy = fields.Selection([
+        ('least_loaded', 'Least Loaded'),
+        ('bin_packing', 'Bin Packing'),
+    ], string='Strategy')
+    score = fields.Float(string='Projected Load', digits=(16, 4))
+    candidates = fields.Integer(string='Candidate Servers')
+    create_date = fields.Datetime(string='Decided On', readonly=True)
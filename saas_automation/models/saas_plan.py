@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 from odoo import models, fields, api, _
+from .nginx_utils import NGINX_PROFILES, DEFAULT_NGINX_PROFILE
 
 class SaasPlan(models.Model):
     _name = 'saas.plan'
@@ -16,4 +17,30 @@ class SaasPlan(models.Model):
     max_users = fields.Integer(string='Max Users', default=1, tracking=True)
     max_instances = fields.Integer(string='Max Instances', default=1, tracking=True)
     included_modules_ids = fields.Many2many('ir.module.module', string='Included Modules')
-    notes = fields.Text(string='Notes') 
\ No newline at end of file
+    nginx_profile = fields.Selection(
+        [(key, key.capitalize()) for key in NGINX_PROFILES],
+        string='Proxy Profile', default=DEFAULT_NGINX_PROFILE, required=True, tracking=True,
+        help="Nginx tuning applied to the custom domains of this plan's instances: upstream keepalive, "
+             "static asset caching, compression and rate limiting.")
+    notes = fields.Text(string='Notes')
+
+    def write(self, vals):
+        result = super(SaasPlan, self).write(vals)
+        if 'nginx_profile' in vals:
+            instances = self.env['saas.instance'].sudo().search([
+                ('plan_id', 'in', self.ids),
+                ('custom_domain', '!=', False),
+            ])
+            if instances:
+                instances.server_id._request_nginx_sync()
+        return result
+
+    @api.model
+    def _get_pricing_version(self):
+        """Returns ``(last write date, plan count)``, the validity stamp of the cached plan table.
+
+        One aggregate over a small table, cheap enough to run per request; any plan change
+        moves the stamp, in every worker, without clearing the ormcache of the registry.
+        """
+        [[last_write, count]] = self.sudo()._read_group([], [], ['write_date:max', '__count'])
+        return last_write, count
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+import logging
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from odoo import models, fields, api, _
+from . import metrics_utils
+from . import pool_utils
+from .saas_server import STATS_MAX_PARALLEL_SERVERS
+
+_logger = logging.getLogger(__name__)
+
+POOL_HISTORY_DAYS = 30  # claimed slots are kept that long for the claim latency statistics
+POOL_WARMING_TIMEOUT = 3600  # seconds after which a slot still warming is given up (its cron run died)
+
+
+class SaasPoolSlot(models.Model):
+    """A pre-created container and database, waiting on a server to become a trial instance.
+
+    The refill cron keeps ``saas_automation.pool_size`` ready slots per server and Odoo
+    version; deploying a trial instance reserves one (:meth:`_claim_for`) and its deploy
+    job renames the slot's database and container instead of creating new ones.
+    """
+    _name = 'saas.pool.slot'
+    _description = 'SaaS Warm Pool Slot'
+    _order = 'id'
+
+    name = fields.Char(string='Container / Database', required=True, readonly=True, index=True)
+    server_id = fields.Many2one('saas.server', string='Server', required=True, ondelete='cascade', index=True)
+    odoo_version = fields.Selection([
+        ('16.0', 'Odoo 16'),
+        ('17.0', 'Odoo 17'),
+        ('18.0', 'Odoo 18'),
+    ], string='Odoo Version', required=True)
+    state = fields.Selection([
+        ('warming', 'Warming'),
+        ('ready', 'Ready'),
+        ('reserved', 'Reserved'),
+        ('claimed', 'Claimed'),
+        ('failed', 'Failed'),
+    ], string='Status', default='warming', required=True, index=True)
+    ready_at = fields.Datetime(string='Ready Since', readonly=True)
+    instance_id = fields.Many2one('saas.instance', string='Claimed By', readonly=True, ondelete='set null')
+    claimed_at = fields.Datetime(string='Claimed At', readonly=True)
+    claim_duration = fields.Float(string='Claim Latency (ms)', readonly=True, digits=(16, 1))
+    error = fields.Text(string='Error', readonly=True)
+
+    def _get_pool_settings(self):
+        params = self.env['ir.config_parameter'].sudo()
+        size = int(params.get_param('saas_automation.pool_size', 2))
+        versions = [v.strip() for v in params.get_param('saas_automation.pool_versions', '18.0').split(',') if v.strip()]
+        return size, versions
+
+    def _reserve(self, odoo_version, server):
+        """Locks a ready slot of ``odoo_version``, preferring ``server``; concurrent claims skip each other's rows."""
+        self.env.flush_all()
+        self.env.cr.execute("""
+            SELECT slot.id
+              FROM saas_pool_slot slot
+              JOIN saas_server server ON server.id = slot.server_id AND server.is_active
+             WHERE slot.state = 'ready' AND slot.odoo_version = %s
+             ORDER BY slot.server_id = %s DESC, slot.id
+             LIMIT 1
+               FOR UPDATE OF slot SKIP LOCKED
+        """, (odoo_version, server.id or 0))
+        row = self.env.cr.fetchone()
+        return self.browse(row[0]) if row else self.browse()
+
+    @api.model
+    def _claim_for(self, instances):
+        """Reserves a warm slot for each of ``instances`` when one is available.
+
+        A slot on another server than the planned one moves the (not yet deployed) instance
+        there. Nothing remote happens here: the reservation is part of the caller's
+        transaction, and the deploy job renames the slot once it is committed
+        (:meth:`_take_over`), so a rolled back signup leaves the slot ready and untouched.
+
+        :return: the instances that got a slot; the others still need a regular deploy
+        """
+        claimed = self.env['saas.instance']
+        hits, misses = defaultdict(int), defaultdict(int)
+        for instance in instances:
+            slot = self._reserve(instance.odoo_version, instance.server_id)
+            if not slot:
+                misses[instance.server_id] += 1
+                metrics_utils.record('pool.miss', instance.server_id, 0.0)
+                continue
+            slot.write({'state': 'reserved', 'instance_id': instance.id})
+            if instance.server_id != slot.server_id:
+                instance.server_id = slot.server_id
+            hits[slot.server_id] += 1
+            claimed |= instance
+
+        # Counters are bumped in SQL so concurrent signups never conflict on the server rows.
+        for column, counts in (('pool_hit_count', hits), ('pool_miss_count', misses)):
+            for server, count in counts.items():
+                self.env.cr.execute(f"UPDATE saas_server SET {column} = {column} + %s WHERE id = %s",
+                                    (count, server.id))
+                server.invalidate_recordset([column])
+        if hits or misses:
+            cron = self.env.ref('saas_automation.ir_cron_saas_pool_refill', raise_if_not_found=False)
+            if cron:
+                cron.sudo()._trigger()
+        return claimed
+
+    @api.model
+    def _take_over(self, instances):
+        """Hands the slots reserved for ``instances`` over by renaming their database and container.
+
+        Runs in the deploy job. A slot whose rename fails is marked failed (the refill cron
+        removes it) and its instance is left to the regular deploy.
+
+        :return: the instances now served by their slot
+        """
+        served = self.env['saas.instance']
+        for slot in self.search([('state', '=', 'reserved'), ('instance_id', 'in', instances.ids)]):
+            instance = slot.instance_id
+            server = slot.server_id._remote_snapshot()
+            start = time.perf_counter()
+            try:
+                port = pool_utils.claim_slot(server, slot.name, instance.db_name)
+            except Exception as e:
+                _logger.error(f"Claiming pool slot '{slot.name}' for instance '{instance.name}' failed: {e}")
+                slot.write({'state': 'failed', 'error': str(e)})
+                continue
+            duration = time.perf_counter() - start
+            metrics_utils.record('pool.claim', server, duration)
+            slot.write({
+                'state': 'claimed',
+                'claimed_at': fields.Datetime.now(),
+                'claim_duration': duration * 1000.0,
+            })
+            instance.port = port
+            instance.message_post(body=_("Provisioned from the warm pool in %(ms)s ms.", ms=round(duration * 1000.0)))
+            served |= instance
+        return served
+
+    @api.model
+    def _cron_refill_pool(self):
+        """Tops every active server up to the target number of ready slots per Odoo version.
+
+        New slots are warmed server by server in parallel (template check, clone, container
+        start); failed slots are removed from their server and forgotten.
+        """
+        size, versions = self._get_pool_settings()
+        self.search([
+            ('state', '=', 'claimed'),
+            ('claimed_at', '<', fields.Datetime.now() - timedelta(days=POOL_HISTORY_DAYS)),
+        ]).unlink()
+        # A run killed after committing its warming slots leaves them behind; they would count
+        # towards the pool size forever, so fail them and let the discard below clean them up.
+        self.search([
+            ('state', '=', 'warming'),
+            ('create_date', '<', fields.Datetime.now() - timedelta(seconds=POOL_WARMING_TIMEOUT)),
+        ]).write({'state': 'failed', 'error': _("Warming did not finish")})
+        # Reserved slots whose instance was deleted before its deploy ran are removed too.
+        failed = self.search(['|', ('state', '=', 'failed'), '&', ('state', '=', 'reserved'), ('instance_id', '=', False)])
+        servers = self.env['saas.server'].search([('is_active', '=', True)])
+        counts = {
+            (server.id, version): count
+            for server, version, count in self._read_group(
+                [('state', 'in', ['warming', 'ready']), ('server_id', 'in', servers.ids)],
+                ['server_id', 'odoo_version'], ['__count'])
+        }
+        new_slots = self.create([
+            {'name': f"{pool_utils.POOL_SLOT_PREFIX}{uuid.uuid4().hex[:12]}", 'server_id': server.id, 'odoo_version': version}
+            for server in servers for version in versions
+            for _i in range(max(0, size - counts.get((server.id, version), 0)))
+        ])
+        if not new_slots and not failed:
+            return
+        # Make the warming slots visible before the slow remote work starts.
+        self.env.cr.commit()
+
+        work = defaultdict(lambda: {'warm': [], 'discard': []})
+        for slot in new_slots:
+            work[slot.server_id]['warm'].append((slot.id, slot.name, slot.odoo_version))
+        for slot in failed:
+            work[slot.server_id]['discard'].append((slot.id, slot.name, slot.odoo_version))
+        jobs = [(server._remote_snapshot(), lists) for server, lists in work.items()]
+
+        def run(job):
+            server_data, lists = job
+            results = []
+            for slot_id, name, _version in lists['discard']:
+                try:
+                    pool_utils.discard_slot(server_data, name)
+                    results.append((slot_id, 'discarded', False))
+                except Exception as e:
+                    _logger.warning(f"Could not discard pool slot '{name}' on '{server_data.name}': {e}")
+            templates = {}
+            for slot_id, name, version in lists['warm']:
+                try:
+                    if version not in templates:
+                        templates[version] = pool_utils.ensure_template(server_data, version)
+                    pool_utils.warm_slot(server_data, name, version)
+                    results.append((slot_id, 'ready', False))
+                except Exception as e:
+                    _logger.error(f"Warming pool slot '{name}' on '{server_data.name}' failed: {e}")
+                    results.append((slot_id, 'failed', str(e)))
+            return results
+
+        with ThreadPoolExecutor(max_workers=min(STATS_MAX_PARALLEL_SERVERS, len(jobs))) as executor:
+            results = [result for results in executor.map(run, jobs) for result in results]
+        now = fields.Datetime.now()
+        by_outcome = defaultdict(list)
+        for slot_id, outcome, error in results:
+            if outcome == 'failed':
+                self.browse(slot_id).write({'state': 'failed', 'error': error})
+            else:
+                by_outcome[outcome].append(slot_id)
+        self.browse(by_outcome['ready']).write({'state': 'ready', 'ready_at': now})
+        self.browse(by_outcome['discarded']).unlink()
+        _logger.info(f"Warm pool refill: {len(by_outcome['ready'])} slots ready, "
+                     f"{len(results) - len(by_outcome['ready']) - len(by_outcome['discarded'])} failed, "
+                     f"{len(by_outcome['discarded'])} discarded")
@@ -1,5 +1,44 @@
 # -*- coding: utf-8 -*-
+import heapq
+import json
+import logging
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from types import SimpleNamespace
 from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+from . import docker_utils
+from . import nginx_utils
+from . import pool_utils
+from . import ssh_utils
+
+_logger = logging.getLogger(__name__)
+
+STATS_MAX_PARALLEL_SERVERS = 8
+NGINX_SYNC_DELAY = 15  # seconds, batches domain changes into one sync per server
+IMAGE_PULL_MAX_PARALLEL = 4  # servers pulling images at once, pulls are bandwidth bound
+
+# Docker container states, as reported by a listing, grouped by what they mean for the instance
+CONTAINER_STATE_KINDS = {
+    'running': 'up',
+    'exited': 'down',
+    'dead': 'down',
+    'created': 'down',
+    'missing': 'missing',
+}
+# (instance state, container kind) -> corrected instance state; other combinations are left alone
+RECONCILE_TRANSITIONS = {
+    ('running', 'down'): 'suspended',
+    ('running', 'missing'): 'draft',
+    ('suspended', 'up'): 'running',
+    ('suspended', 'missing'): 'draft',
+    ('draft', 'up'): 'running',
+}
+# Infrastructure containers that are never reported as orphans
+RECONCILE_IGNORED_NAMES = {pool_utils.PG_CONTAINER}
+RECONCILE_IGNORED_PREFIXES = (pool_utils.POOL_SLOT_PREFIX,)
 
 class SaasServer(models.Model):
     _name = 'saas.server'
@@ -20,10 +59,411 @@ class SaasServer(models.Model):
     ssh_password = fields.Char(string='SSH Password', tracking=True)
     max_clients = fields.Integer(string='Max Instances', default=10, tracking=True)
     is_active = fields.Boolean(string='Active', default=True, tracking=True)
+    max_concurrent_jobs = fields.Integer(string='Max Concurrent Jobs', default=2,
+                                         help="Provisioning jobs allowed to run against this server at the same time.")
+    max_concurrent_backups = fields.Integer(string='Max Concurrent Backups', default=1,
+                                            help="Scheduled database dumps allowed to run for this server's instances at the same time.")
     notes = fields.Text(string='Notes')
+    nginx_brotli = fields.Boolean(string='Nginx Brotli Module', tracking=True,
+                                  help="The server's nginx loads the brotli module; profiles with compression then serve brotli too.")
+    nginx_sync_pending = fields.Boolean(string='Nginx Sync Pending', readonly=True)
+    nginx_deployed_state = fields.Text(string='Deployed Vhost Hashes (JSON)', readonly=True, copy=False)
+    nginx_synced_at = fields.Datetime(string='Nginx Synced At', readonly=True)
+    nginx_sync_error = fields.Text(string='Nginx Sync Error', readonly=True)
+    health_histogram = fields.Text(string='Health Latency Histogram (JSON)', readonly=True,
+                                   help="Health check latencies of the server's instances per bucket (ms), last round.")
+    health_p50_latency = fields.Float(string='Health p50 (ms)', readonly=True, digits=(16, 1))
+    health_p95_latency = fields.Float(string='Health p95 (ms)', readonly=True, digits=(16, 1))
+    health_unhealthy_count = fields.Integer(string='Unhealthy Instances', readonly=True)
+    operation_stat_ids = fields.One2many('saas.operation.stat', 'server_id', string='Operation Statistics')
+    pool_slot_ids = fields.One2many('saas.pool.slot', 'server_id', string='Warm Pool')
+    pool_ready_count = fields.Integer(string='Ready Pool Slots', compute='_compute_pool_stats')
+    pool_hit_count = fields.Integer(string='Pool Hits', readonly=True, copy=False)
+    pool_miss_count = fields.Integer(string='Pool Misses', readonly=True, copy=False)
+    pool_hit_rate = fields.Float(string='Pool Hit Rate (%)', compute='_compute_pool_stats', digits=(16, 1))
+    pool_claim_latency = fields.Float(string='Avg Claim Latency (ms)', compute='_compute_pool_stats', digits=(16, 1))
+    image_digests = fields.Text(string='Image Digests (JSON)', readonly=True, copy=False,
+                                help="Registry digest of the Odoo image present on the server, per Odoo version.")
+    images_checked_at = fields.Datetime(string='Images Checked At', readonly=True, copy=False)
+    image_pull_error = fields.Text(string='Image Pull Error', readonly=True, copy=False)
+    reconciled_at = fields.Datetime(string='Containers Reconciled At', readonly=True)
+    reconcile_error = fields.Char(string='Reconciliation Error', readonly=True)
+    orphan_container_count = fields.Integer(string='Orphan Containers', readonly=True)
+    orphan_containers = fields.Text(string='Orphan Container Names', readonly=True,
+                                    help="Containers found on the server that no live instance of this server owns.")
+    stats_collected_at = fields.Datetime(string='Stats Collected At', readonly=True)
+    stats_latency = fields.Float(string='Stats Collection Latency (ms)', readonly=True)
+    stats_error = fields.Char(string='Stats Collection Error', readonly=True)
+    instance_ids = fields.One2many('saas.instance', 'server_id', string='Instances')
     total_clients = fields.Integer(string='Total Instances', compute='_compute_total_clients', store=True)
+    cpu_cores = fields.Integer(string='CPU Cores', help="Used for placement headroom; leave 0 to ignore CPU.")
+    memory_capacity = fields.Float(string='Memory Capacity (MB)', help="Used for placement headroom; leave 0 to ignore memory.")
+    cpu_load = fields.Float(string='CPU Load (%)', readonly=True, help="Sum of the CPU usage of all containers at the last stats collection.")
+    memory_used = fields.Float(string='Memory Used (MB)', readonly=True)
 
-    @api.depends('id')
+    @api.depends('instance_ids.state')
     def _compute_total_clients(self):
+        counts = dict(self.env['saas.instance'].sudo()._read_group(
+            [('server_id', 'in', self.ids), ('state', '!=', 'cancelled')], ['server_id'], ['__count']))
+        for server in self:
+            server.total_clients = counts.get(server, 0)
+
+    @api.depends('pool_hit_count', 'pool_miss_count')
+    def _compute_pool_stats(self):
+        Slot = self.env['saas.pool.slot'].sudo()
+        ready = dict(Slot._read_group([('server_id', 'in', self.ids), ('state', '=', 'ready')],
+                                      ['server_id'], ['__count']))
+        latency = dict(Slot._read_group([('server_id', 'in', self.ids), ('state', '=', 'claimed')],
+                                        ['server_id'], ['claim_duration:avg']))
+        for server in self:
+            claims = server.pool_hit_count + server.pool_miss_count
+            server.pool_ready_count = ready.get(server, 0)
+            server.pool_hit_rate = 100.0 * server.pool_hit_count / claims if claims else 0.0
+            server.pool_claim_latency = latency.get(server) or 0.0
+
+    @api.model
+    def _plan_placement(self, count=1):
+        """Chooses target servers for ``count`` new instances.
+
+        Load comes from stored counters only (instance count, last collected CPU and memory), so a
+        single ``search_read`` feeds the whole decision. Servers sit in a heap keyed by their
+        projected load, which keeps a bulk placement at O(servers + count * log(servers)).
+        ``least_loaded`` spreads instances out, ``bin_packing`` fills the busiest server that still
+        has room.
+
+        :return: list of ``count`` dicts with ``server_id``, ``score``, ``strategy`` and ``candidates``
+        """
+        strategy = self.env['ir.config_parameter'].sudo().get_param('saas_automation.placement_strategy', 'least_loaded')
+        rows = self.search_read([('is_active', '=', True)], [
+            'max_clients', 'total_clients', 'cpu_cores', 'memory_capacity', 'cpu_load', 'memory_used'])
+        sign = -1 if strategy == 'bin_packing' else 1
+
+        def projected_score(row, added):
+            instances = row['total_clients'] + added
+            if row['max_clients'] and instances > row['max_clients']:
+                return None
+            # Without a history, assume a new instance costs as much as the average one already there.
+            per_instance = 1.0 / max(row['total_clients'], 1)
+            ratios = [instances / row['max_clients'] if row['max_clients'] else 0.0]
+            if row['cpu_cores']:
+                ratios.append(row['cpu_load'] * (1 + added * per_instance) / (row['cpu_cores'] * 100.0))
+            if row['memory_capacity']:
+                ratios.append(row['memory_used'] * (1 + added * per_instance) / row['memory_capacity'])
+            score = max(ratios)
+            return score if score <= 1.0 else None
+
+        heap = []
+        for row in rows:
+            score = projected_score(row, 1)
+            if score is not None:
+                heap.append((sign * score, row['id'], row, 1))
+        heapq.heapify(heap)
+        decisions = []
+        for _i in range(count):
+            if not heap:
+                raise UserError(_("No active server has capacity left for %s more instance(s).", count - len(decisions)))
+            signed_score, server_id, row, added = heapq.heappop(heap)
+            decisions.append({
+                'server_id': server_id,
+                'score': signed_score * sign,
+                'strategy': strategy,
+                'candidates': len(heap) + 1,
+            })
+            next_score = projected_score(row, added + 1)
+            if next_score is not None:
+                heapq.heappush(heap, (sign * next_score, server_id, row, added + 1))
+        return decisions
+
+    def _request_nginx_sync(self):
+        """Flags the servers for reconciliation and triggers the sync cron shortly after."""
+        self.sudo().filtered(lambda s: not s.nginx_sync_pending).write({'nginx_sync_pending': True})
+        cron = self.env.ref('saas_automation.ir_cron_saas_nginx_sync', raise_if_not_found=False)
+        if cron:
+            cron.sudo()._trigger(fields.Datetime.now() + timedelta(seconds=NGINX_SYNC_DELAY))
+
+    def _render_vhosts(self):
+        """Returns ``{file name: config}`` for every active custom domain hosted on this server."""
+        self.ensure_one()
+        instances = self.env['saas.instance'].search([
+            ('server_id', '=', self.id),
+            ('is_custom_domain_active', '=', True),
+            ('custom_domain', '!=', False),
+            ('state', 'not in', ['draft', 'cancelled']),
+        ])
+        return {
+            instance.custom_domain: nginx_utils.get_nginx_config(instance)
+            for instance in instances if nginx_utils.is_valid_domain(instance.custom_domain)
+        }
+
+    def action_sync_nginx(self):
+        self._sync_nginx()
+
+    def _sync_nginx(self):
+        """Renders the desired vhosts of every server and pushes the differences, servers in parallel."""
+        jobs = []
+        for server in self:
+            deployed = json.loads(server.nginx_deployed_state or '{}')
+            jobs.append((server._remote_snapshot(), server._render_vhosts(), deployed))
+
+        def sync(job):
+            server_data, desired, deployed = job
+            try:
+                return server_data.id, nginx_utils.sync_vhosts(server_data, desired, deployed), False
+            except Exception as e:
+                _logger.error(f"Nginx sync failed on '{server_data.name}': {e}")
+                return server_data.id, None, str(e)
+
+        if not jobs:
+            return
+        with ThreadPoolExecutor(max_workers=min(STATS_MAX_PARALLEL_SERVERS, len(jobs))) as executor:
+            results = list(executor.map(sync, jobs))
+        now = fields.Datetime.now()
+        for server_id, hashes, error in results:
+            server = self.browse(server_id)
+            if error:
+                server.write({'nginx_sync_error': error})
+            else:
+                server.write({
+                    'nginx_sync_pending': False,
+                    'nginx_deployed_state': json.dumps(hashes, sort_keys=True),
+                    'nginx_synced_at': now,
+                    'nginx_sync_error': False,
+                })
+
+    @api.model
+    def _cron_sync_nginx(self):
+        self.search([('nginx_sync_pending', '=', True), ('is_active', '=', True)])._sync_nginx()
+
+    def _remote_snapshot(self):
+        """Plain copy of the connection settings, safe to hand to worker threads."""
+        self.ensure_one()
+        return SimpleNamespace(
+            id=self.id,
+            name=self.name,
+            server_type=self.server_type,
+            host=self.host,
+            port=self.port,
+            ssh_user=self.ssh_user,
+            ssh_password=self.ssh_password,
+            is_active=self.is_active,
+            max_concurrent_jobs=self.max_concurrent_jobs,
+            dbname=self.env.cr.dbname,
+        )
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        servers = super(SaasServer, self).create(vals_list)
+        # Fresh servers get their images before the first deploy needs them.
+        cron = self.env.ref('saas_automation.ir_cron_saas_image_prepull', raise_if_not_found=False)
+        if cron and servers.filtered('is_active'):
+            cron.sudo()._trigger()
+        return servers
+
+    def write(self, vals):
+        if {'host', 'port', 'ssh_user', 'ssh_password', 'is_active'} & set(vals):
+            for server in self:
+                ssh_utils.invalidate_ssh_connection(server)
+        if {'host', 'server_type', 'is_active'} & set(vals):
+            for server in self:
+                docker_utils.invalidate_docker_client(server)
+        result = super(SaasServer, self).write(vals)
+        if 'nginx_brotli' in vals:
+            self._request_nginx_sync()
+        return result
+
+    def unlink(self):
         for server in self:
-            server.total_clients = self.env['saas.instance'].sudo().search_count([('server_id', '=', server.id)]) 
\ No newline at end of file
+            ssh_utils.invalidate_ssh_connection(server)
+            docker_utils.invalidate_docker_client(server)
+        return super(SaasServer, self).unlink()
+
+    @api.model
+    def _cron_collect_container_stats(self):
+        """Pulls container stats from every active server in one round trip per server.
+
+        Servers are polled in parallel; results are mapped back to instances by ``db_name``
+        (the container name) and stored with a single bulk ingest.
+        """
+        servers = self.search([('is_active', '=', True)])
+        if not servers:
+            return
+        snapshots = [server._remote_snapshot() for server in servers]
+
+        def collect(server_data):
+            start = time.monotonic()
+            try:
+                stats, error = docker_utils.collect_container_stats(server_data), False
+            except Exception as e:
+                _logger.warning(f"Collecting container stats from '{server_data.name}' failed: {e}")
+                stats, error = {}, str(e)[:255]
+            return server_data.id, stats, (time.monotonic() - start) * 1000.0, error
+
+        with ThreadPoolExecutor(max_workers=min(STATS_MAX_PARALLEL_SERVERS, len(snapshots))) as executor:
+            results = list(executor.map(collect, snapshots))
+
+        instances = self.env['saas.instance'].search_read(
+            [('server_id', 'in', servers.ids), ('state', '=', 'running')], ['server_id', 'db_name'])
+        index = {(rec['server_id'][0], rec['db_name']): rec['id'] for rec in instances}
+        now = fields.Datetime.now()
+        samples = []
+        for server_id, stats, latency, error in results:
+            for name, values in stats.items():
+                instance_id = index.get((server_id, name))
+                if instance_id:
+                    samples.append(dict(values, instance_id=instance_id, timestamp=now))
+            values = {
+                'stats_collected_at': now,
+                'stats_latency': latency,
+                'stats_error': error,
+            }
+            if not error:
+                values['cpu_load'] = sum(v['cpu_usage'] for v in stats.values())
+                values['memory_used'] = sum(v['memory_usage'] for v in stats.values())
+            self.browse(server_id).write(values)
+        self.env['saas.metric.sample'].ingest(samples)
+
+    def action_reconcile_containers(self):
+        self._reconcile_containers()
+
+    @api.model
+    def _cron_reconcile_containers(self):
+        self.search([('is_active', '=', True)])._reconcile_containers()
+
+    def _reconcile_containers(self):
+        """Aligns instance states with the containers actually found, one listing per server.
+
+        Servers are listed in parallel, then every instance is looked up by ``db_name`` in a
+        dict index of its server's containers. Corrections are written with one ``write`` per
+        target state; instances with an open job are left to that job. Containers no live
+        instance owns are recorded as orphans on the server.
+        """
+        if not self:
+            return
+        # Read the instances and their open jobs before listing: a deploy committing while the
+        # servers are listed is then still seen as busy, not as running without a container.
+        instances = self.env['saas.instance'].search_read(
+            [('server_id', 'in', self.ids)], ['server_id', 'db_name', 'state', 'name', 'container_state'])
+        busy_ids = set(self.env['saas.job'].search([
+            ('instance_id', 'in', [rec['id'] for rec in instances]),
+            ('state', 'in', ['pending', 'running']),
+        ]).instance_id.ids)
+        snapshots = [server._remote_snapshot() for server in self]
+
+        def list_states(server_data):
+            try:
+                return server_data.id, docker_utils.list_container_states(server_data), False
+            except Exception as e:
+                _logger.warning(f"Listing containers on '{server_data.name}' failed: {e}")
+                return server_data.id, None, str(e)[:255]
+
+        with ThreadPoolExecutor(max_workers=min(STATS_MAX_PARALLEL_SERVERS, len(snapshots))) as executor:
+            listings = {server_id: (states, error) for server_id, states, error in executor.map(list_states, snapshots)}
+
+        listed_ids = [server_id for server_id, (states, _error) in listings.items() if states is not None]
+        instances = [rec for rec in instances if rec['server_id'][0] in listed_ids]
+        owned = defaultdict(set)
+        corrections = defaultdict(list)  # new state -> instance ids
+        changed = defaultdict(list)  # container state -> ids of the instances it is new for
+        for rec in instances:
+            server_id = rec['server_id'][0]
+            container_state = listings[server_id][0].get(rec['db_name'], 'missing')
+            if rec['state'] != 'cancelled':
+                owned[server_id].add(rec['db_name'])
+            if container_state != rec['container_state']:
+                changed[container_state].append(rec['id'])
+            kind = CONTAINER_STATE_KINDS.get(container_state, 'unknown')
+            new_state = RECONCILE_TRANSITIONS.get((rec['state'], kind))
+            if new_state and rec['id'] not in busy_ids:
+                _logger.info(f"Instance '{rec['name']}' is {rec['state']} but its container is {container_state}, "
+                             f"setting it to {new_state}")
+                corrections[new_state].append(rec['id'])
+
+        Instance = self.env['saas.instance']
+        now = fields.Datetime.now()
+        for container_state, ids in changed.items():
+            Instance.browse(ids).write({'container_state': container_state, 'container_state_since': now})
+        for new_state, ids in corrections.items():
+            corrected = Instance.browse(ids)
+            corrected.write({'state': new_state})
+            for instance in corrected:
+                instance.message_post(body=_("Status set to %(state)s after reconciling with the server "
+                                             "(container %(container)s).",
+                                             state=new_state, container=instance.container_state))
+
+        for server in self:
+            states, error = listings[server.id]
+            if states is None:
+                server.write({'reconciled_at': now, 'reconcile_error': error})
+                continue
+            orphans = sorted(name for name in states
+                             if name not in owned[server.id] and not name.startswith(RECONCILE_IGNORED_PREFIXES)
+                             and name not in RECONCILE_IGNORED_NAMES)
+            server.write({
+                'reconciled_at': now,
+                'reconcile_error': False,
+                'orphan_container_count': len(orphans),
+                'orphan_containers': '\n'.join(orphans) or False,
+            })
+        _logger.info(f"Reconciled {len(instances)} instances on {len(listed_ids)} servers: "
+                     f"{sum(len(ids) for ids in corrections.values())} corrected")
+
+    def action_prepull_images(self):
+        self._prepull_images()
+
+    @api.model
+    def _cron_prepull_images(self):
+        self.search([('is_active', '=', True)])._prepull_images()
+
+    def _prepull_images(self):
+        """Pulls the Odoo image of every supported version on every server where it is outdated.
+
+        The registry is asked once per image for its current digest; a server whose recorded
+        digest already matches gets no remote call at all. The others pull their outdated
+        images, servers in parallel but at most ``saas_automation.image_pull_parallel`` at once.
+        Without a registry answer, only images a server never pulled are fetched.
+        """
+        if not self:
+            return
+        versions = [version for version, _label in self.env['saas.instance']._fields['odoo_version'].selection]
+        latest = {version: docker_utils.registry_digest(docker_utils.image_for_version(version)) for version in versions}
+        jobs = []
+        for server in self:
+            recorded = json.loads(server.image_digests or '{}')
+            outdated = [version for version in versions
+                        if not recorded.get(version) or (latest[version] and recorded[version] != latest[version])]
+            if outdated:
+                jobs.append((server._remote_snapshot(), outdated))
+        now = fields.Datetime.now()
+        self.filtered(lambda s: s.id not in {job[0].id for job in jobs}).write({'images_checked_at': now})
+        if not jobs:
+            return
+
+        def pull(job):
+            server_data, outdated = job
+            digests, errors = {}, []
+            for version in outdated:
+                image = docker_utils.image_for_version(version)
+                try:
+                    # Right after a pull the server holds what the registry announced, even when
+                    # the local copy does not report a digest to compare with.
+                    digests[version] = docker_utils.pull_image(server_data, image) or latest[version]
+                except Exception as e:
+                    _logger.error(f"Pulling '{image}' on '{server_data.name}' failed: {e}")
+                    errors.append(f"{image}: {e}")
+            return server_data.id, digests, errors
+
+        parallel = int(self.env['ir.config_parameter'].sudo().get_param(
+            'saas_automation.image_pull_parallel', IMAGE_PULL_MAX_PARALLEL))
+        with ThreadPoolExecutor(max_workers=max(1, min(parallel, len(jobs)))) as executor:
+            results = list(executor.map(pull, jobs))
+        for server_id, digests, errors in results:
+            server = self.browse(server_id)
+            recorded = json.loads(server.image_digests or '{}')
+            recorded.update({version: digest for version, digest in digests.items() if digest})
+            server.write({
+                'image_digests': json.dumps(recorded, sort_keys=True),
+                'images_checked_at': now,
+                'image_pull_error': '\n'.join(errors) or False,
+            })
+        _logger.info(f"Image pre-pull: {sum(len(d) for _s, d, _e in results)} images pulled on {len(results)} servers, "
+                     f"{sum(len(e) for _s, _d, e in results)} failed")
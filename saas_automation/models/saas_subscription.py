@@ -1,5 +1,13 @@
 # -*- coding: utf-8 -*-
+import logging
+from dateutil.relativedelta import relativedelta
 from odoo import models, fields, api, _
+from .saas_kpi_snapshot import SUBSCRIPTION_KPI_FIELDS
+
+_logger = logging.getLogger(__name__)
+
+EXPIRY_CHUNK_SIZE = 500  # subscriptions expired per transaction
+EXPIRY_LOCK_KEY = 'saas_automation.subscription_expiry'
 
 class SaasSubscription(models.Model):
     _name = 'saas.subscription'
@@ -26,16 +34,31 @@ class SaasSubscription(models.Model):
         ('cancelled', 'Cancelled'),
         ('expired', 'Expired'),
     ], string='Status', default='draft', tracking=True)
+    next_invoice_date = fields.Date(string='Next Invoice Date', index=True, copy=False,
+                                    help="Start of the next period to invoice; set on activation and advanced by each billing.")
+    billing_ids = fields.One2many('saas.billing', 'subscription_id', string='Billings')
+    close_date = fields.Date(string='Closed On', tracking=True, help="Date the subscription was cancelled or expired.")
     notes = fields.Text(string='Notes') 
 
-    @api.model
-    def create(self, vals):
-        if vals.get('name', _('New')) == _('New'):
-            vals['name'] = self.env['ir.sequence'].next_by_code('saas.subscription') or _('New')
-        result = super(SaasSubscription, self).create(vals)
+    @api.model_create_multi
+    def create(self, vals_list):
+        unnamed = [vals for vals in vals_list if vals.get('name', _('New')) == _('New')]
+        names = self.env['ir.sequence']._next_by_code_block('saas.subscription', len(unnamed))
+        for vals, name in zip(unnamed, names):
+            vals['name'] = name or _('New')
+        result = super(SaasSubscription, self).create(vals_list)
+        self.env['saas.kpi.snapshot']._request_refresh()
+        return result
+
+    def write(self, vals):
+        result = super(SaasSubscription, self).write(vals)
+        if SUBSCRIPTION_KPI_FIELDS & set(vals):
+            self.env['saas.kpi.snapshot']._request_refresh()
         return result
 
     def action_activate_subscription(self):
+        for subscription in self.filtered(lambda s: not s.next_invoice_date):
+            subscription.next_invoice_date = subscription.start_date
         self.write({'state': 'active'})
         self._create_invoice()
 
@@ -46,24 +69,74 @@ class SaasSubscription(models.Model):
         self.write({'state': 'active'})
 
     def action_cancel_subscription(self):
-        self.write({'state': 'cancelled'})
+        self.write({'state': 'cancelled', 'close_date': fields.Date.today()})
 
-    def _create_invoice(self):
-        invoice_vals = {
+    def _get_billing_period(self):
+        """Returns ``(start, end)`` of the period starting at ``next_invoice_date``, both inclusive."""
+        self.ensure_one()
+        interval = self.recurring_interval or 1
+        if self.recurring_rule_type == 'yearly':
+            delta = relativedelta(years=interval)
+        else:
+            delta = relativedelta(months=interval)
+        start = self.next_invoice_date or self.start_date
+        return start, start + delta - relativedelta(days=1)
+
+    def _prepare_invoice_vals(self, period_start, period_end, invoice_date):
+        self.ensure_one()
+        return {
             'partner_id': self.partner_id.id,
             'move_type': 'out_invoice',
-            'invoice_date': fields.Date.today(),
+            'invoice_date': invoice_date,
+            'invoice_origin': self.name,
             'invoice_line_ids': [(0, 0, {
-                'name': self.plan_id.name,
+                'name': f"{self.plan_id.name} ({period_start} - {period_end})",
                 'price_unit': self.price,
                 'quantity': 1,
             })],
         }
-        self.env['account.move'].create(invoice_vals)
+
+    def _create_invoice(self):
+        """Invoices the current period of the subscriptions that are due, skipping periods already billed."""
+        due = self.filtered(lambda s: s.next_invoice_date and s.next_invoice_date <= fields.Date.context_today(s))
+        if due:
+            self.env['saas.billing.run']._bill(due)
 
     def _cron_expire_subscriptions(self):
-        expired_subscriptions = self.search([
-            ('end_date', '<', fields.Date.today()),
-            ('state', 'in', ['active', 'suspended'])
-        ])
-        expired_subscriptions.write({'state': 'expired'}) 
\ No newline at end of file
+        """Expires overdue subscriptions chunk by chunk and suspends the instances they leave unpaid.
+
+        Every chunk's transaction takes a transaction-level advisory lock before it selects its
+        subscriptions, so overlapping runs (cron and manual) never process the same ones. The
+        lock is released by the chunk's commit or rollback, never left on a pooled connection.
+        """
+        cr = self.env.cr
+        today = fields.Date.today()
+        expired_count = suspended_count = 0
+        while True:
+            cr.execute("SELECT pg_try_advisory_xact_lock(hashtext(%s))", [EXPIRY_LOCK_KEY])
+            if not cr.fetchone()[0]:
+                _logger.info("Subscription expiry running elsewhere, leaving the rest to it")
+                break
+            subscriptions = self.search([
+                ('end_date', '<', today),
+                ('state', 'in', ['active', 'suspended']),
+            ], limit=EXPIRY_CHUNK_SIZE, order='id')
+            if not subscriptions:
+                break
+            subscriptions.write({'state': 'expired', 'close_date': today})
+            instances = subscriptions.instance_id.filtered(lambda i: i.state == 'running')
+            # Instances still backed by another active subscription keep running.
+            still_paid = self.search([
+                ('instance_id', 'in', instances.ids),
+                ('state', '=', 'active'),
+            ]).instance_id
+            instances -= still_paid
+            if instances:
+                errors = instances._run_remote_operation('suspend')
+                if errors:
+                    # Left to the job runner, which retries with backoff.
+                    self.env['saas.job'].enqueue(instances.browse(list(errors)), 'suspend')
+                suspended_count += len(instances) - len(errors)
+            expired_count += len(subscriptions)
+            cr.commit()
+        _logger.info(f"Expired {expired_count} subscriptions, suspended {suspended_count} instances")
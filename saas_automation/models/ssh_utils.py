@@ -1,30 +1,235 @@
 # -*- coding: utf-8 -*-
 import paramiko
 import logging
+import threading
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+from . import metrics_utils
 
 _logger = logging.getLogger(__name__)
 
+SSH_KEEPALIVE_INTERVAL = 30  # seconds between transport keepalive packets
+SSH_IDLE_TIMEOUT = 300  # pooled connections unused for longer than this are closed
+SSH_HEALTH_CHECK_AFTER = 60  # idle seconds after which a connection is probed before reuse
+SSH_MAX_CHANNELS = 8  # concurrent exec channels per server, below sshd's MaxSessions (10)
+SSH_CONNECT_TIMEOUT = 15
+
+
 def get_ssh_client(server):
     """Initializes and returns an SSH client connected to the specified server."""
     client = paramiko.SSHClient()
     client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-    client.connect(server.host, port=server.port, username=server.ssh_user, password=server.ssh_password)
+    with metrics_utils.span('ssh.connect', server):
+        client.connect(server.host, port=server.port, username=server.ssh_user, password=server.ssh_password,
+                       timeout=SSH_CONNECT_TIMEOUT)
+    # Lets commands run on this client be attributed to their server in the timing metrics.
+    client.saas_server = SimpleNamespace(id=server.id, name=server.name, dbname=metrics_utils._dbname(server))
+    transport = client.get_transport()
+    if transport:
+        transport.set_keepalive(SSH_KEEPALIVE_INTERVAL)
     return client
 
+
 def execute_ssh_command(client, command):
     """Executes a command on the remote server and returns the output."""
-    try:
-        stdin, stdout, stderr = client.exec_command(command)
-        output = stdout.read().decode()
-        error = stderr.read().decode()
-        if error:
-            _logger.error(f"Error executing SSH command: {error}")
-            return False, error
-        return True, output
-    except Exception as e:
-        _logger.error(f"Failed to execute SSH command: {e}")
-        return False, str(e)
+    with metrics_utils.span('ssh.exec', getattr(client, 'saas_server', None)) as timing:
+        try:
+            stdin, stdout, stderr = client.exec_command(command)
+            output = stdout.read().decode()
+            error = stderr.read().decode()
+            timing.bytes = len(output) + len(error)
+            if error:
+                _logger.error(f"Error executing SSH command: {error}")
+                timing.outcome = 'error'
+                return False, error
+            return True, output
+        except Exception as e:
+            _logger.error(f"Failed to execute SSH command: {e}")
+            timing.outcome = 'error'
+            return False, str(e)
+
+
+def run_ssh_command(client, command):
+    """Executes a command on the remote server and returns ``(exit status, stdout + stderr)``.
+
+    Unlike :func:`execute_ssh_command` success is judged by the exit status, not by the
+    presence of output on stderr.
+    """
+    with metrics_utils.span('ssh.exec', getattr(client, 'saas_server', None)) as timing:
+        try:
+            stdin, stdout, stderr = client.exec_command(command)
+            output = stdout.read().decode() + stderr.read().decode()
+            status = stdout.channel.recv_exit_status()
+        except Exception as e:
+            _logger.error(f"Failed to execute SSH command: {e}")
+            timing.outcome = 'error'
+            return -1, str(e)
+        timing.bytes = len(output)
+        if status:
+            timing.outcome = 'error'
+        return status, output
+
 
 def close_ssh_client(client):
     """Closes the SSH client connection."""
-    client.close() 
\ No newline at end of file
+    client.close()
+
+
+class _PooledConnection(object):
+    """One authenticated SSH transport shared by all channels opened to a server."""
+
+    def __init__(self, client, max_channels):
+        self.client = client
+        self.channels = threading.BoundedSemaphore(max_channels)
+        self.in_use = 0
+        self.last_used = time.monotonic()
+        self.retired = False  # out of the pool, closed once the last caller is done with it
+
+    def is_healthy(self):
+        transport = self.client.get_transport()
+        if not transport or not transport.is_active():
+            return False
+        if time.monotonic() - self.last_used > SSH_HEALTH_CHECK_AFTER:
+            try:
+                transport.send_ignore()
+            except Exception:
+                return False
+        return True
+
+
+class SshConnectionPool(object):
+    """Process-wide pool of keep-alive SSH connections keyed by server host/port/user.
+
+    A single transport is kept per server and multiplexes up to ``max_channels``
+    concurrent exec channels; callers beyond that limit block until a channel is free.
+    """
+
+    def __init__(self, max_channels=SSH_MAX_CHANNELS, idle_timeout=SSH_IDLE_TIMEOUT):
+        self.max_channels = max_channels
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._connections = {}
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'failures': 0}
+
+    @staticmethod
+    def _key(server):
+        # Per database too: the client carries the server record its commands are attributed to.
+        return (metrics_utils._dbname(server), server.host, server.port, server.ssh_user)
+
+    def _evict_idle(self):
+        now = time.monotonic()
+        for key, conn in list(self._connections.items()):
+            if not conn.in_use and now - conn.last_used > self.idle_timeout:
+                self._discard(key, conn)
+
+    def _discard(self, key, conn):
+        """Takes ``conn`` out of the pool; its transport is closed once no caller uses it anymore.
+
+        Other threads may still run channels on a connection one caller saw fail (a per-channel
+        error such as hitting ``MaxSessions`` does not break the transport), so it is never
+        closed under them.
+        """
+        if self._connections.get(key) is conn:
+            del self._connections[key]
+            self.stats['evictions'] += 1
+        conn.retired = True
+        if not conn.in_use:
+            self._close(conn)
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.client.close()
+        except Exception:
+            pass
+
+    def _checkout(self, server):
+        key = self._key(server)
+        with self._lock:
+            self._evict_idle()
+            conn = self._connections.get(key)
+            if conn and not conn.is_healthy():
+                _logger.info(f"Dropping stale SSH connection to {key[0]}:{key[1]}")
+                self._discard(key, conn)
+                conn = None
+            if conn:
+                self.stats['hits'] += 1
+                conn.in_use += 1
+                return key, conn
+            self.stats['misses'] += 1
+        # Connect outside the pool lock so a slow handshake does not block other servers.
+        try:
+            client = get_ssh_client(server)
+        except Exception:
+            with self._lock:
+                self.stats['failures'] += 1
+            raise
+        with self._lock:
+            existing = self._connections.get(key)
+            if existing and existing.is_healthy():
+                client.close()
+                conn = existing
+            else:
+                if existing:
+                    self._discard(key, existing)
+                conn = self._connections[key] = _PooledConnection(client, self.max_channels)
+            conn.in_use += 1
+            return key, conn
+
+    @contextmanager
+    def connection(self, server):
+        """Yields a pooled ``paramiko.SSHClient`` for ``server`` holding one channel slot."""
+        key, conn = self._checkout(server)
+        conn.channels.acquire()
+        failed = False
+        try:
+            yield conn.client
+        except (paramiko.SSHException, EOFError, OSError):
+            failed = True
+            raise
+        finally:
+            conn.channels.release()
+            with self._lock:
+                conn.in_use -= 1
+                conn.last_used = time.monotonic()
+                if failed:
+                    self.stats['failures'] += 1
+                    self._discard(key, conn)
+                elif conn.retired and not conn.in_use:
+                    self._close(conn)
+
+    def invalidate(self, server):
+        """Drops the pooled connection of ``server``, e.g. after its credentials changed."""
+        key = self._key(server)
+        with self._lock:
+            conn = self._connections.get(key)
+            if conn:
+                self._discard(key, conn)
+
+    def close_all(self):
+        with self._lock:
+            for key, conn in list(self._connections.items()):
+                self._discard(key, conn)
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats, open_connections=len(self._connections))
+
+
+_pool = SshConnectionPool()
+
+
+def ssh_connection(server):
+    """Context manager returning a pooled SSH client for the specified server."""
+    return _pool.connection(server)
+
+
+def invalidate_ssh_connection(server):
+    """Drops any pooled connection to the specified server."""
+    _pool.invalidate(server)
+
+
+def get_pool_stats():
+    """Returns pool hit/miss/eviction/failure counters and the number of open connections."""
+    return _pool.get_stats()
@@ -1,5 +1,34 @@
-// Static JS file for SaaS Portal
-odoo.define('saas_automation.portal', function (require) {
-    "use strict";
-    
-}); 
\ No newline at end of file
+/** @odoo-module **/
+// Live status of the instances listed on /my/saas, pushed over the bus instead of page reloads.
+import publicWidget from "@web/legacy/js/public/public_widget";
+
+const STATE_CLASSES = {
+    running: "text-bg-success",
+    draft: "text-bg-info",
+    deploying: "text-bg-info",
+};
+
+publicWidget.registry.SaasPortalInstances = publicWidget.Widget.extend({
+    selector: ".o_saas_portal_instances",
+
+    start() {
+        this.busService = this.bindService("bus_service");
+        this.busService.subscribe("saas_instance_state", (payload) => this._onInstanceState(payload));
+        this.busService.start();
+        return this._super(...arguments);
+    },
+
+    _onInstanceState({ instances }) {
+        for (const { id, state, label } of instances) {
+            const badge = this.el.querySelector(`tr[data-instance-id="${id}"] .o_saas_state`);
+            if (!badge) {
+                continue;
+            }
+            badge.textContent = label;
+            badge.classList.remove("text-bg-success", "text-bg-info", "text-bg-danger");
+            badge.classList.add(STATE_CLASSES[state] || "text-bg-danger");
+        }
+    },
+});
+
+export default publicWidget.registry.SaasPortalInstances;
@@ -1 +1,10 @@
-# -*- coding: utf-8 -*- 
\ No newline at end of file
+# -*- coding: utf-8 -*-
+from . import test_backup_retention
+from . import test_benchmarks
+from . import test_health_utils
+from . import test_instance_import
+from . import test_ir_sequence
+from . import test_nginx_vhost
+from . import test_placement
+from . import test_pool_claim
+from . import test_saas_job
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import os
+import platform
+import tempfile
+import time
+from contextlib import contextmanager
+
+from odoo import fields
+from odoo.tests.common import TransactionCase
+
+_logger = logging.getLogger(__name__)
+
+
+def _env_list(name, default):
+    return [int(value) for value in os.environ.get(name, default).split(',') if value.strip()]
+
+
+# Sizes can be overridden from the environment to benchmark bigger (or quicker) runs.
+BENCH_SCALES = _env_list('SAAS_BENCH_SCALES', '10000,100000')
+BENCH_INSTANCES = int(os.environ.get('SAAS_BENCH_INSTANCES', 500))
+BENCH_EXPIRY = int(os.environ.get('SAAS_BENCH_EXPIRY', 5000))
+BENCH_VHOSTS = int(os.environ.get('SAAS_BENCH_VHOSTS', 1000))
+BENCH_SERVERS = int(os.environ.get('SAAS_BENCH_SERVERS', 10))
+BENCH_LATENCY = float(os.environ.get('SAAS_BENCH_LATENCY', 0.02))
+BENCH_FAILURE_RATE = float(os.environ.get('SAAS_BENCH_FAILURE_RATE', 0.0))
+BENCH_OUTPUT = os.environ.get('SAAS_BENCH_OUTPUT', os.path.join(tempfile.gettempdir(), 'saas_benchmarks.jsonl'))
+
+
+class SaasCase(TransactionCase):
+    """Shared helpers of the behaviour tests and the benchmarks."""
+    @contextmanager
+    def no_commit(self):
+        """Lets code that commits between chunks run inside the test transaction."""
+        cr = self.env.cr
+        original = cr.commit
+        cr.commit = lambda: None
+        try:
+            yield
+        finally:
+            cr.commit = original
+
+
+class SaasTestCase(SaasCase):
+    """Base class of the behaviour tests: a customer, a plan and two empty servers of their own.
+
+    Servers present in the database are deactivated so placement only sees the test servers.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env['saas.server'].search([]).write({'is_active': False})
+        cls.partner = cls.env['res.partner'].create({'name': 'Test Customer', 'email': 'customer@example.com'})
+        cls.plan = cls.env['saas.plan'].create({'name': 'Test Plan', 'price_monthly': 10.0})
+        cls.server_a, cls.server_b = cls.env['saas.server'].create([{
+            'name': f'test-server-{name}',
+            'server_type': 'docker',
+            'host': f'10.98.0.{i + 1}',
+            'max_clients': 10,
+            'max_concurrent_jobs': 4,
+        } for i, name in enumerate('ab')])
+
+    def create_instances(self, count, server=None, prefix='test', **vals):
+        return self.env['saas.instance'].create([dict({
+            'subdomain': f'{prefix}{i}',
+            'db_name': f'{prefix}_{i}',
+            'server_id': (server or self.server_a).id,
+            'plan_id': self.plan.id,
+            'partner_id': self.partner.id,
+        }, **vals) for i in range(count)])
+
+
+class SaasBenchmarkCase(SaasCase):
+    """Base class of the benchmarks: bulk fixtures plus timing that ends up as JSON lines.
+
+    Every measurement is appended to ``SAAS_BENCH_OUTPUT`` as one JSON object with the
+    benchmark name, its parameters and metrics, so successive runs can be compared by tools.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.partner = cls.env['res.partner'].create({'name': 'Benchmark Customer'})
+        cls.plan = cls.env['saas.plan'].create({'name': 'Benchmark Plan', 'price_monthly': 10.0})
+        cls.servers = cls.env['saas.server'].create([{
+            'name': f'bench-server-{i}',
+            'server_type': 'docker',
+            'host': f'10.99.0.{i + 1}',
+            'max_clients': 1000000,
+            'max_concurrent_jobs': 4,
+        } for i in range(BENCH_SERVERS)])
+
+    def record(self, name, params, **metrics):
+        result = {
+            'benchmark': name,
+            'timestamp': fields.Datetime.to_string(fields.Datetime.now()),
+            'host': platform.node(),
+            'params': params,
+            'metrics': {key: round(value, 4) if isinstance(value, float) else value for key, value in metrics.items()},
+        }
+        _logger.info("BENCHMARK %s", json.dumps(result, sort_keys=True))
+        with open(BENCH_OUTPUT, 'a') as f:
+            f.write(json.dumps(result, sort_keys=True) + '\n')
+        return result
+
+    @contextmanager
+    def timer(self):
+        """Yields a dict whose ``elapsed`` (seconds) is set when the block exits."""
+        timing = {}
+        start = time.perf_counter()
+        try:
+            yield timing
+        finally:
+            timing['elapsed'] = time.perf_counter() - start
+
+    def populate_instances(self, count, state='running', custom_domains=False):
+        """Inserts ``count`` instances spread over the benchmark servers with one statement."""
+        self.env.flush_all()
+        self.env.cr.execute("""
+            INSERT INTO saas_instance (name, subdomain, db_name, odoo_version, server_id, plan_id, partner_id,
+                                       state, active_user_count, port, longpolling_port, health_state,
+                                       custom_domain, is_custom_domain_active,
+                                       create_uid, write_uid, create_date, write_date)
+            SELECT 'BENCH' || i, 'bench' || i, 'bench_' || i || '_' || md5(random()::text), '18.0',
+                   (%(servers)s)[1 + i %% cardinality(%(servers)s)], %(plan)s, %(partner)s,
+                   COALESCE(%(state)s, (ARRAY['draft', 'running', 'running', 'running', 'suspended', 'cancelled'])[1 + i %% 6]),
+                   1 + i %% 20, 8069, 8072, 'unknown',
+                   CASE WHEN %(custom)s THEN 'bench-' || i || '.example.com' END, %(custom)s,
+                   %(uid)s, %(uid)s, now() at time zone 'UTC', now() at time zone 'UTC'
+              FROM generate_series(1, %(count)s) i
+         RETURNING id
+        """, {
+            'servers': self.servers.ids,
+            'plan': self.plan.id,
+            'partner': self.partner.id,
+            'state': state,
+            'custom': custom_domains,
+            'uid': self.env.uid,
+            'count': count,
+        })
+        ids = [row[0] for row in self.env.cr.fetchall()]
+        self.env.invalidate_all()
+        return self.env['saas.instance'].browse(ids)
+
+    def populate_subscriptions(self, instances, state=None, end_date=None):
+        """Inserts one subscription per instance, with a mix of states and recurrences unless forced."""
+        self.env.flush_all()
+        self.env.cr.execute("""
+            INSERT INTO saas_subscription (name, partner_id, instance_id, plan_id, start_date, end_date,
+                                           recurring_interval, recurring_rule_type, price, state, close_date,
+                                           create_uid, write_uid, create_date, write_date)
+            SELECT 'BENCHSUB' || i.id, %(partner)s, i.id, %(plan)s, current_date - 400, %(end_date)s,
+                   1, CASE WHEN i.id %% 5 = 0 THEN 'yearly' ELSE 'monthly' END, 10 + i.id %% 90,
+                   COALESCE(%(state)s, (ARRAY['active', 'active', 'active', 'cancelled', 'expired'])[1 + i.id %% 5]),
+                   CASE WHEN %(state)s IS NULL AND i.id %% 5 >= 3 THEN current_date - i.id %% 60 END,
+                   %(uid)s, %(uid)s, now() at time zone 'UTC', now() at time zone 'UTC'
+              FROM saas_instance i
+             WHERE i.id = ANY(%(ids)s)
+         RETURNING id
+        """, {
+            'partner': self.partner.id,
+            'plan': self.plan.id,
+            'end_date': end_date,
+            'state': state,
+            'uid': self.env.uid,
+            'ids': instances.ids,
+        })
+        ids = [row[0] for row in self.env.cr.fetchall()]
+        self.env.invalidate_all()
+        return self.env['saas.subscription'].browse(ids)
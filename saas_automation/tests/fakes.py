@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""In-process stand-ins for the remote helpers of ``ssh_utils`` and ``docker_utils``.
+
+They sleep for a configurable latency instead of talking to a host and fail a configurable
+share of calls, so the code paths above them can be exercised and timed on a single box.
+"""
+import random
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from unittest.mock import patch
+
+from odoo.addons.saas_automation.models import docker_utils, saas_instance, ssh_utils
+
+
+class FakeRemoteError(Exception):
+    pass
+
+
+class FakeSftp(object):
+
+    def __init__(self, remote):
+        self.remote = remote
+
+    def putfo(self, fileobj, path):
+        self.remote._call('sftp_put', len(fileobj.read()))
+
+    def close(self):
+        pass
+
+
+class FakeSshClient(object):
+
+    def __init__(self, remote):
+        self.remote = remote
+
+    def open_sftp(self):
+        return FakeSftp(self.remote)
+
+
+class FakeRemote(object):
+    """Records every call and simulates its latency (seconds) and failure rate (0..1)."""
+
+    def __init__(self, latency=0.0, failure_rate=0.0, seed=0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = {}
+        self.bytes_sent = 0
+        self.containers = {}  # server id -> {container name: state}
+
+    def _call(self, name, size=0):
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+            self.bytes_sent += size
+            fail = self.failure_rate and self._random.random() < self.failure_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise FakeRemoteError(f"injected failure in {name}")
+
+    def _set_container(self, server, instance, state):
+        with self._lock:
+            self.containers.setdefault(server.id, {})[instance.db_name] = state
+
+    # docker_utils
+    def create_container(self, server, instance):
+        self._call('create_container')
+        self._set_container(server, instance, 'running')
+
+    def stop_container(self, server, instance):
+        self._call('stop_container')
+        self._set_container(server, instance, 'exited')
+
+    def start_container(self, server, instance):
+        self._call('start_container')
+        self._set_container(server, instance, 'running')
+
+    def remove_container(self, server, instance):
+        self._call('remove_container')
+        with self._lock:
+            self.containers.get(server.id, {}).pop(instance.db_name, None)
+
+    def list_container_states(self, server):
+        self._call('list_containers')
+        with self._lock:
+            return dict(self.containers.get(server.id, {}))
+
+    def collect_container_stats(self, server):
+        self._call('container_stats')
+        with self._lock:
+            names = [name for name, state in self.containers.get(server.id, {}).items() if state == 'running']
+        return {name: {'cpu_usage': 1.0, 'memory_usage': 256.0} for name in names}
+
+    # ssh_utils
+    @contextmanager
+    def ssh_connection(self, server):
+        self._call('ssh_connect')
+        yield FakeSshClient(self)
+
+    def execute_ssh_command(self, client, command):
+        try:
+            self._call('ssh_exec')
+        except FakeRemoteError as e:
+            return False, str(e)
+        return True, ''
+
+    def run_ssh_command(self, client, command):
+        try:
+            self._call('ssh_exec')
+        except FakeRemoteError as e:
+            return 1, str(e)
+        return 0, ''
+
+    @contextmanager
+    def patched(self):
+        """Routes ``ssh_utils``, ``docker_utils`` and the instance lifecycle operations to this fake."""
+        with ExitStack() as stack:
+            stack.enter_context(patch.dict(saas_instance.REMOTE_OPERATIONS, {
+                'deploy': (self.create_container, 'running'),
+                'suspend': (self.stop_container, 'suspended'),
+                'resume': (self.start_container, 'running'),
+                'cancel': (self.remove_container, 'cancelled'),
+            }))
+            for name, target in [
+                ('create_odoo_container', self.create_container),
+                ('stop_odoo_container', self.stop_container),
+                ('start_odoo_container', self.start_container),
+                ('remove_odoo_container', self.remove_container),
+                ('list_container_states', self.list_container_states),
+                ('collect_container_stats', self.collect_container_stats),
+            ]:
+                stack.enter_context(patch.object(docker_utils, name, target))
+            stack.enter_context(patch.object(ssh_utils, 'ssh_connection', self.ssh_connection))
+            stack.enter_context(patch.object(ssh_utils, 'execute_ssh_command', self.execute_ssh_command))
+            stack.enter_context(patch.object(ssh_utils, 'run_ssh_command', self.run_ssh_command))
+            yield self
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+import json
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from odoo.tests import tagged
+
+from odoo.addons.saas_automation.models import backup_utils
+from .common import SaasTestCase
+
+
+@tagged('post_install', '-at_install')
+class TestBackupRetention(SaasTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.Backup = self.env['saas.backup']
+        self.instance, self.other = self.create_instances(2)
+        self.newest = datetime(2025, 6, 30, 3, 0)
+
+    def create_backups(self, instance, days, state='done'):
+        """One backup per day going back ``days`` days, each with a chunk of its own."""
+        return self.Backup.create([{
+            'name': f'{instance.db_name} {day}',
+            'instance_id': instance.id,
+            'backup_date': self.newest - timedelta(days=day),
+            'state': state,
+            'manifest': json.dumps({'files': [{'chunks': [f'{instance.id}-{day}']}]}),
+        } for day in range(days)])
+
+    def test_select_daily(self):
+        backups = self.create_backups(self.instance, 10)
+        self.assertEqual(backups._select_gfs_keep(3, 0, 0), backups[:3])
+
+    def test_select_weekly_and_monthly(self):
+        backups = self.create_backups(self.instance, 70)
+        kept = backups._select_gfs_keep(0, 2, 2)
+        # 2025-06-30 is a Monday: the newest backup of its week and of the week before, plus
+        # the newest backup of June (the same Monday) and of May.
+        self.assertEqual(kept.mapped('backup_date'), [
+            datetime(2025, 6, 30, 3, 0), datetime(2025, 6, 29, 3, 0), datetime(2025, 5, 31, 3, 0),
+        ])
+
+    def run_retention(self, keep_daily, keep_weekly=0, keep_monthly=0):
+        params = self.env['ir.config_parameter'].sudo()
+        params.set_param('saas_automation.backup_keep_daily', keep_daily)
+        params.set_param('saas_automation.backup_keep_weekly', keep_weekly)
+        params.set_param('saas_automation.backup_keep_monthly', keep_monthly)
+        with self.no_commit(), \
+                patch.object(backup_utils, 'chunk_store_root', return_value='/nonexistent'), \
+                patch.object(backup_utils, 'collect_garbage', return_value=0) as collect:
+            self.Backup._cron_apply_retention()
+        return collect.call_args[0][1]
+
+    def test_retention_per_instance(self):
+        backups = self.create_backups(self.instance, 5)
+        other_backups = self.create_backups(self.other, 2)
+        failed = self.create_backups(self.instance, 1, state='failed')
+        live = self.run_retention(keep_daily=3)
+        self.assertEqual(self.Backup.search([('instance_id', '=', self.instance.id)]), backups[:3])
+        self.assertEqual(self.Backup.search([('instance_id', '=', self.other.id)]), other_backups)
+        self.assertFalse(failed.exists())
+        # Only chunks of the remaining backups are protected from the garbage collection.
+        self.assertEqual(live, {f'{self.instance.id}-{day}' for day in range(3)}
+                         | {f'{self.other.id}-{day}' for day in range(2)})
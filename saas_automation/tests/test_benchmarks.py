@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks of the hot paths, excluded from the standard test run.
+
+Run them with ``--test-tags saas_benchmark``; results are appended as JSON lines to
+``SAAS_BENCH_OUTPUT`` (see ``common.py`` for the size and latency knobs).
+"""
+import tempfile
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests import tagged
+
+from odoo.addons.saas_automation.models import backup_utils
+from .common import (
+    BENCH_EXPIRY, BENCH_FAILURE_RATE, BENCH_INSTANCES, BENCH_LATENCY, BENCH_SCALES, BENCH_SERVERS,
+    BENCH_VHOSTS, SaasBenchmarkCase,
+)
+from .fakes import FakeRemote
+
+
+@tagged('saas_benchmark', '-standard', 'post_install', '-at_install')
+class TestSaasBenchmarks(SaasBenchmarkCase):
+
+    def test_provisioning_throughput(self):
+        instances = self.populate_instances(BENCH_INSTANCES, state='deploying')
+        remote = FakeRemote(latency=BENCH_LATENCY, failure_rate=BENCH_FAILURE_RATE)
+        with remote.patched(), self.timer() as timing:
+            errors = instances._run_remote_operation('deploy')
+            self.env.flush_all()
+        self.assertEqual(remote.calls['create_container'], BENCH_INSTANCES)
+        self.assertEqual(len(instances.filtered(lambda i: i.state == 'running')), BENCH_INSTANCES - len(errors))
+        self.record('provisioning', {
+            'instances': BENCH_INSTANCES, 'servers': BENCH_SERVERS,
+            'latency': BENCH_LATENCY, 'failure_rate': BENCH_FAILURE_RATE,
+        }, seconds=timing['elapsed'], instances_per_second=BENCH_INSTANCES / timing['elapsed'], failed=len(errors))
+
+    def test_kpi_compute(self):
+        Snapshot = self.env['saas.kpi.snapshot']
+        populated = 0
+        for scale in sorted(BENCH_SCALES):
+            instances = self.populate_instances(scale - populated, state=None)
+            self.populate_subscriptions(instances)
+            populated = scale
+            with self.timer() as compute:
+                values = Snapshot._compute_values()
+            self.assertEqual(values['total_instances'], self.env['saas.instance'].search_count([]))
+            Snapshot._refresh()
+            self.env.invalidate_all()
+            dashboard = self.env['saas.dashboard'].create({'name': 'Benchmark'})
+            with self.timer() as read:
+                dashboard.read(['mrr', 'active_instances', 'churn_rate'])
+            self.record('kpi_compute', {'instances': scale, 'subscriptions': scale},
+                        compute_seconds=compute['elapsed'], dashboard_read_seconds=read['elapsed'])
+
+    def test_subscription_expiry(self):
+        instances = self.populate_instances(BENCH_EXPIRY, state='running')
+        yesterday = fields.Date.today() - timedelta(days=1)
+        self.populate_subscriptions(instances, state='active', end_date=yesterday)
+        remote = FakeRemote(latency=BENCH_LATENCY / 10, failure_rate=BENCH_FAILURE_RATE)
+        with remote.patched(), self.no_commit(), self.timer() as timing:
+            self.env['saas.subscription']._cron_expire_subscriptions()
+            self.env.flush_all()
+        self.assertFalse(self.env['saas.subscription'].search_count([
+            ('instance_id', 'in', instances.ids), ('state', '=', 'active')]))
+        self.record('subscription_expiry', {
+            'subscriptions': BENCH_EXPIRY, 'latency': BENCH_LATENCY / 10, 'failure_rate': BENCH_FAILURE_RATE,
+        }, seconds=timing['elapsed'], subscriptions_per_second=BENCH_EXPIRY / timing['elapsed'],
+            containers_stopped=remote.calls.get('stop_container', 0))
+
+    def test_nginx_sync(self):
+        self.populate_instances(BENCH_VHOSTS, state='running', custom_domains=True)
+        remote = FakeRemote(latency=BENCH_LATENCY)
+        with remote.patched():
+            with self.timer() as first:
+                self.servers._sync_nginx()
+                self.env.flush_all()
+            uploads = remote.calls.get('sftp_put', 0)
+            with self.timer() as second:
+                self.servers._sync_nginx()
+                self.env.flush_all()
+        self.assertEqual(uploads, BENCH_VHOSTS)
+        self.assertEqual(remote.calls.get('sftp_put', 0), uploads, "an unchanged fleet must not upload anything")
+        self.record('nginx_sync', {'vhosts': BENCH_VHOSTS, 'servers': BENCH_SERVERS, 'latency': BENCH_LATENCY},
+                    full_sync_seconds=first['elapsed'], noop_sync_seconds=second['elapsed'],
+                    bytes_uploaded=remote.bytes_sent)
+
+    def test_backup_throughput(self):
+        with tempfile.TemporaryDirectory() as root:
+            with self.timer() as first:
+                _manifest, stats = backup_utils.dump_db_chunked(root, self.env.cr.dbname)
+            with self.timer() as second:
+                _manifest, again = backup_utils.dump_db_chunked(root, self.env.cr.dbname)
+        size_mb = stats['original_size'] / 1024.0 ** 2
+        self.assertLessEqual(again['new_chunk_count'], stats['chunk_count'])
+        self.record('backup', {'database_mb': round(size_mb, 1)},
+                    first_seconds=first['elapsed'], first_mb_per_second=size_mb / first['elapsed'],
+                    dedup_seconds=second['elapsed'], dedup_mb_per_second=size_mb / second['elapsed'],
+                    stored_ratio=stats['stored_size'] / stats['original_size'] if stats['original_size'] else 0.0,
+                    dedup_new_chunks=again['new_chunk_count'])
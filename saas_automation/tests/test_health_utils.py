@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from odoo.tests import BaseCase
+
+from odoo.addons.saas_automation.models import health_utils
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """``/web/health`` answers 200, ``/down`` 503 and ``/slow`` only after a second."""
+
+    def do_GET(self):
+        if self.path == '/slow':
+            time.sleep(1.0)
+        status = 200 if self.path in ('/web/health', '/slow') else 503
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHealthUtils(BaseCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), _StubHandler)
+        cls.server.daemon_threads = True
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+        thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        thread.start()
+        cls.addClassCleanup(cls.server.server_close)
+        cls.addClassCleanup(cls.server.shutdown)
+
+    def probe(self, path, timeout=health_utils.HEALTH_TIMEOUT):
+        return asyncio.run(health_utils.probe_http(self.base_url + path, timeout))
+
+    def test_probe_healthy(self):
+        result = self.probe(health_utils.HEALTH_PATH)
+        self.assertTrue(result['ok'])
+        self.assertEqual(result['status'], 200)
+        self.assertFalse(result['error'])
+        self.assertGreater(result['latency'], 0.0)
+
+    def test_probe_http_error(self):
+        result = self.probe('/down')
+        self.assertFalse(result['ok'])
+        self.assertEqual(result['status'], 503)
+        self.assertEqual(result['error'], 'HTTP 503')
+
+    def test_probe_timeout(self):
+        result = self.probe('/slow', timeout=0.2)
+        self.assertFalse(result['ok'])
+        self.assertEqual(result['status'], 0)
+        self.assertEqual(result['latency'], 200.0)
+        self.assertIn('timeout', result['error'])
+
+    def test_probe_refused(self):
+        # Bind and release a port so nothing listens on it.
+        probe = ThreadingHTTPServer(('127.0.0.1', 0), _StubHandler)
+        port = probe.server_address[1]
+        probe.server_close()
+        result = asyncio.run(health_utils.probe_http(f"http://127.0.0.1:{port}/web/health", 1.0))
+        self.assertFalse(result['ok'])
+        self.assertTrue(result['error'])
+
+    def test_probe_all_bounded(self):
+        targets = {i: self.base_url + (health_utils.HEALTH_PATH if i % 2 else '/down') for i in range(20)}
+        results = asyncio.run(health_utils.probe_all(targets, concurrency=4, timeout=2.0))
+        self.assertEqual(set(results), set(targets))
+        self.assertEqual([key for key, result in results.items() if result['ok']], list(range(1, 20, 2)))
+
+    def test_histogram_and_percentile(self):
+        self.assertEqual(health_utils.bucket_label(50), '<=50')
+        self.assertEqual(health_utils.bucket_label(51), '<=100')
+        self.assertEqual(health_utils.bucket_label(9000), '>5000')
+        self.assertEqual(health_utils.histogram([10, 60, 70], {'<=50': 2}), {'<=50': 3, '<=100': 2})
+        self.assertEqual(health_utils.percentile([], 95), 0.0)
+        self.assertEqual(health_utils.percentile([30, 10, 20], 50), 20)
+        self.assertEqual(health_utils.percentile(list(range(1, 101)), 95), 95)
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+import base64
+
+from odoo.exceptions import UserError
+from odoo.tests import tagged
+
+from .common import SaasTestCase
+
+
+@tagged('post_install', '-at_install')
+class TestInstanceImport(SaasTestCase):
+
+    def make_wizard(self, lines, **vals):
+        content = '\n'.join(lines) + '\n'
+        return self.env['saas.instance.import.wizard'].create(dict({
+            'import_file': base64.b64encode(content.encode()),
+            'import_filename': 'instances.csv',
+            'plan_id': self.plan.id,
+            'create_subscriptions': True,
+        }, **vals))
+
+    def test_missing_columns(self):
+        wizard = self.make_wizard(['subdomain,plan', 'acme,'])
+        with self.assertRaises(UserError):
+            wizard.action_import()
+
+    def test_no_rows(self):
+        with self.assertRaises(UserError):
+            self.make_wizard(['subdomain,partner']).action_import()
+
+    def test_validation(self):
+        self.create_instances(1, prefix='taken')
+        wizard = self.make_wizard([
+            'Subdomain,Partner,Plan,Price,Server,Odoo_Version,DB_Name',
+            'good1,customer@example.com,,,,,',              # 2: valid, default plan
+            'Bad_Sub!,customer@example.com,,,,,',           # 3
+            'good1,customer@example.com,,,,,',              # 4: repeats line 2
+            'taken0,customer@example.com,,,,,',             # 5: exists already
+            'good2,Nobody,,,,,',                            # 6
+            'good3,customer@example.com,Missing Plan,,,,',  # 7
+            'good4,customer@example.com,,abc,,,',           # 8
+            'good5,customer@example.com,,,nowhere,,',       # 9
+            'good6,customer@example.com,,,,15.0,',          # 10
+            'good7,customer@example.com,,,,,taken_0',       # 11: database exists already
+            'good8,customer@example.com,,,,,bad name',      # 12
+            'good9,Test Customer,,12.5,test-server-b,17.0,good9db',  # 13: valid, all columns
+        ])
+        valid, errors = wizard._validate(list(wizard._read_rows()))
+        self.assertEqual([line for line, _vals, _price in valid], [2, 13])
+        self.assertEqual(sorted(errors), [3, 4, 5, 6, 7, 8, 9, 10, 11, 12])
+        self.assertIn('already used', errors[4])
+        self.assertIn('already used', errors[11])
+        _line, vals, price = valid[1]
+        self.assertEqual(vals, {
+            'subdomain': 'good9',
+            'db_name': 'good9db',
+            'partner_id': self.partner.id,
+            'plan_id': self.plan.id,
+            'odoo_version': '17.0',
+            'server_id': self.server_b.id,
+        })
+        self.assertEqual(price, 12.5)
+        self.assertEqual(valid[0][1]['db_name'], 'good1-test-plan')
+        self.assertEqual(valid[0][2], self.plan.price_monthly)
+
+    def test_import(self):
+        wizard = self.make_wizard([
+            'subdomain,partner,price',
+            'alpha,customer@example.com,20',
+            'bad sub,customer@example.com,',
+            'beta,customer@example.com,',
+        ])
+        wizard.action_import()
+        self.assertEqual(wizard.state, 'done')
+        self.assertEqual((wizard.created_count, wizard.error_count), (2, 1))
+        self.assertIn('Line 3', wizard.error_report)
+        instances = wizard.instance_ids
+        self.assertEqual(sorted(instances.mapped('subdomain')), ['alpha', 'beta'])
+        self.assertTrue(all(instances.mapped('server_id')))
+        subscriptions = self.env['saas.subscription'].search([('instance_id', 'in', instances.ids)])
+        self.assertEqual(sorted(subscriptions.mapped('price')), [10.0, 20.0])
+
+    def test_ambiguous_partner(self):
+        self.env['res.partner'].create([
+            {'name': 'Twin', 'email': 'twin1@example.com'},
+            {'name': 'Twin', 'email': 'twin2@example.com'},
+        ])
+        wizard = self.make_wizard([
+            'subdomain,partner',
+            'twin1,Twin',               # 2: two contacts of that name
+            'twin2,twin2@example.com',  # 3: the email tells them apart
+        ])
+        valid, errors = wizard._validate(list(wizard._read_rows()))
+        self.assertEqual(sorted(errors), [2])
+        self.assertIn('ambiguous', errors[2])
+        self.assertEqual(valid[0][1]['partner_id'],
+                         self.env['res.partner'].search([('email', '=', 'twin2@example.com')]).id)
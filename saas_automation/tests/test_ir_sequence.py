@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestSequenceBlock(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.Sequence = cls.env['ir.sequence']
+
+    def create_sequence(self, code, **vals):
+        return self.Sequence.create(dict({
+            'name': code,
+            'code': code,
+            'prefix': 'T',
+            'padding': 4,
+            'company_id': False,
+        }, **vals))
+
+    def test_standard(self):
+        self.create_sequence('saas.test.standard')
+        self.assertEqual(self.Sequence._next_by_code_block('saas.test.standard', 3), ['T0001', 'T0002', 'T0003'])
+        self.assertEqual(self.Sequence.next_by_code('saas.test.standard'), 'T0004')
+
+    def test_no_gap(self):
+        self.create_sequence('saas.test.no_gap', implementation='no_gap', number_next=5, number_increment=2)
+        self.assertEqual(self.Sequence._next_by_code_block('saas.test.no_gap', 3), ['T0005', 'T0007', 'T0009'])
+        self.assertEqual(self.Sequence.next_by_code('saas.test.no_gap'), 'T0011')
+
+    def test_date_range(self):
+        self.create_sequence('saas.test.range', use_date_range=True, prefix='T%(range_year)s/')
+        values = self.Sequence._next_by_code_block('saas.test.range', 2)
+        self.assertEqual(len(set(values)), 2)
+        self.assertTrue(all(value.startswith('T') for value in values))
+
+    def test_empty_and_unknown(self):
+        self.assertEqual(self.Sequence._next_by_code_block('saas.test.standard', 0), [])
+        self.assertEqual(self.Sequence._next_by_code_block('saas.test.unknown', 2), [False, False])
+
+    def test_instance_names(self):
+        sequence = self.env.ref('saas_automation.seq_saas_instance')
+        number = sequence.number_next_actual
+        names = self.Sequence._next_by_code_block('saas.instance', 2)
+        self.assertEqual(names, [sequence.get_next_char(number), sequence.get_next_char(number + 1)])
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+import os
+
+from odoo.tests import BaseCase
+
+from odoo.addons.saas_automation.models import nginx_utils
+
+GOLDEN_DIR = os.path.join(os.path.dirname(__file__), 'golden')
+# Set to rewrite the reference files from the current output after an intended template change.
+UPDATE_GOLDEN = bool(os.environ.get('SAAS_UPDATE_GOLDEN'))
+
+
+class TestNginxVhost(BaseCase):
+    """``render_vhost`` output compared byte for byte against the files in ``tests/golden``."""
+
+    def assertGolden(self, name, content):
+        path = os.path.join(GOLDEN_DIR, name)
+        if UPDATE_GOLDEN:
+            with open(path, 'w') as f:
+                f.write(content)
+        with open(path) as f:
+            self.assertEqual(content, f.read(), f"vhost differs from {name}")
+
+    def test_custom_domain(self):
+        self.assertGolden('custom_domain_standard.conf', nginx_utils.render_vhost(
+            'erp.acme-corp.com', '10.0.0.5', 8069, 8072, profile='standard'))
+
+    def test_subdomain(self):
+        self.assertGolden('subdomain_basic.conf', nginx_utils.render_vhost(
+            'acme.saas.example.com', '10.0.0.5', 20001, 20002, profile='basic'))
+
+    def test_https_redirect(self):
+        self.assertGolden('redirect_https_performance.conf', nginx_utils.render_vhost(
+            'erp.acme-corp.com', '10.0.0.5', 8069, 8072, profile='performance', ssl=True))
+
+    def test_zone_names_are_per_domain(self):
+        first = nginx_utils.render_vhost('a.example.com', '10.0.0.5', 8069, 8072)
+        second = nginx_utils.render_vhost('b.example.com', '10.0.0.5', 8069, 8072)
+        self.assertNotIn(nginx_utils._zone_name('b.example.com'), first)
+        self.assertIn(nginx_utils._zone_name('b.example.com'), second)
+
+    def test_brotli(self):
+        self.assertGolden('custom_domain_standard_brotli.conf', nginx_utils.render_vhost(
+            'erp.acme-corp.com', '10.0.0.5', 8069, 8072, profile='standard', brotli=True))
+        # Profiles without compression and servers without the module get no brotli directives.
+        self.assertNotIn('brotli', nginx_utils.render_vhost(
+            'erp.acme-corp.com', '10.0.0.5', 8069, 8072, profile='basic', brotli=True))
+        self.assertNotIn('brotli', nginx_utils.render_vhost(
+            'erp.acme-corp.com', '10.0.0.5', 8069, 8072, profile='standard'))
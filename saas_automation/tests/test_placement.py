@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+from collections import Counter
+
+from odoo.exceptions import UserError
+from odoo.tests import tagged
+
+from .common import SaasTestCase
+
+
+@tagged('post_install', '-at_install')
+class TestPlacement(SaasTestCase):
+
+    def plan(self, count, strategy='least_loaded'):
+        self.env['ir.config_parameter'].sudo().set_param('saas_automation.placement_strategy', strategy)
+        return Counter(decision['server_id'] for decision in self.env['saas.server']._plan_placement(count))
+
+    def test_least_loaded_spreads(self):
+        self.assertEqual(self.plan(4), {self.server_a.id: 2, self.server_b.id: 2})
+
+    def test_least_loaded_prefers_emptier_server(self):
+        self.create_instances(4, server=self.server_a)
+        self.assertEqual(self.plan(2), {self.server_b.id: 2})
+
+    def test_bin_packing_fills_one_server(self):
+        self.assertEqual(len(self.plan(4, 'bin_packing')), 1)
+
+    def test_bin_packing_respects_capacity(self):
+        self.server_a.max_clients = 3
+        self.server_b.max_clients = 3
+        self.assertEqual(sorted(self.plan(5, 'bin_packing').values()), [2, 3])
+
+    def test_cpu_headroom(self):
+        # A single core already at 90%: one more instance of the same weight would overload it.
+        self.server_a.write({'cpu_cores': 1, 'cpu_load': 90.0})
+        self.create_instances(1, server=self.server_a)
+        self.assertEqual(self.plan(3), {self.server_b.id: 3})
+
+    def test_no_capacity_left(self):
+        with self.assertRaises(UserError):
+            self.plan(21)
+
+    def test_create_with_placement_logs_decisions(self):
+        vals = [{
+            'subdomain': f'placed{i}',
+            'db_name': f'placed_{i}',
+            'plan_id': self.plan.id,
+            'partner_id': self.partner.id,
+        } for i in range(3)]
+        vals.append(dict(vals.pop(), server_id=self.server_b.id))
+        instances = self.env['saas.instance']._create_with_placement(vals)
+        logs = self.env['saas.placement.log'].search([('instance_id', 'in', instances.ids)])
+        self.assertEqual(logs.instance_id, instances[:2])
+        for log in logs:
+            self.assertEqual(log.server_id, log.instance_id.server_id)
+            self.assertEqual(log.strategy, 'least_loaded')
+            self.assertEqual(log.candidates, 2)
+        self.assertEqual(instances[2].server_id, self.server_b)
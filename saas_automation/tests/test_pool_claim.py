@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+from unittest.mock import patch
+
+from odoo import fields
+from odoo.tests import tagged
+
+from odoo.addons.saas_automation.models import pool_utils, saas_instance
+from .common import SaasTestCase
+
+
+@tagged('post_install', '-at_install')
+class TestPoolClaim(SaasTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.Slot = self.env['saas.pool.slot']
+        self.slot = self.Slot.create({
+            'name': f'{pool_utils.POOL_SLOT_PREFIX}test',
+            'server_id': self.server_b.id,
+            'odoo_version': '18.0',
+            'state': 'ready',
+        })
+        self.claims = []
+        patcher = patch.object(pool_utils, 'claim_slot', side_effect=self.claim_slot)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def claim_slot(self, server, name, db_name):
+        self.claims.append((server.id, name, db_name))
+        return 32768
+
+    def test_hit(self):
+        instance = self.create_instances(1, is_trial=True)
+        instance.action_deploy_instance()
+        # The signup only reserves the slot; the instance follows it to the server it was warmed on.
+        self.assertFalse(self.claims)
+        self.assertEqual((self.slot.state, self.slot.instance_id), ('reserved', instance))
+        self.assertEqual(instance.state, 'deploying')
+        self.assertEqual(instance.server_id, self.server_b)
+        self.assertEqual(self.server_b.pool_hit_count, 1)
+        self.assertEqual((instance.job_ids.job_type, instance.job_ids.priority), ('deploy', 30))
+
+        instance._run_remote_operation('deploy')
+        self.assertEqual(self.claims, [(self.server_b.id, self.slot.name, instance.db_name)])
+        self.assertEqual(self.slot.state, 'claimed')
+        self.assertEqual(instance.state, 'running')
+        self.assertEqual(instance.port, 32768)
+
+    def test_rollback_leaves_slot_ready(self):
+        instance = self.create_instances(1, is_trial=True)
+        with self.assertRaises(ValueError), self.env.cr.savepoint():
+            instance.action_deploy_instance()
+            raise ValueError('signup failed')
+        self.env.invalidate_all()
+        self.assertEqual(self.slot.state, 'ready')
+        self.assertFalse(self.slot.instance_id)
+        self.assertFalse(self.claims)
+
+    def test_miss(self):
+        instances = self.create_instances(2, is_trial=True)
+        instances.action_deploy_instance()
+        self.assertEqual(sorted(instances.job_ids.mapped('priority')), [20, 30])
+        self.assertEqual(self.server_a.pool_miss_count, 1)
+
+    def test_version_mismatch(self):
+        instance = self.create_instances(1, is_trial=True, odoo_version='17.0')
+        instance.action_deploy_instance()
+        self.assertFalse(self.claims)
+        self.assertEqual(instance.state, 'deploying')
+        self.assertEqual(self.slot.state, 'ready')
+
+    def test_not_trial(self):
+        instance = self.create_instances(1)
+        instance.action_deploy_instance()
+        self.assertFalse(self.claims)
+        self.assertEqual(instance.state, 'deploying')
+
+    def test_claim_failure_falls_back(self):
+        instance = self.create_instances(1, is_trial=True)
+        instance.action_deploy_instance()
+        deployed = []
+        with patch.object(pool_utils, 'claim_slot', side_effect=RuntimeError('rename failed')), \
+                patch.dict(saas_instance.REMOTE_OPERATIONS,
+                           {'deploy': (lambda server, item: deployed.append(item.id) or 32769, 'running')}):
+            errors = instance._run_remote_operation('deploy')
+        self.assertFalse(errors)
+        self.assertEqual(self.slot.state, 'failed')
+        self.assertIn('rename failed', self.slot.error)
+        self.assertEqual(deployed, [instance.id])
+        self.assertEqual(instance.state, 'running')
+        self.assertEqual(instance.port, 32769)
+        self.assertEqual(instance.server_id, self.server_b)
+
+    def test_refill_gives_up_stale_warming_slots(self):
+        stale = self.Slot.create({
+            'name': f'{pool_utils.POOL_SLOT_PREFIX}stale',
+            'server_id': self.server_a.id,
+            'odoo_version': '18.0',
+        })
+        self.env.flush_all()
+        self.env.cr.execute("UPDATE saas_pool_slot SET create_date = %s WHERE id = %s",
+                            (fields.Datetime.now() - timedelta(hours=2), stale.id))
+        self.env.invalidate_all()
+        self.env['ir.config_parameter'].set_param('saas_automation.pool_size', 0)
+        discarded = []
+        with patch.object(pool_utils, 'discard_slot', side_effect=lambda server, name: discarded.append(name)), \
+                self.no_commit():
+            self.Slot._cron_refill_pool()
+        self.assertEqual(discarded, [stale.name])
+        self.assertFalse(stale.exists())
+        self.assertEqual(self.slot.state, 'ready')
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests import tagged
+
+from odoo.addons.saas_automation.models.saas_job import JOB_BACKOFF_BASE, JOB_BACKOFF_MAX, JOB_STALE_AFTER
+from .common import SaasTestCase
+from .fakes import FakeRemote
+
+
+@tagged('post_install', '-at_install')
+class TestSaasJob(SaasTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.Job = self.env['saas.job']
+        self.instances = self.create_instances(3)
+        self.instances.write({'state': 'deploying'})
+
+    def enqueue(self, instances, job_type='deploy'):
+        jobs = self.Job.enqueue(instances, job_type)
+        # Claims compare with the database clock, which stands still during the test transaction.
+        jobs.write({'next_attempt_at': fields.Datetime.now() - timedelta(days=1)})
+        return jobs
+
+    def run_jobs(self, failure_rate=0.0):
+        self.env.flush_all()
+        jobs = self.Job._claim_jobs(100)
+        with FakeRemote(failure_rate=failure_rate).patched():
+            jobs._run_batch()
+        return jobs
+
+    def test_success(self):
+        jobs = self.enqueue(self.instances)
+        self.assertEqual(self.run_jobs(), jobs)
+        self.assertEqual(set(jobs.mapped('state')), {'done'})
+        self.assertEqual(set(jobs.mapped('progress')), {100})
+        self.assertEqual(set(self.instances.mapped('state')), {'running'})
+
+    def test_retry_with_backoff(self):
+        job = self.enqueue(self.instances[0])
+        for attempt in (1, 2, 3):
+            before = fields.Datetime.now()
+            self.run_jobs(failure_rate=1.0)
+            self.assertEqual(job.state, 'pending')
+            self.assertEqual(job.attempts, attempt)
+            self.assertIn('injected failure', job.error_message)
+            expected = before + timedelta(seconds=JOB_BACKOFF_BASE * 2 ** (attempt - 1))
+            self.assertAlmostEqual(job.next_attempt_at, expected, delta=timedelta(seconds=5))
+            job.next_attempt_at = fields.Datetime.now() - timedelta(days=1)
+
+    def test_backoff_is_capped(self):
+        job = self.enqueue(self.instances[0])
+        job.write({'attempts': 20, 'max_attempts': 30})
+        before = fields.Datetime.now()
+        job._handle_failure('boom')
+        self.assertAlmostEqual(job.next_attempt_at, before + timedelta(seconds=JOB_BACKOFF_MAX),
+                               delta=timedelta(seconds=5))
+
+    def test_fails_after_max_attempts(self):
+        job = self.enqueue(self.instances[0])
+        job.max_attempts = 2
+        self.run_jobs(failure_rate=1.0)
+        job.next_attempt_at = fields.Datetime.now() - timedelta(days=1)
+        self.run_jobs(failure_rate=1.0)
+        self.assertEqual(job.state, 'failed')
+        self.assertEqual(job.attempts, 2)
+        self.assertEqual(self.instances[0].state, 'draft')
+        self.assertFalse(self.Job._claim_jobs(100))
+
+    def test_retry_action_resets_attempts(self):
+        job = self.enqueue(self.instances[0])
+        job.write({'state': 'failed', 'attempts': 5, 'error_message': 'boom'})
+        job.action_retry()
+        self.assertEqual((job.state, job.attempts, job.error_message), ('pending', 0, False))
+
+    def test_enqueue_skips_open_jobs(self):
+        jobs = self.enqueue(self.instances)
+        self.assertEqual(self.Job.enqueue(self.instances, 'deploy'), jobs)
+        self.assertEqual(self.Job.search_count([('instance_id', 'in', self.instances.ids)]), 3)
+
+    def test_claim_whole_batch_of_a_server(self):
+        self.server_a.max_concurrent_jobs = 1
+        jobs = self.enqueue(self.instances)
+        self.env.flush_all()
+        self.assertEqual(self.Job._claim_jobs(100), jobs)
+        self.assertEqual(set(jobs.mapped('state')), {'running'})
+        self.assertTrue(all(jobs.mapped('heartbeat_at')))
+
+    def test_claim_skips_busy_server(self):
+        other = self.create_instances(2, server=self.server_b, prefix='other')
+        busy, waiting = self.enqueue(other[0]), self.enqueue(other[1])
+        busy.state = 'running'
+        jobs = self.enqueue(self.instances)
+        self.env.flush_all()
+        self.assertEqual(self.Job._claim_jobs(100), jobs)
+        self.assertEqual(waiting.state, 'pending')
+
+    def test_requeue_by_heartbeat(self):
+        stale, alive = self.enqueue(self.instances[:2])
+        now = fields.Datetime.now()
+        stale.write({'state': 'running', 'started_at': now - timedelta(days=1),
+                     'heartbeat_at': now - timedelta(seconds=JOB_STALE_AFTER + 60)})
+        # A long job is fine as long as its runner keeps beating.
+        alive.write({'state': 'running', 'started_at': now - timedelta(days=1), 'heartbeat_at': now})
+        self.Job._requeue_stale_jobs()
+        self.assertEqual(stale.state, 'pending')
+        self.assertEqual(alive.state, 'running')
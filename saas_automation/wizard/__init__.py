@@ -1,2 +1,3 @@
 from . import saas_instance_creation_wizard
-from . import saas_backup_restore_wizard 
\ No newline at end of file
+from . import saas_backup_restore_wizard 
+from . import saas_instance_import_wizard
@@ -2,8 +2,6 @@
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
 from ..models import db_utils
-import base64
-import os
 
 class SaasBackupRestoreWizard(models.TransientModel):
     _name = 'saas.backup.restore.wizard'
@@ -12,34 +10,37 @@ class SaasBackupRestoreWizard(models.TransientModel):
     instance_id = fields.Many2one('saas.instance', string='Instance', required=True)
     backup_file = fields.Binary(string='Backup File', attachment=True)
     backup_file_name = fields.Char(string='Backup File Name')
+    backup_attachment_id = fields.Many2one(
+        'ir.attachment', string='Existing Backup',
+        domain="[('res_model', '=', 'saas.instance'), ('res_id', '=', instance_id), ('mimetype', '=', 'application/zip')]")
 
     def action_backup_instance(self):
         self.ensure_one()
-        backup_path = db_utils.backup_db(self.instance_id.db_name)
-        if backup_path:
-            with open(backup_path, 'rb') as f:
-                self.backup_file = base64.b64encode(f.read())
-            self.backup_file_name = f"{self.instance_id.db_name}.zip"
-            os.remove(backup_path)
-            return {
-                'type': 'ir.actions.act_window',
-                'res_model': 'saas.backup.restore.wizard',
-                'res_id': self.id,
-                'view_mode': 'form',
-                'target': 'new',
-            }
-        else:
-            raise UserError(_("Failed to create backup."))
+        try:
+            attachment = db_utils.dump_db_to_attachment(
+                self.env, self.instance_id.db_name, 'saas.instance', self.instance_id.id)
+        except Exception as e:
+            raise UserError(_("Failed to create backup: %s", e))
+        return {
+            'type': 'ir.actions.act_url',
+            'url': f"/saas/backup/{attachment.id}/download",
+            'target': 'self',
+        }
+
+    def _get_upload_attachment(self):
+        return self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', self._name),
+            ('res_field', '=', 'backup_file'),
+            ('res_id', '=', self.id),
+        ], limit=1)
 
     def action_restore_instance(self):
         self.ensure_one()
-        if not self.backup_file:
-            raise UserError(_("Please upload a backup file."))
-        
-        with open(self.backup_file_name, 'wb') as f:
-            f.write(base64.b64decode(self.backup_file))
-        
-        if db_utils.restore_db(self.instance_id.db_name, self.backup_file_name):
+        attachment = self.backup_attachment_id or self._get_upload_attachment()
+        if not attachment:
+            raise UserError(_("Please upload a backup file or select an existing backup."))
+
+        if db_utils.restore_db_from_attachment(self.env, self.instance_id.db_name, attachment):
             return {'type': 'ir.actions.act_window_close'}
         else:
-            raise UserError(_("Failed to restore database.")) 
\ No newline at end of file
+            raise UserError(_("Failed to restore database."))
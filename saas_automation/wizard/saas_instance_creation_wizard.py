@@ -16,7 +16,7 @@ class SaasInstanceCreationWizard(models.TransientModel):
             'subdomain': self.subdomain,
             'db_name': f"{self.subdomain.replace('.', '-')}-{self.plan_id.name.lower().replace(' ', '-')}",
         }
-        instance = self.env['saas.instance'].create(instance_vals)
+        instance = self.env['saas.instance']._create_with_placement([instance_vals])
         return {
             'type': 'ir.actions.act_window',
             'res_model': 'saas.instance',
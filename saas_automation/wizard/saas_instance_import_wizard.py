@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+import base64
+import csv
+import io
+import logging
+import re
+from collections import defaultdict
+from odoo import models, fields, _
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+IMPORT_CHUNK_SIZE = 500  # rows created per batched create (and per savepoint)
+SUBDOMAIN_RE = re.compile(r'^[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?$')
+DB_NAME_RE = re.compile(r'^[a-zA-Z0-9][a-zA-Z0-9_.-]{0,62}$')
+
+
+class SaasInstanceImportWizard(models.TransientModel):
+    """Creates instances (and their subscriptions) in bulk from a CSV file.
+
+    The file needs a header row with at least ``subdomain`` and ``partner`` (email or
+    name of an existing customer); ``plan``, ``db_name``, ``odoo_version``, ``server``,
+    ``custom_domain`` and ``price`` are optional. Every row is validated against the file
+    and the database in one pass, valid rows are created in chunks and the others are
+    reported with their line number.
+    """
+    _name = 'saas.instance.import.wizard'
+    _description = 'SaaS Instance Import Wizard'
+
+    import_file = fields.Binary(string='CSV File', required=True)
+    import_filename = fields.Char(string='File Name')
+    plan_id = fields.Many2one('saas.plan', string='Default Plan', help="Plan of the rows without a 'plan' column value.")
+    odoo_version = fields.Selection([
+        ('16.0', 'Odoo 16'),
+        ('17.0', 'Odoo 17'),
+        ('18.0', 'Odoo 18'),
+    ], string='Default Odoo Version', default='18.0', required=True)
+    create_subscriptions = fields.Boolean(string='Create Subscriptions', default=True)
+    start_date = fields.Date(string='Subscription Start', default=fields.Date.context_today)
+    deploy = fields.Boolean(string='Deploy After Import', help="Queue a deploy job for every created instance.")
+    state = fields.Selection([('draft', 'Draft'), ('done', 'Done')], default='draft')
+    instance_ids = fields.Many2many('saas.instance', string='Created Instances', readonly=True)
+    created_count = fields.Integer(string='Created', readonly=True)
+    error_count = fields.Integer(string='Rejected Rows', readonly=True)
+    error_report = fields.Text(string='Errors', readonly=True)
+
+    def _read_rows(self):
+        """Yields ``(line number, row dict)`` of the upload.
+
+        The file is decoded in memory at once; rows are parsed lazily, but the import
+        validates them all together, so the whole file is held during the import.
+        """
+        stream = io.TextIOWrapper(io.BytesIO(base64.b64decode(self.import_file)), encoding='utf-8-sig', newline='')
+        reader = csv.DictReader(stream)
+        header = {(name or '').strip().lower() for name in reader.fieldnames or []}
+        missing = {'subdomain', 'partner'} - header
+        if missing:
+            raise UserError(_("The CSV file lacks the column(s): %s", ', '.join(sorted(missing))))
+        for row in reader:
+            yield reader.line_num, {(key or '').strip().lower(): (value or '').strip() for key, value in row.items()}
+
+    def _validate(self, rows):
+        """Turns rows into instance values, checking them against each other and the database at once.
+
+        :return: ``(list of (line, instance vals, price)), {line: error}``
+        """
+        Instance = self.env['saas.instance']
+        subdomains = {row['subdomain'].lower() for _line, row in rows}
+        db_names = {row.get('db_name') for _line, row in rows if row.get('db_name')}
+        taken_subdomains = set(Instance.with_context(active_test=False).search(
+            [('subdomain', 'in', list(subdomains))]).mapped('subdomain'))
+        partner_keys = list({row['partner'] for _line, row in rows})
+        by_email, by_name = defaultdict(list), defaultdict(list)
+        for partner in self.env['res.partner'].search(['|', ('email', 'in', partner_keys), ('name', 'in', partner_keys)]):
+            by_email[partner.email].append(partner)
+            by_name[partner.name].append(partner)
+        # An email match wins over a name match; a key matching several partners is rejected.
+        partners = {key: by_email.get(key) or by_name.get(key) for key in partner_keys
+                    if key in by_email or key in by_name}
+        plans = {plan.name: plan for plan in self.env['saas.plan'].search(
+            [('name', 'in', list({row.get('plan') for _line, row in rows if row.get('plan')}))])}
+        servers = {server.name: server for server in self.env['saas.server'].search(
+            [('name', 'in', list({row.get('server') for _line, row in rows if row.get('server')}))])}
+        versions = dict(self._fields['odoo_version'].selection)
+
+        valid, errors, seen_subdomains, candidates = [], {}, set(), []
+        for line, row in rows:
+            subdomain = row['subdomain'].lower()
+            plan = plans.get(row.get('plan')) if row.get('plan') else self.plan_id
+            if not SUBDOMAIN_RE.match(subdomain):
+                errors[line] = _("invalid subdomain '%s'", row['subdomain'])
+            elif subdomain in taken_subdomains or subdomain in seen_subdomains:
+                errors[line] = _("subdomain '%s' is already used", subdomain)
+            elif row['partner'] not in partners:
+                errors[line] = _("unknown customer '%s'", row['partner'])
+            elif len(partners[row['partner']]) > 1:
+                errors[line] = _("ambiguous customer '%s', %s contacts match", row['partner'], len(partners[row['partner']]))
+            elif not plan:
+                errors[line] = _("unknown plan '%s'", row.get('plan')) if row.get('plan') else _("no plan given")
+            elif row.get('server') and row['server'] not in servers:
+                errors[line] = _("unknown server '%s'", row['server'])
+            elif row.get('odoo_version') and row['odoo_version'] not in versions:
+                errors[line] = _("unsupported Odoo version '%s'", row['odoo_version'])
+            else:
+                seen_subdomains.add(subdomain)
+                db_name = row.get('db_name') or f"{subdomain}-{plan.name.lower().replace(' ', '-')}"
+                vals = {
+                    'subdomain': subdomain,
+                    'db_name': db_name,
+                    'partner_id': partners[row['partner']][0].id,
+                    'plan_id': plan.id,
+                    'odoo_version': row.get('odoo_version') or self.odoo_version,
+                }
+                if row.get('server'):
+                    vals['server_id'] = servers[row['server']].id
+                if row.get('custom_domain'):
+                    vals['custom_domain'] = row['custom_domain']
+                try:
+                    price = float(row['price']) if row.get('price') else plan.price_monthly
+                except ValueError:
+                    errors[line] = _("invalid price '%s'", row['price'])
+                    continue
+                candidates.append((line, vals, price))
+
+        # Generated and given names are only known now, check them in a single query too.
+        db_names |= {vals['db_name'] for _line, vals, _price in candidates}
+        taken_db_names = set(Instance.with_context(active_test=False).search(
+            [('db_name', 'in', list(db_names))]).mapped('db_name'))
+        seen_db_names = set()
+        for line, vals, price in candidates:
+            if not DB_NAME_RE.match(vals['db_name']):
+                errors[line] = _("invalid database name '%s'", vals['db_name'])
+            elif vals['db_name'] in taken_db_names or vals['db_name'] in seen_db_names:
+                errors[line] = _("database name '%s' is already used", vals['db_name'])
+            else:
+                seen_db_names.add(vals['db_name'])
+                valid.append((line, vals, price))
+        return valid, errors
+
+    def _create_chunk(self, chunk):
+        Instance = self.env['saas.instance'].with_context(tracking_disable=True, mail_create_nolog=True)
+        instances = Instance._create_with_placement([dict(vals) for _line, vals, _price in chunk])
+        if self.create_subscriptions:
+            self.env['saas.subscription'].with_context(tracking_disable=True, mail_create_nolog=True).create([{
+                'partner_id': instance.partner_id.id,
+                'instance_id': instance.id,
+                'plan_id': instance.plan_id.id,
+                'start_date': self.start_date or fields.Date.context_today(self),
+                'price': price,
+            } for instance, (_line, _vals, price) in zip(instances, chunk)])
+        return instances
+
+    def action_import(self):
+        self.ensure_one()
+        rows = list(self._read_rows())
+        if not rows:
+            raise UserError(_("The CSV file has no data rows."))
+        valid, errors = self._validate(rows)
+
+        instances = self.env['saas.instance']
+        for start in range(0, len(valid), IMPORT_CHUNK_SIZE):
+            chunk = valid[start:start + IMPORT_CHUNK_SIZE]
+            try:
+                with self.env.cr.savepoint():
+                    created = self._create_chunk(chunk)
+                instances |= created
+            except Exception as e:
+                _logger.warning(f"Import chunk of {len(chunk)} rows failed, retrying one by one: {e}")
+                for row in chunk:
+                    try:
+                        with self.env.cr.savepoint():
+                            created = self._create_chunk([row])
+                        instances |= created
+                    except Exception as e:
+                        errors[row[0]] = str(e)
+        if self.deploy:
+            instances.action_deploy_instance()
+
+        _logger.info(f"Imported {len(instances)} instances from '{self.import_filename}', {len(errors)} rows rejected")
+        self.write({
+            'state': 'done',
+            'instance_ids': [(6, 0, instances.ids)],
+            'created_count': len(instances),
+            'error_count': len(errors),
+            'error_report': '\n'.join(_("Line %(line)s: %(error)s", line=line, error=error)
+                                      for line, error in sorted(errors.items())) or False,
+        })
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
+
+    def action_view_instances(self):
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('Imported Instances'),
+            'res_model': 'saas.instance',
+            'view_mode': 'list,form',
+            'domain': [('id', 'in', self.instance_ids.ids)],
+        }